@@ -1,6 +1,6 @@
 'use client';
 import React, { useEffect, useRef, useState } from 'react';
-import { fetchMessages, sendMessage } from '@/services/api';
+import { fetchMessages, markConversationRead, sendMessage } from '@/services/api';
 import { User, CropInventory, Message } from '@/app/types/types';
 
 interface ChatPortalProps {
@@ -16,11 +16,23 @@ const ChatPortal: React.FC<ChatPortalProps> = ({ currentUser, connectedWith, aut
   const [inputText, setInputText] = useState('');
   const [loadError, setLoadError] = useState<string | null>(null);
   const pollRef = useRef<number | null>(null);
+  const lastReadRef = useRef<string | null>(null);
   const toast = (message: string, tone: 'info' | 'success' | 'error' = 'info') => {
     if (typeof window === 'undefined') return;
     window.dispatchEvent(new CustomEvent('shumber-toast', { detail: { message, tone } }));
   };
 
+  // The server keeps read markers; only report when a newer message has been shown.
+  const markRead = (data: Message[]) => {
+    const latest = data[data.length - 1];
+    if (!latest || lastReadRef.current === latest.id) return;
+    lastReadRef.current = latest.id;
+    markConversationRead(connectedWith.id, authToken).catch((error) => {
+      lastReadRef.current = null;
+      console.error('Failed to mark conversation read', error);
+    });
+  };
+
   useEffect(() => {
     const loadMessages = async () => {
       setLoadError(null);
@@ -37,10 +49,7 @@ const ChatPortal: React.FC<ChatPortalProps> = ({ currentUser, connectedWith, aut
           ]);
         } else {
           setMessages(data);
-          const latest = data[data.length - 1];
-          if (latest?.timestamp) {
-            localStorage.setItem(`shumber_last_seen_${connectedWith.id}`, latest.timestamp);
-          }
+          markRead(data);
         }
       } catch (error) {
         console.error('Failed to load messages', error);
@@ -68,10 +77,7 @@ const ChatPortal: React.FC<ChatPortalProps> = ({ currentUser, connectedWith, aut
         const data = await fetchMessages(connectedWith.id, authToken);
         if (data.length > 0) {
           setMessages(data);
-          const latest = data[data.length - 1];
-          if (latest?.timestamp) {
-            localStorage.setItem(`shumber_last_seen_${connectedWith.id}`, latest.timestamp);
-          }
+          markRead(data);
         }
       } catch (error) {
         console.error('Chat poll failed', error);
@@ -1,6 +1,6 @@
 import React, { useEffect, useRef, useState } from 'react';
 import { NAKURU_LOCATIONS } from '@/constants';
-import { analyzeProduceQuality, fetchMessages, parseOfflineMessage } from '@/services/api';
+import { analyzeProduceQuality, fetchInbox, parseOfflineMessage } from '@/services/api';
 import { User, CropInventory, AnalysisResult, CropInventoryCreate } from '@/app/types/types';
 import HeatMap from '@/app/components/HeatMap';
 
@@ -57,29 +57,17 @@ const FarmerDashboard: React.FC<FarmerDashboardProps> = ({
   useEffect(() => {
     if (!authToken) return;
     let timer: number | null = null;
+    // One inbox read covers every thread; counts and unread state come from the server.
     const poll = async () => {
-      const owned = inventory.filter((item) => item.farmerId === user.id);
-      if (owned.length === 0) {
-        setUnreadById({});
-        return;
-      }
       try {
-        const updates: Record<string, number> = {};
+        const conversations = await fetchInbox(authToken);
+        const unread: Record<string, number> = {};
         const counts: Record<string, number> = {};
-        await Promise.all(
-          owned.map(async (item) => {
-            const messages = await fetchMessages(item.id, authToken);
-            counts[item.id] = messages.length;
-            const lastSeen = localStorage.getItem(`shumber_last_seen_${item.id}`);
-            const unread = messages.filter(
-              (msg) =>
-                msg.senderId !== user.id &&
-                (!lastSeen || new Date(msg.timestamp).getTime() > new Date(lastSeen).getTime())
-            ).length;
-            updates[item.id] = unread;
-          })
-        );
-        setUnreadById(updates);
+        conversations.forEach((conversation) => {
+          unread[conversation.inventoryId] = conversation.unreadCount;
+          counts[conversation.inventoryId] = conversation.messageCount;
+        });
+        setUnreadById(unread);
         setMessageCountById(counts);
       } catch (error) {
         console.error('Failed to load unread counts', error);
@@ -91,7 +79,7 @@ const FarmerDashboard: React.FC<FarmerDashboardProps> = ({
     return () => {
       if (timer) window.clearInterval(timer);
     };
-  }, [authToken, inventory, user.id]);
+  }, [authToken]);
 
   useEffect(() => {
     if (!analysis) {
@@ -27,6 +27,8 @@ export interface CropInventory {
   timestamp: string;
   status: 'AVAILABLE' | 'NEGOTIATING' | 'SOLD';
   listingType: 'BIDDING' | 'FIXED';
+  endsAt?: string;
+  settledAt?: string;
 }
 
 export interface CropInventoryCreate {
@@ -42,6 +44,7 @@ export interface CropInventoryCreate {
   };
   imageUrl?: string;
   listingType: 'BIDDING' | 'FIXED';
+  endsAt?: string;
 }
 
 export interface Message {
@@ -52,7 +55,17 @@ export interface Message {
   timestamp: string;
 }
 
-export type EscrowStatus = 'PENDING' | 'VERIFIED' | 'RELEASED';
+export interface Conversation {
+  inventoryId: string;
+  cropName: string;
+  lastMessageText: string;
+  lastSenderName?: string;
+  lastMessageAt: string;
+  messageCount: number;
+  unreadCount: number;
+}
+
+export type EscrowStatus = 'PENDING' | 'VERIFIED' | 'RELEASED' | 'CANCELLED';
 
 export interface Escrow {
   id: string;
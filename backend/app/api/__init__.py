@@ -1,7 +1,19 @@
 from .analysis import router as analysis_router
 from .auth import router as auth_router
 from .chat import router as chat_router
+from .dashboard import router as dashboard_router
 from .escrow import router as escrow_router
+from .export import router as export_router
 from .inventory import router as inventory_router
+from .market import router as market_router
 
-__all__ = ["analysis_router", "auth_router", "chat_router", "escrow_router", "inventory_router"]
+__all__ = [
+    "analysis_router",
+    "auth_router",
+    "chat_router",
+    "dashboard_router",
+    "escrow_router",
+    "export_router",
+    "inventory_router",
+    "market_router",
+]
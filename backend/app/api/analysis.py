@@ -1,19 +1,39 @@
+import asyncio
 import logging
 
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 
-from ..schemas import AnalysisResult, ImageAnalysisRequest, OfflineParseRequest, OfflineParseResult
+from ..core.deps import get_current_user
+from ..models import User, UserRole
+from ..schemas import (
+    AnalysisResult,
+    ImageAnalysisRequest,
+    OfflineBatchMessage,
+    OfflineBatchRequest,
+    OfflineParseRequest,
+    OfflineParseResult,
+)
 from ..services.gemini import analyze_produce, parse_offline_message
+from ..services.offline_ingest import OFFLINE_BATCH_MAX, ingest_batch
+from ..services.prescreen import ImageRejected, prescreen_image, prescreen_pool
 
 router = APIRouter(prefix="/analysis", tags=["analysis"])
 logger = logging.getLogger(__name__)
 
 
 @router.post("", response_model=AnalysisResult)
-def analyze(payload: ImageAnalysisRequest) -> AnalysisResult:
+async def analyze(payload: ImageAnalysisRequest) -> AnalysisResult:
     # Translate service errors into HTTP responses for the client.
     try:
-        return analyze_produce(payload.image_base64)
+        # Unusable photos are sent back for a retake before they cost a model call.
+        await asyncio.get_running_loop().run_in_executor(prescreen_pool, prescreen_image, payload.image_base64)
+        return await run_in_threadpool(analyze_produce, payload.image_base64)
+    except ImageRejected as exc:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail={"reason": exc.reason, "message": str(exc)}
+        ) from exc
     except ValueError as exc:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
     except RuntimeError as exc:
@@ -34,3 +54,23 @@ def parse_offline(payload: OfflineParseRequest) -> OfflineParseResult:
     except Exception as exc:
         logger.exception("Gemini offline parsing failed")
         raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Offline parsing failed") from exc
+
+
+def _parse_batch_message(message: OfflineBatchMessage) -> OfflineParseResult:
+    return parse_offline_message(text=message.text, audio_data_url=message.audio_base64)
+
+
+@router.post("/offline/batch")
+def ingest_offline_batch(payload: OfflineBatchRequest, user: User = Depends(get_current_user)):
+    # Gateway batches land as listings owned by the calling farmer or co-op agent account.
+    if user.role != UserRole.FARMER:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only farmers can post inventory")
+    if len(payload.messages) > OFFLINE_BATCH_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {OFFLINE_BATCH_MAX} messages per batch",
+        )
+    return StreamingResponse(
+        ingest_batch(user.id, user.name, payload.gateway, payload.messages, _parse_batch_message),
+        media_type="application/x-ndjson",
+    )
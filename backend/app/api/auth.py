@@ -27,7 +27,6 @@ def register(payload: UserCreate, db: Session = Depends(get_db)):
     )
     db.add(user)
     db.commit()
-    db.refresh(user)
 
     token_payload = create_access_token(user.id)
     return Token(access_token=token_payload["token"], expires_in=token_payload["expires_in"])
@@ -1,36 +1,53 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 
-from ..core.deps import get_current_user, get_db
-from ..models import Inventory, Message, User
-from ..schemas import MessageCreate, MessageOut
+from ..core.deps import get_current_user, get_db, get_read_db
+from ..models import Message, User
+from ..schemas import ConversationOut, MessageCreate, MessageOut
+from ..services.chat_history import MESSAGE_PAGE_MAX, MESSAGE_PAGE_SIZE, message_page
+from ..services.dashboard import bump_dashboards, bump_thread_dashboards
+from ..services.inbox import INBOX_LIMIT, inbox, mark_read, record_message
+from ..services.listings import get_listing, listing_exists
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
 
 @router.get("/{inventory_id}/messages", response_model=list[MessageOut])
-def list_messages(inventory_id: str, db: Session = Depends(get_db)):
-    exists = db.query(Inventory.id).filter(Inventory.id == inventory_id).first()
-    if not exists:
+def list_messages(
+    inventory_id: str,
+    before: str | None = None,
+    limit: int = Query(MESSAGE_PAGE_SIZE, ge=1, le=MESSAGE_PAGE_MAX),
+    db: Session = Depends(get_read_db),
+):
+    # Newest page first; pass the oldest id you have as `before` to load earlier messages.
+    if not listing_exists(db, inventory_id, include_archived=True):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Inventory not found")
-    results = (
-        db.query(Message, User.name)
-        .join(User, User.id == Message.sender_id)
-        .filter(Message.inventory_id == inventory_id)
-        .order_by(Message.timestamp.asc())
-        .all()
-    )
-    return [
-        MessageOut(
-            id=msg.id,
-            inventory_id=msg.inventory_id,
-            sender_id=msg.sender_id,
-            text=msg.text,
-            timestamp=msg.timestamp,
-            sender_name=sender_name,
-        )
-        for msg, sender_name in results
-    ]
+    page = message_page(db, inventory_id, before, limit)
+    if page is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unknown message cursor")
+    return page
+
+
+@router.get("/inbox", response_model=list[ConversationOut])
+def get_inbox(
+    limit: int = Query(INBOX_LIMIT, ge=1, le=INBOX_LIMIT),
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+):
+    return inbox(db, user.id, limit)
+
+
+@router.post("/{inventory_id}/read", status_code=status.HTTP_204_NO_CONTENT)
+def mark_conversation_read(
+    inventory_id: str,
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    if not listing_exists(db, inventory_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Inventory not found")
+    mark_read(db, inventory_id, user.id)
+    bump_dashboards(db, user.id)
+    db.commit()
 
 
 @router.post("/{inventory_id}/messages", response_model=MessageOut, status_code=status.HTTP_201_CREATED)
@@ -40,8 +57,8 @@ def create_message(
     user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    item = db.query(Inventory).filter(Inventory.id == inventory_id).first()
-    if not item:
+    listing = get_listing(db, inventory_id)
+    if listing is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Inventory not found")
 
     message = Message(
@@ -50,8 +67,10 @@ def create_message(
         text=payload.text,
     )
     db.add(message)
+    db.flush([message])
+    record_message(db, message, user, listing.farmer_id)
+    bump_thread_dashboards(db, inventory_id)
     db.commit()
-    db.refresh(message)
     return MessageOut(
         id=message.id,
         inventory_id=message.inventory_id,
@@ -0,0 +1,68 @@
+import asyncio
+from typing import Callable
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from ..core.deps import get_current_user
+from ..db import SessionLocal
+from ..models import User, UserRole
+from ..schemas import BuyerDashboard, FarmerDashboard, UserOut
+from ..services.dashboard import (
+    buyer_active_bids,
+    buyer_escrows,
+    dashboard_cache,
+    dashboard_etag,
+    dashboard_key,
+    farmer_escrows,
+    farmer_listings,
+)
+from ..services.inbox import inbox
+
+router = APIRouter(prefix="/dashboard", tags=["dashboard"])
+
+
+def _conversations(db: Session, user_id: str) -> list[dict]:
+    return [conversation.model_dump(mode="json") for conversation in inbox(db, user_id)]
+
+
+def _section(loader: Callable[[Session, str], list[dict]], user_id: str) -> list[dict]:
+    # Each section gets its own session so the queries can run side by side.
+    with SessionLocal() as db:
+        return loader(db, user_id)
+
+
+async def _dashboard(
+    request: Request, response: Response, user: User, sections: dict[str, Callable[[Session, str], list[dict]]]
+):
+    # The key includes the user's dashboard version, which every relevant write bumps.
+    key = dashboard_key(user)
+    etag = dashboard_etag(key)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+
+    payload = dashboard_cache.get(key)
+    if payload is None:
+        results = await asyncio.gather(*(run_in_threadpool(_section, loader, user.id) for loader in sections.values()))
+        payload = {"user": UserOut.model_validate(user).model_dump(mode="json"), **dict(zip(sections, results))}
+        dashboard_cache.set(key, payload)
+    return payload
+
+
+@router.get("/farmer", response_model=FarmerDashboard)
+async def farmer_dashboard(request: Request, response: Response, user: User = Depends(get_current_user)):
+    if user.role != UserRole.FARMER:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only farmers have a farmer dashboard")
+    sections = {"listings": farmer_listings, "escrows": farmer_escrows, "conversations": _conversations}
+    return await _dashboard(request, response, user, sections)
+
+
+@router.get("/buyer", response_model=BuyerDashboard)
+async def buyer_dashboard(request: Request, response: Response, user: User = Depends(get_current_user)):
+    if user.role != UserRole.BUYER:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only buyers have a buyer dashboard")
+    sections = {"active_bids": buyer_active_bids, "escrows": buyer_escrows, "conversations": _conversations}
+    return await _dashboard(request, response, user, sections)
@@ -1,16 +1,29 @@
+from datetime import datetime
+
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
-from ..core.deps import get_current_user, get_db
-from ..models import Escrow, EscrowStatus, Inventory, InventoryStatus, User, UserRole
+from ..core.deps import get_current_user, get_db, get_read_db
+from ..models import (
+    ArchivedEscrow,
+    ArchivedInventory,
+    Escrow,
+    EscrowStatus,
+    Inventory,
+    InventoryStatus,
+    ListingType,
+    PriceKind,
+    User,
+    UserRole,
+)
 from ..schemas import EscrowOut, EscrowStart
+from ..services.changes import log_changes
+from ..services.dashboard import bump_dashboards, bump_listing_dashboards
+from ..services.escrow import calculate_platform_fee, cancel_fill, expire_stale_fills, reserve_fill
+from ..services.listings import invalidate_listing
+from ..services.market import record_price
 
 router = APIRouter(prefix="/escrow", tags=["escrow"])
-PLATFORM_FEE_RATE = 0.02
-
-
-def _calculate_platform_fee(amount: int) -> int:
-    return max(int(round(amount * PLATFORM_FEE_RATE)), 0)
 
 
 def _get_inventory(db: Session, inventory_id: str) -> Inventory:
@@ -20,16 +33,47 @@ def _get_inventory(db: Session, inventory_id: str) -> Inventory:
     return item
 
 
-def _get_escrow(db: Session, inventory_id: str) -> Escrow:
-    escrow = db.query(Escrow).filter(Escrow.inventory_id == inventory_id).first()
+def _find_escrow(db: Session, model, inventory_id: str, escrow_id: str | None):
+    # Lots with partial fills have several escrows; without an id the newest one is used.
+    query = db.query(model).filter(model.inventory_id == inventory_id)
+    if escrow_id:
+        query = query.filter(model.id == escrow_id)
+    return query.order_by(model.created_at.desc()).first()
+
+
+def _get_escrow(db: Session, inventory_id: str, escrow_id: str | None = None) -> Escrow:
+    escrow = _find_escrow(db, Escrow, inventory_id, escrow_id)
     if not escrow:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Escrow not found")
     return escrow
 
 
 @router.get("/{inventory_id}", response_model=EscrowOut)
-def get_escrow(inventory_id: str, db: Session = Depends(get_db)):
-    return _get_escrow(db, inventory_id)
+def get_escrow(inventory_id: str, escrow_id: str | None = None, db: Session = Depends(get_read_db)):
+    # Escrows of archived lots are still served, from the archive.
+    escrow = _find_escrow(db, Escrow, inventory_id, escrow_id) or _find_escrow(
+        db, ArchivedEscrow, inventory_id, escrow_id
+    )
+    if not escrow:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Escrow not found")
+    return escrow
+
+
+@router.get("/{inventory_id}/fills", response_model=list[EscrowOut])
+def list_fills(
+    inventory_id: str,
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+):
+    # The farmer sees every fill on their lot; buyers see their own.
+    item = db.get(Inventory, inventory_id) or db.get(ArchivedInventory, inventory_id)
+    if not item:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Inventory not found")
+    model = Escrow if isinstance(item, Inventory) else ArchivedEscrow
+    query = db.query(model).filter(model.inventory_id == inventory_id)
+    if item.farmer_id != user.id:
+        query = query.filter(model.buyer_id == user.id)
+    return query.order_by(model.created_at.asc()).all()
 
 
 @router.post("/{inventory_id}/start", response_model=EscrowOut, status_code=status.HTTP_201_CREATED)
@@ -42,25 +86,51 @@ def start_escrow(
     if user.role != UserRole.BUYER:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only buyers can start escrow")
     item = _get_inventory(db, inventory_id)
+    if item.listing_type == ListingType.FIXED:
+        return _start_fill(db, item, user, payload)
 
-    requested_quantity = payload.quantity or item.quantity
-    if requested_quantity > item.quantity:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST, detail="Requested quantity exceeds available stock"
-        )
-    amount = payload.amount or int(item.current_bid * requested_quantity)
-    platform_fee = _calculate_platform_fee(amount)
+    if item.status == InventoryStatus.SOLD:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Lot is already sold")
+    if item.settled_at is not None:
+        # A closed auction belongs to its winner, for the whole lot at the winning bid.
+        if user.id != item.highest_bidder_id:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Auction was won by another buyer")
+        winning_amount = item.current_bid * item.quantity
+        if payload.amount not in (None, winning_amount) or payload.quantity not in (None, item.quantity):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="A won auction settles at the winning bid"
+            )
+        requested_quantity = item.quantity
+        amount = winning_amount
+    else:
+        if item.quantity <= 0:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Lot has no stock left")
+        requested_quantity = payload.quantity or item.quantity
+        if requested_quantity > item.quantity:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Requested quantity exceeds available stock"
+            )
+        amount = payload.amount or int(item.current_bid * requested_quantity)
+    existing = (
+        db.query(Escrow).filter(Escrow.inventory_id == inventory_id, Escrow.stock_reserved.is_(False)).first()
+    )
+    if existing and existing.status != EscrowStatus.PENDING:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Escrow is already past payment")
+
+    platform_fee = calculate_platform_fee(amount)
     item.status = InventoryStatus.NEGOTIATING
+    bump_dashboards(db, user.id, item.farmer_id, item.highest_bidder_id)
+    log_changes(db, item.id)
 
-    existing = db.query(Escrow).filter(Escrow.inventory_id == inventory_id).first()
     if existing:
+        bump_dashboards(db, existing.buyer_id)
         existing.amount = amount
         existing.platform_fee = platform_fee
         existing.requested_quantity = requested_quantity
         existing.buyer_id = user.id
         existing.status = EscrowStatus.PENDING
         db.commit()
-        db.refresh(existing)
+        invalidate_listing(inventory_id)
         return existing
 
     escrow = Escrow(
@@ -73,39 +143,132 @@ def start_escrow(
     )
     db.add(escrow)
     db.commit()
-    db.refresh(escrow)
+    invalidate_listing(inventory_id)
+    return escrow
+
+
+def _start_fill(db: Session, item: Inventory, user: User, payload: EscrowStart) -> Escrow:
+    # FIXED lots are sold in partial fills, each reserved atomically with its own escrow.
+    # Without a quantity the buyer takes what's left; a sold-out lot has nothing to take.
+    if payload.quantity is None and item.quantity <= 0:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Requested quantity exceeds available stock")
+    quantity = payload.quantity or item.quantity
+    farmer_id = item.farmer_id
+    # Abandoned fills on this lot give their stock back before the new one is matched.
+    expired = expire_stale_fills(db, item.id)
+    escrow = reserve_fill(db, item.id, user.id, quantity, payload.amount)
+    if escrow is None:
+        if expired:
+            bump_dashboards(db, farmer_id, *(fill.buyer_id for fill in expired))
+            log_changes(db, item.id)
+            db.commit()
+            invalidate_listing(item.id)
+        else:
+            db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Requested quantity exceeds available stock")
+    bump_dashboards(db, user.id, farmer_id, *(fill.buyer_id for fill in expired))
+    log_changes(db, item.id)
+    db.commit()
+    invalidate_listing(item.id)
+    return escrow
+
+
+@router.post("/{inventory_id}/cancel", response_model=EscrowOut)
+def cancel_escrow_fill(
+    inventory_id: str,
+    escrow_id: str | None = None,
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    # Either side can back out of an unpaid fill; its quantity goes back on the lot.
+    escrow = _get_escrow(db, inventory_id, escrow_id)
+    item = _get_inventory(db, inventory_id)
+    if user.id not in (escrow.buyer_id, item.farmer_id):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not a party to this fill")
+    if not escrow.stock_reserved:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Only partial fills can be cancelled")
+    if not cancel_fill(db, escrow):
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Fill is no longer pending")
+    bump_dashboards(db, escrow.buyer_id, item.farmer_id)
+    log_changes(db, inventory_id)
+    db.commit()
+    invalidate_listing(inventory_id)
     return escrow
 
 
 @router.post("/{inventory_id}/verify", response_model=EscrowOut)
 def verify_escrow(
     inventory_id: str,
+    escrow_id: str | None = None,
     user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    escrow = _get_escrow(db, inventory_id)
+    escrow = _get_escrow(db, inventory_id, escrow_id)
+    if escrow.status == EscrowStatus.CANCELLED:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Fill was cancelled")
     escrow.status = EscrowStatus.VERIFIED
+    bump_listing_dashboards(db, inventory_id, escrow.buyer_id)
     db.commit()
-    db.refresh(escrow)
     return escrow
 
 
 @router.post("/{inventory_id}/release", response_model=EscrowOut)
 def release_escrow(
     inventory_id: str,
+    escrow_id: str | None = None,
     user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    escrow = _get_escrow(db, inventory_id)
+    # Load the escrow and its lot in one round-trip; the lot row lock serializes releases of its fills.
+    query = (
+        db.query(Escrow, Inventory)
+        .join(Inventory, Inventory.id == Escrow.inventory_id)
+        .filter(Escrow.inventory_id == inventory_id)
+    )
+    if escrow_id:
+        query = query.filter(Escrow.id == escrow_id)
+    else:
+        query = query.filter(Escrow.status.not_in((EscrowStatus.RELEASED, EscrowStatus.CANCELLED)))
+    row = query.order_by(Escrow.created_at.desc()).with_for_update(of=Inventory).first()
+    if not row:
+        detail = "Escrow not found" if escrow_id else "No open escrow for this lot"
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=detail)
+    escrow, item = row
+    if escrow.status == EscrowStatus.RELEASED:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Escrow already released")
+    if escrow.status == EscrowStatus.CANCELLED:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Fill was cancelled")
     escrow.status = EscrowStatus.RELEASED
-    escrow.platform_fee = _calculate_platform_fee(escrow.amount)
+    escrow.platform_fee = calculate_platform_fee(escrow.amount)
 
-    item = _get_inventory(db, inventory_id)
     requested_quantity = escrow.requested_quantity or item.quantity
-    remaining = max(item.quantity - requested_quantity, 0)
-    item.quantity = remaining
-    item.status = InventoryStatus.SOLD if remaining == 0 else InventoryStatus.AVAILABLE
+    if requested_quantity > 0:
+        # Clearing price per kg feeds the market index.
+        record_price(db, item, PriceKind.SALE, round(escrow.amount / requested_quantity), requested_quantity)
+    if escrow.stock_reserved:
+        # The fill's quantity already left the lot; it's sold once nothing is left or still open.
+        open_fills = (
+            db.query(Escrow.id)
+            .filter(
+                Escrow.inventory_id == inventory_id,
+                Escrow.id != escrow.id,
+                Escrow.status.not_in((EscrowStatus.RELEASED, EscrowStatus.CANCELLED)),
+            )
+            .first()
+        )
+        if item.quantity == 0 and open_fills is None:
+            item.status = InventoryStatus.SOLD
+    else:
+        remaining = max(item.quantity - requested_quantity, 0)
+        item.quantity = remaining
+        item.status = InventoryStatus.SOLD if remaining == 0 else InventoryStatus.AVAILABLE
+    if item.status == InventoryStatus.SOLD:
+        # Starts the archive retention clock.
+        item.sold_at = datetime.utcnow()
+    bump_dashboards(db, escrow.buyer_id, item.farmer_id, item.highest_bidder_id)
+    log_changes(db, item.id)
 
     db.commit()
-    db.refresh(escrow)
+    invalidate_listing(inventory_id)
     return escrow
@@ -0,0 +1,134 @@
+import csv
+import enum
+import io
+import json
+import os
+from datetime import datetime
+from typing import AsyncIterator, Iterator
+
+import anyio
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+
+from ..core.deps import require_admin
+from ..db import SessionLocal, replica_usable
+from ..models import (
+    ArchivedEscrow,
+    ArchivedInventory,
+    ArchivedMessage,
+    Escrow,
+    EscrowStatus,
+    Inventory,
+    InventoryStatus,
+    Message,
+)
+
+router = APIRouter(prefix="/admin/export", tags=["admin"], dependencies=[Depends(require_admin)])
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+# Exports get their own small thread budget so they never eat the pool serving live requests.
+EXPORT_LIMITER = anyio.CapacityLimiter(int(os.getenv("EXPORT_MAX_CONCURRENCY", "2")))
+
+_TABLES = {
+    "inventory": (Inventory.__table__, Inventory.timestamp, InventoryStatus),
+    "messages": (Message.__table__, Message.timestamp, None),
+    "escrow": (Escrow.__table__, Escrow.created_at, EscrowStatus),
+    "inventory_archive": (ArchivedInventory.__table__, ArchivedInventory.timestamp, InventoryStatus),
+    "messages_archive": (ArchivedMessage.__table__, ArchivedMessage.timestamp, None),
+    "escrow_archive": (ArchivedEscrow.__table__, ArchivedEscrow.created_at, EscrowStatus),
+}
+_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _plain(value: object) -> object:
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _export_batches(
+    table_name: str, fmt: str, since: datetime | None, until: datetime | None, status_value: enum.Enum | None
+) -> Iterator[str]:
+    # Server-side cursor with yield_per keeps memory flat no matter how large the table is.
+    table, time_column, _ = _TABLES[table_name]
+    stmt = select(table).order_by(time_column)
+    if since:
+        stmt = stmt.where(time_column >= since)
+    if until:
+        stmt = stmt.where(time_column < until)
+    if status_value is not None:
+        stmt = stmt.where(table.c.status == status_value)
+
+    columns = [column.key for column in table.columns]
+    with SessionLocal() as db:
+        db.info["use_replica"] = replica_usable()
+        result = db.execute(stmt, execution_options={"yield_per": EXPORT_BATCH_SIZE, "stream_results": True})
+        try:
+            if fmt == "csv":
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerow(columns)
+                yield buffer.getvalue()
+            for partition in result.partitions():
+                if fmt == "csv":
+                    buffer = io.StringIO()
+                    writer = csv.writer(buffer)
+                    writer.writerows([[_plain(value) for value in row] for row in partition])
+                    yield buffer.getvalue()
+                else:
+                    yield "".join(
+                        json.dumps({key: _plain(value) for key, value in zip(columns, row)}) + "\n"
+                        for row in partition
+                    )
+        finally:
+            result.close()
+
+
+async def _run_export(batches: Iterator[str]) -> AsyncIterator[str]:
+    # Pull each batch on a worker thread bounded by the export limiter.
+    sentinel = object()
+    try:
+        while True:
+            chunk = await anyio.to_thread.run_sync(next, batches, sentinel, limiter=EXPORT_LIMITER)
+            if chunk is sentinel:
+                break
+            yield chunk
+    finally:
+        # A client that disconnects mid-stream would otherwise leave the cursor and session open
+        # until the generator is garbage collected; closing runs the generator's own cleanup now.
+        with anyio.CancelScope(shield=True):
+            await anyio.to_thread.run_sync(batches.close, limiter=EXPORT_LIMITER)
+
+
+@router.get("/{table_name}")
+def export_table(
+    table_name: str,
+    format: str = "ndjson",
+    since: datetime | None = None,
+    until: datetime | None = None,
+    status_filter: str | None = Query(default=None, alias="status"),
+):
+    if table_name not in _TABLES:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Unknown export table")
+    if format not in _MEDIA_TYPES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Format must be ndjson or csv")
+
+    status_value = None
+    if status_filter:
+        status_enum = _TABLES[table_name][2]
+        if status_enum is None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Table has no status column")
+        try:
+            status_value = status_enum(status_filter)
+        except ValueError as exc:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unknown status") from exc
+
+    filename = f"{table_name}.{format}"
+    return StreamingResponse(
+        _run_export(_export_batches(table_name, format, since, until, status_value)),
+        media_type=_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
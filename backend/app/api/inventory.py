@@ -1,11 +1,47 @@
+import json
 from collections import defaultdict
+from datetime import datetime
 
-from fastapi import APIRouter, Depends, HTTPException, status
+import msgpack
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import RedirectResponse
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import or_, update
 from sqlalchemy.orm import Session
 
-from ..core.deps import get_current_user, get_db
-from ..models import Inventory, InventoryStatus, User, UserRole
-from ..schemas import BidCreate, CropInventoryCreate, CropInventoryOut, HeatPoint, InventoryUpdate, Location
+from ..core.deps import get_current_user, get_db, get_read_db
+from ..models import Escrow, Inventory, InventoryStatus, ListingType, PriceKind, User, UserRole
+from ..schemas import (
+    BidCreate,
+    BulkImportResult,
+    CropInventoryCreate,
+    CropInventoryOut,
+    HeatPoint,
+    InventoryUpdate,
+    Location,
+)
+from ..services.auctions import as_utc, auction_closed, auction_end, scheduler
+from ..services.bulk_import import (
+    IMPORT_CHUNK_SIZE,
+    ImportReport,
+    NotUtf8Error,
+    build_chunk,
+    insert_chunk,
+    iter_lines,
+    iter_records,
+)
+from ..services.changes import CHANGE_FEED_LIMIT, compaction_floor, log_changes, read_changes
+from ..services.dashboard import bump_dashboards
+from ..services.gemini import parse_data_url
+from ..services.listings import (
+    get_archived_listing,
+    get_listing,
+    image_ref,
+    invalidate_listing,
+    inventory_out,
+    listing_image,
+)
+from ..services.market import record_price
 
 router = APIRouter(prefix="/inventory", tags=["inventory"])
 
@@ -15,7 +51,7 @@ def list_inventory(
     crop_name: str | None = None,
     status: InventoryStatus | None = None,
     location: str | None = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     # Keep filters optional so the UI can drive quick searches.
     query = db.query(Inventory)
@@ -27,25 +63,7 @@ def list_inventory(
         query = query.filter(Inventory.location_name == location)
     items = query.order_by(Inventory.timestamp.desc()).all()
 
-    return [
-        CropInventoryOut(
-            id=item.id,
-            farmer_id=item.farmer_id,
-            farmer_name=item.farmer_name,
-            crop_name=item.crop_name,
-            quantity=item.quantity,
-            quality_score=item.quality_score,
-            base_price=item.base_price,
-            current_bid=item.current_bid,
-            highest_bidder_id=item.highest_bidder_id,
-            location=Location(name=item.location_name, lat=item.location_lat, lng=item.location_lng),
-            image_url=item.image_url,
-            timestamp=item.timestamp,
-            status=item.status,
-            listing_type=item.listing_type,
-        )
-        for item in items
-    ]
+    return [inventory_out(item) for item in items]
 
 
 @router.post("", response_model=CropInventoryOut, status_code=status.HTTP_201_CREATED)
@@ -72,34 +90,146 @@ def create_inventory(
         image_url=payload.image_url,
         status=InventoryStatus.AVAILABLE,
         listing_type=payload.listing_type,
+        ends_at=auction_end(payload.listing_type, payload.ends_at, datetime.utcnow()),
     )
     db.add(item)
+    db.flush([item])
+    bump_dashboards(db, user.id)
+    log_changes(db, item.id)
     db.commit()
-    db.refresh(item)
-
-    return CropInventoryOut(
-        id=item.id,
-        farmer_id=item.farmer_id,
-        farmer_name=item.farmer_name,
-        crop_name=item.crop_name,
-        quantity=item.quantity,
-        quality_score=item.quality_score,
-        base_price=item.base_price,
-        current_bid=item.current_bid,
-        highest_bidder_id=item.highest_bidder_id,
-        location=Location(name=item.location_name, lat=item.location_lat, lng=item.location_lng),
-        image_url=item.image_url,
-        timestamp=item.timestamp,
-        status=item.status,
-        listing_type=item.listing_type,
-    )
+    scheduler.schedule(item.id, item.ends_at)
+
+    return inventory_out(item)
+
+
+@router.post("/import", response_model=BulkImportResult)
+async def import_inventory(
+    request: Request,
+    format: str | None = None,
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    # Stream CSV/NDJSON lots in chunks so large co-op spreadsheets never sit in memory.
+    if user.role != UserRole.FARMER:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only farmers can post inventory")
+
+    content_type = request.headers.get("content-type", "")
+    fmt = format or ("csv" if "csv" in content_type else "ndjson")
+    if fmt not in ("csv", "ndjson"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Format must be csv or ndjson")
+
+    report = ImportReport()
+
+    async def flush(records: list[tuple[int, dict | str]]) -> None:
+        row_numbers, rows = build_chunk(user, records, report)
+        if not rows:
+            return
+        try:
+            await run_in_threadpool(insert_chunk, db, rows)
+        except Exception as exc:
+            for row_number in row_numbers:
+                report.add_error(row_number, f"Insert failed: {exc.__class__.__name__}")
+            return
+        report.imported += len(rows)
+        for row in rows:
+            scheduler.schedule(row["id"], row["ends_at"])
+
+    pending: list[tuple[int, dict | str]] = []
+    not_utf8: NotUtf8Error | None = None
+    try:
+        async for record in iter_records(iter_lines(request.stream()), fmt):
+            pending.append(record)
+            if len(pending) >= IMPORT_CHUNK_SIZE:
+                await flush(pending)
+                pending = []
+    except NotUtf8Error as exc:
+        # Earlier chunks are already committed, so the import stops here and reports them.
+        not_utf8 = exc
+    if pending:
+        await flush(pending)
+    if not_utf8 is not None:
+        report.received += 1
+        report.add_error(not_utf8.line, f"{not_utf8}; the rest of the upload was not read")
+
+    return report.result()
+
+
+# Positional row layout for the change feed; clients zip it with each upsert.
+CHANGE_COLUMNS = [
+    "id",
+    "farmer_id",
+    "farmer_name",
+    "crop_name",
+    "quantity",
+    "quality_score",
+    "base_price",
+    "current_bid",
+    "highest_bidder_id",
+    "location_name",
+    "location_lat",
+    "location_lng",
+    "image_url",
+    "timestamp",
+    "status",
+    "listing_type",
+    "ends_at",
+    "settled_at",
+]
+_MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+def _change_value(value: object) -> object:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, InventoryStatus | ListingType):
+        return value.value
+    return value
+
+
+def _change_row(item: Inventory) -> list:
+    # Inline images stay out of the feed, like everywhere else; clients fetch them by URL.
+    return [
+        _change_value(image_ref(item) if column == "image_url" else getattr(item, column))
+        for column in CHANGE_COLUMNS
+    ]
+
+
+@router.get("/changes")
+def inventory_changes(
+    request: Request,
+    since: int = Query(default=0, ge=0),
+    limit: int = Query(default=CHANGE_FEED_LIMIT, ge=1, le=CHANGE_FEED_LIMIT),
+    format: str | None = None,
+    db: Session = Depends(get_db),
+):
+    # Delta sync: listings changed after `since` as compact rows, plus tombstones for removed ones.
+    # Reads the primary, since a lagging replica could hide entries below the returned cursor.
+    if format not in (None, "json", "msgpack"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Format must be json or msgpack")
+    if since and since < compaction_floor(db):
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE, detail="Change cursor is older than the retained log; sync from 0"
+        )
+    batch = read_changes(db, since, limit)
+    payload = {
+        "seq": batch.seq,
+        "more": batch.more,
+        "columns": CHANGE_COLUMNS,
+        "upserts": [_change_row(item) for item in batch.upserts],
+        "deletes": batch.deletes,
+    }
+    headers = {"Cache-Control": "no-store"}
+    accept = request.headers.get("accept", "")
+    if format == "msgpack" or (format is None and any(media in accept for media in _MSGPACK_TYPES)):
+        return Response(msgpack.packb(payload), media_type="application/msgpack", headers=headers)
+    return Response(json.dumps(payload, separators=(",", ":")), media_type="application/json", headers=headers)
 
 
 @router.get("/heatmap", response_model=list[HeatPoint])
 def heatmap_points(
     crop_name: str | None = None,
     status: InventoryStatus | None = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     # Aggregate by location and crop for heatmap visualization.
     query = db.query(Inventory)
@@ -145,31 +275,38 @@ def place_bid(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Inventory not found")
     if item.listing_type != "BIDDING":
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Listing is not open for bidding")
+    if auction_closed(item):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Auction has ended")
     if payload.amount <= item.current_bid:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Bid must exceed current price")
 
-    item.current_bid = payload.amount
-    item.highest_bidder_id = user.id
-    item.status = InventoryStatus.NEGOTIATING
+    previous_bidder_id = item.highest_bidder_id
+    # Conditional update: a concurrent higher bid or the settlement scheduler wins the race cleanly.
+    now = datetime.utcnow()
+    item = db.scalars(
+        update(Inventory)
+        .where(
+            Inventory.id == inventory_id,
+            Inventory.current_bid < payload.amount,
+            Inventory.settled_at.is_(None),
+            or_(Inventory.ends_at.is_(None), Inventory.ends_at > now),
+        )
+        .values(current_bid=payload.amount, highest_bidder_id=user.id, status=InventoryStatus.NEGOTIATING)
+        .returning(Inventory),
+        execution_options={"populate_existing": True},
+    ).first()
+    if item is None:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Outbid or auction ended; refresh and retry")
+
+    bump_dashboards(db, user.id, previous_bidder_id, item.farmer_id)
+    log_changes(db, item.id)
+    # Bids are quotes, not trades: they feed the price index but carry no volume.
+    record_price(db, item, PriceKind.BID, payload.amount, 0)
     db.commit()
-    db.refresh(item)
-
-    return CropInventoryOut(
-        id=item.id,
-        farmer_id=item.farmer_id,
-        farmer_name=item.farmer_name,
-        crop_name=item.crop_name,
-        quantity=item.quantity,
-        quality_score=item.quality_score,
-        base_price=item.base_price,
-        current_bid=item.current_bid,
-        highest_bidder_id=item.highest_bidder_id,
-        location=Location(name=item.location_name, lat=item.location_lat, lng=item.location_lng),
-        image_url=item.image_url,
-        timestamp=item.timestamp,
-        status=item.status,
-        listing_type=item.listing_type,
-    )
+    invalidate_listing(item.id)
+
+    return inventory_out(item)
 
 
 @router.patch("/{inventory_id}", response_model=CropInventoryOut)
@@ -188,27 +325,52 @@ def update_inventory(
     if item.farmer_id != user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not your inventory listing")
 
+    if payload.ends_at is not None:
+        # Setting a new end time reopens a settled auction, so only unsold auctions without a deal qualify.
+        if (payload.listing_type or item.listing_type) != ListingType.BIDDING:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Only auctions have an end time")
+        if item.status == InventoryStatus.SOLD:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Lot is already sold")
+        if db.query(Escrow.id).filter(Escrow.inventory_id == item.id).first() is not None:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Lot already has an escrow")
+
     if payload.current_bid is not None:
         item.current_bid = payload.current_bid
     if payload.listing_type is not None:
         item.listing_type = payload.listing_type
+        if payload.listing_type != ListingType.BIDDING:
+            item.ends_at = None
+    if payload.ends_at is not None:
+        item.ends_at = as_utc(payload.ends_at)
+        item.settled_at = None
 
+    bump_dashboards(db, user.id, item.highest_bidder_id)
+    log_changes(db, item.id)
     db.commit()
-    db.refresh(item)
-
-    return CropInventoryOut(
-        id=item.id,
-        farmer_id=item.farmer_id,
-        farmer_name=item.farmer_name,
-        crop_name=item.crop_name,
-        quantity=item.quantity,
-        quality_score=item.quality_score,
-        base_price=item.base_price,
-        current_bid=item.current_bid,
-        highest_bidder_id=item.highest_bidder_id,
-        location=Location(name=item.location_name, lat=item.location_lat, lng=item.location_lng),
-        image_url=item.image_url,
-        timestamp=item.timestamp,
-        status=item.status,
-        listing_type=item.listing_type,
-    )
+    invalidate_listing(item.id)
+    scheduler.schedule(item.id, item.ends_at)
+
+    return inventory_out(item)
+
+
+@router.get("/{inventory_id}", response_model=CropInventoryOut)
+def get_inventory(inventory_id: str, db: Session = Depends(get_read_db)):
+    listing = get_listing(db, inventory_id) or get_archived_listing(db, inventory_id)
+    if listing is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Inventory not found")
+    return listing
+
+
+@router.get("/{inventory_id}/image")
+def get_inventory_image(inventory_id: str, db: Session = Depends(get_read_db)):
+    # Listing payloads link here instead of embedding the upload; images never change once posted.
+    image_url = listing_image(db, inventory_id)
+    if not image_url:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+    if not image_url.startswith("data:"):
+        return RedirectResponse(image_url)
+    try:
+        mime_type, content = parse_data_url(image_url)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found") from exc
+    return Response(content, media_type=mime_type, headers={"Cache-Control": "public, max-age=86400, immutable"})
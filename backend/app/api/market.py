@@ -0,0 +1,66 @@
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+
+from ..core.deps import get_read_db
+from ..models import PriceKind, PriceRollup
+from ..schemas import PricePoint
+from ..services.auctions import as_utc
+from ..services.market import ALL, GRANULARITIES
+
+router = APIRouter(prefix="/market", tags=["market"])
+MAX_POINTS = 500
+
+
+@router.get("/prices", response_model=list[PricePoint])
+def market_prices(
+    crop_name: str,
+    hub: str = ALL,
+    quality_band: str = ALL,
+    granularity: str = "day",
+    kind: PriceKind = PriceKind.SALE,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    db: Session = Depends(get_read_db),
+):
+    # One indexed read of the rollup rows; raw events are never scanned here.
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Granularity must be hour or day")
+    # Buckets are stored as naive UTC; offsets in the query string are converted to match.
+    until = as_utc(until) or datetime.utcnow()
+    since = as_utc(since) or until - GRANULARITIES[granularity] * 30
+    if until - since > GRANULARITIES[granularity] * MAX_POINTS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Requested range is too long")
+
+    rollups = (
+        db.query(PriceRollup)
+        .filter(
+            PriceRollup.granularity == granularity,
+            PriceRollup.kind == kind,
+            PriceRollup.crop_name == crop_name,
+            PriceRollup.hub == hub,
+            PriceRollup.quality_band == quality_band,
+            PriceRollup.bucket_start >= since,
+            PriceRollup.bucket_start < until,
+        )
+        .order_by(PriceRollup.bucket_start.asc())
+        .all()
+    )
+    return [
+        PricePoint(
+            bucket_start=rollup.bucket_start,
+            granularity=rollup.granularity,
+            kind=rollup.kind,
+            crop_name=rollup.crop_name,
+            hub=rollup.hub,
+            quality_band=rollup.quality_band,
+            event_count=rollup.event_count,
+            volume=rollup.volume,
+            min_price=rollup.min_price,
+            max_price=rollup.max_price,
+            median_price=rollup.median_price,
+            vwap=rollup.vwap,
+        )
+        for rollup in rollups
+    ]
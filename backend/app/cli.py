@@ -0,0 +1,176 @@
+import argparse
+import logging
+import time
+
+from .db import SessionLocal, engine
+from .migrations import LATEST_VERSION, current_version, migrate
+from .seed import generate_synthetic_data, seed_data
+from .services.auctions import settle_due_auctions
+from .services.changes import CHANGE_LOG_RETENTION_HOURS, compact_changes, log_changes
+from .services.chat_history import CHAT_ARCHIVE_AFTER_DAYS, archive_closed_threads
+from .services.dashboard import bump_listing_dashboards
+from .services.escrow import ESCROW_EXPIRY_BATCH, ESCROW_FILL_TTL_MINUTES, expire_stale_fills
+from .services.listing_archive import INVENTORY_ARCHIVE_AFTER_DAYS, archive_sold_listings
+from .services.listings import invalidate_listing
+from .services.market import MARKET_ROLLUP_BATCH, fill_medians, roll_up_prices
+
+
+def _migrate(args: argparse.Namespace) -> None:
+    applied = migrate(engine)
+    if applied:
+        print(f"Applied migrations: {', '.join(str(n) for n in applied)}")
+    else:
+        print(f"Schema already at version {LATEST_VERSION}")
+
+
+def _version(args: argparse.Namespace) -> None:
+    with engine.connect() as connection:
+        print(f"Schema version {current_version(connection)} (latest {LATEST_VERSION})")
+
+
+def _seed(args: argparse.Namespace) -> None:
+    with SessionLocal() as db:
+        seed_data(db)
+    print("Demo data ready")
+
+
+def _generate(args: argparse.Namespace) -> None:
+    started = time.perf_counter()
+
+    def progress(table: str, count: int) -> None:
+        print(f"  {table}: {count:,} rows ({time.perf_counter() - started:.1f}s)", flush=True)
+
+    with SessionLocal() as db:
+        counts = generate_synthetic_data(
+            db,
+            farmers=args.farmers,
+            buyers=args.buyers,
+            listings=args.listings,
+            messages=args.messages,
+            escrow_share=args.escrow_share,
+            days=args.days,
+            seed=args.seed,
+            batch_size=args.batch_size,
+            progress=progress,
+        )
+    summary = ", ".join(f"{count:,} {table}" for table, count in counts.items())
+    print(f"Generated {summary} in {time.perf_counter() - started:.1f}s")
+
+
+def _archive_messages(args: argparse.Namespace) -> None:
+    with SessionLocal() as db:
+        moved = archive_closed_threads(db, older_than_days=args.days)
+    print(f"Archived {moved:,} messages")
+
+
+def _archive_listings(args: argparse.Namespace) -> None:
+    with SessionLocal() as db:
+        moved = archive_sold_listings(db, older_than_days=args.days)
+    print(f"Archived {moved:,} sold listings")
+
+
+def _settle_auctions(args: argparse.Namespace) -> None:
+    with SessionLocal() as db:
+        settled = settle_due_auctions(db)
+    print(f"Settled {settled:,} auctions")
+
+
+def _rollup_prices(args: argparse.Namespace) -> None:
+    total = 0
+    with SessionLocal() as db:
+        while True:
+            count = roll_up_prices(db, limit=args.batch_size)
+            total += count
+            if count < args.batch_size:
+                break
+        medians = 0
+        while True:
+            count = fill_medians(db, limit=args.batch_size)
+            medians += count
+            if count < args.batch_size:
+                break
+    print(f"Rolled up {total:,} price events, {medians:,} bucket medians")
+
+
+def _expire_fills(args: argparse.Namespace) -> None:
+    total = 0
+    with SessionLocal() as db:
+        while True:
+            expired = expire_stale_fills(db, ttl_minutes=args.minutes, limit=args.batch_size)
+            buyers: dict[str, set[str]] = {}
+            for fill in expired:
+                buyers.setdefault(fill.inventory_id, set()).add(fill.buyer_id)
+            for inventory_id, buyer_ids in buyers.items():
+                bump_listing_dashboards(db, inventory_id, *buyer_ids)
+            log_changes(db, *buyers)
+            db.commit()
+            for inventory_id in buyers:
+                invalidate_listing(inventory_id)
+            total += len(expired)
+            if len(expired) < args.batch_size:
+                break
+    print(f"Cancelled {total:,} expired fills")
+
+
+def _compact_changes(args: argparse.Namespace) -> None:
+    with SessionLocal() as db:
+        removed = compact_changes(db, retention_hours=args.hours)
+    print(f"Removed {removed:,} change log entries")
+
+
+def main(argv: list[str] | None = None) -> None:
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="ShambaSmart maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("migrate", help="Apply pending schema migrations").set_defaults(handler=_migrate)
+    commands.add_parser("version", help="Show the recorded schema version").set_defaults(handler=_version)
+    commands.add_parser("seed", help="Insert demo users and listings").set_defaults(handler=_seed)
+
+    generate = commands.add_parser("generate", help="Bulk-load deterministic synthetic data")
+    generate.add_argument("--farmers", type=int, default=2000)
+    generate.add_argument("--buyers", type=int, default=1000)
+    generate.add_argument("--listings", type=int, default=100_000)
+    generate.add_argument("--messages", type=int, default=300_000)
+    generate.add_argument("--escrow-share", type=float, default=0.15, help="Fraction of listings with an escrow")
+    generate.add_argument("--days", type=int, default=180, help="How far back timestamps are spread")
+    generate.add_argument("--seed", type=int, default=42)
+    generate.add_argument("--batch-size", type=int, default=5000)
+    generate.set_defaults(handler=_generate)
+
+    archive = commands.add_parser("archive-messages", help="Move chat threads of sold listings to the archive")
+    archive.add_argument("--days", type=int, default=CHAT_ARCHIVE_AFTER_DAYS, help="Days since the last message")
+    archive.set_defaults(handler=_archive_messages)
+
+    archive_listings = commands.add_parser(
+        "archive-listings", help="Move sold listings with their escrows and messages to the archive"
+    )
+    archive_listings.add_argument(
+        "--days", type=int, default=INVENTORY_ARCHIVE_AFTER_DAYS, help="Days since the sale"
+    )
+    archive_listings.set_defaults(handler=_archive_listings)
+
+    commands.add_parser("settle-auctions", help="Close auctions past their end time").set_defaults(
+        handler=_settle_auctions
+    )
+
+    rollup = commands.add_parser("rollup-prices", help="Fold pending price events into the market rollups and fill closed medians")
+    rollup.add_argument("--batch-size", type=int, default=MARKET_ROLLUP_BATCH)
+    rollup.set_defaults(handler=_rollup_prices)
+
+    expire = commands.add_parser("expire-fills", help="Return the stock of fills left unpaid past their TTL")
+    expire.add_argument("--minutes", type=float, default=ESCROW_FILL_TTL_MINUTES)
+    expire.add_argument("--batch-size", type=int, default=ESCROW_EXPIRY_BATCH)
+    expire.set_defaults(handler=_expire_fills)
+
+    compact = commands.add_parser("compact-changes", help="Drop superseded and expired inventory change entries")
+    compact.add_argument(
+        "--hours", type=float, default=CHANGE_LOG_RETENTION_HOURS, help="How long tombstones are kept"
+    )
+    compact.set_defaults(handler=_compact_changes)
+
+    args = parser.parse_args(argv)
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+import asyncio
+import json
+import math
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+
+from jose import JWTError, jwt
+
+from .metrics import Counter, Gauge, Histogram
+from .security import JWT_ALGORITHM, JWT_SECRET
+
+
+@dataclass(frozen=True)
+class AdmissionPolicy:
+    concurrency: int
+    queue: int
+    max_wait: float
+    # Per-user token bucket; None disables rate limiting for the bulkhead.
+    rate: float | None = None
+    burst: int = 1
+    # Methods the rate limit applies to; None means every method.
+    rate_methods: frozenset[str] | None = None
+
+
+def _methods(value: str | None, default: frozenset[str] | None) -> frozenset[str] | None:
+    if value is None:
+        return default
+    methods = frozenset(method.strip().upper() for method in value.split(",") if method.strip())
+    return None if not methods or "*" in methods else methods
+
+
+def _policy(name: str, default: AdmissionPolicy) -> AdmissionPolicy:
+    # Each field can be overridden with ADMISSION_<NAME>_<FIELD>, e.g. ADMISSION_ANALYSIS_CONCURRENCY=8.
+    prefix = f"ADMISSION_{name.upper()}_"
+    rate = os.getenv(prefix + "RATE")
+    return AdmissionPolicy(
+        concurrency=int(os.getenv(prefix + "CONCURRENCY", default.concurrency)),
+        queue=int(os.getenv(prefix + "QUEUE", default.queue)),
+        max_wait=float(os.getenv(prefix + "MAX_WAIT", default.max_wait)),
+        rate=(float(rate) or None) if rate is not None else default.rate,
+        burst=int(os.getenv(prefix + "BURST", default.burst)),
+        rate_methods=_methods(os.getenv(prefix + "RATE_METHODS"), default.rate_methods),
+    )
+
+
+# Router prefix -> policy. Expensive model-backed routes get a small bulkhead so they
+# can't exhaust the threadpool that cheap listing and chat reads depend on. Chat only
+# rate-limits sends: reads are polled by dashboards and must not run out of tokens.
+ROUTER_POLICIES: dict[str, AdmissionPolicy] = {
+    "/analysis": _policy("analysis", AdmissionPolicy(concurrency=4, queue=8, max_wait=2.0, rate=0.2, burst=3)),
+    "/admin": _policy("admin", AdmissionPolicy(concurrency=2, queue=2, max_wait=1.0)),
+    "/inventory": _policy("inventory", AdmissionPolicy(concurrency=64, queue=256, max_wait=1.0)),
+    "/chat": _policy(
+        "chat",
+        AdmissionPolicy(
+            concurrency=32, queue=128, max_wait=1.0, rate=5.0, burst=20, rate_methods=frozenset({"POST"})
+        ),
+    ),
+    "/escrow": _policy("escrow", AdmissionPolicy(concurrency=16, queue=64, max_wait=1.0)),
+    "/dashboard": _policy("dashboard", AdmissionPolicy(concurrency=16, queue=64, max_wait=1.0)),
+    "/market": _policy("market", AdmissionPolicy(concurrency=32, queue=128, max_wait=1.0)),
+}
+
+admission_rejections = Counter("admission_rejections_total", "Requests shed before running.", ["bulkhead", "reason"])
+admission_wait_seconds = Histogram(
+    "admission_wait_seconds", "Time spent queued for a bulkhead slot.", ["bulkhead"], (0.001, 0.01, 0.05, 0.1, 0.5, 1, 2, 5)
+)
+
+
+class Shed(Exception):
+    def __init__(self, status: int, reason: str, retry_after: float) -> None:
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Bulkhead:
+    # Concurrency limit with a bounded FIFO queue and a maximum queue wait.
+    # All bookkeeping happens on the event loop, so no locks are needed.
+    def __init__(self, name: str, policy: AdmissionPolicy) -> None:
+        self.name = name
+        self.policy = policy
+        self.active = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    async def acquire(self) -> None:
+        if self.active < self.policy.concurrency and not self._waiters:
+            self.active += 1
+            return
+        if len(self._waiters) >= self.policy.queue:
+            raise Shed(503, "queue_full", self.policy.max_wait)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.policy.max_wait)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                return
+            waiter.cancel()
+            self._waiters.remove(waiter)
+            raise Shed(503, "wait_timeout", self.policy.max_wait) from None
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+            raise
+        finally:
+            admission_wait_seconds.observe(time.perf_counter() - started, self.name)
+
+    def release(self) -> None:
+        # Hand the slot straight to the next live waiter instead of freeing it.
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+class TokenBuckets:
+    def __init__(self, rate: float, burst: int, max_keys: int = 50_000) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: dict[str, tuple[float, float]] = {}
+
+    def take(self, key: str) -> float:
+        # Returns 0 when admitted, otherwise seconds until a token is available.
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (float(self.burst), now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens >= 1:
+            self._buckets[key] = (tokens - 1, now)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+            return 0.0
+        self._buckets[key] = (tokens, now)
+        return (1 - tokens) / self.rate
+
+    def _prune(self, now: float) -> None:
+        # Buckets that have refilled completely carry no state worth keeping.
+        full_after = self.burst / self.rate
+        for key in [k for k, (_, updated) in self._buckets.items() if now - updated > full_after]:
+            del self._buckets[key]
+
+
+def _client_key(scope) -> str:
+    # Rate limits follow the authenticated user, falling back to the client address.
+    for name, value in scope.get("headers", []):
+        if name == b"authorization" and value[:7].lower() == b"bearer ":
+            try:
+                subject = jwt.decode(value[7:].decode(), JWT_SECRET, algorithms=[JWT_ALGORITHM]).get("sub")
+            except JWTError:
+                break
+            if subject:
+                return f"user:{subject}"
+            break
+    client = scope.get("client")
+    return f"ip:{client[0]}" if client else "ip:unknown"
+
+
+class AdmissionMiddleware:
+    # Sheds at the ASGI layer, before the body is read or a worker thread is taken.
+    def __init__(self, app, policies: dict[str, AdmissionPolicy] | None = None) -> None:
+        self.app = app
+        self.bulkheads: list[tuple[str, Bulkhead, TokenBuckets | None]] = []
+        for prefix, policy in sorted((policies or ROUTER_POLICIES).items(), key=lambda p: -len(p[0])):
+            name = prefix.strip("/") or "root"
+            buckets = TokenBuckets(policy.rate, policy.burst) if policy.rate else None
+            self.bulkheads.append((prefix, Bulkhead(name, policy), buckets))
+        Gauge(
+            "admission_active",
+            "Requests holding a bulkhead slot.",
+            ["bulkhead"],
+            collect=lambda: {(b.name,): b.active for _, b, _ in self.bulkheads},
+        )
+        Gauge(
+            "admission_queued",
+            "Requests waiting for a bulkhead slot.",
+            ["bulkhead"],
+            collect=lambda: {(b.name,): len(b._waiters) for _, b, _ in self.bulkheads},
+        )
+
+    def _match(self, path: str):
+        for prefix, bulkhead, buckets in self.bulkheads:
+            if path == prefix or path.startswith(prefix + "/"):
+                return bulkhead, buckets
+        return None, None
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+        bulkhead, buckets = self._match(scope["path"])
+        if bulkhead is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            methods = bulkhead.policy.rate_methods
+            if buckets is not None and (methods is None or scope["method"] in methods):
+                wait = buckets.take(_client_key(scope))
+                if wait:
+                    raise Shed(429, "rate_limited", wait)
+            await bulkhead.acquire()
+        except Shed as shed:
+            admission_rejections.inc(bulkhead.name, shed.reason)
+            await _reject(send, shed)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            bulkhead.release()
+
+
+async def _reject(send, shed: Shed) -> None:
+    detail = "Too many requests" if shed.status == 429 else "Service busy, retry shortly"
+    body = json.dumps({"detail": detail}).encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": shed.status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(shed.retry_after))).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,294 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, NamedTuple, Protocol
+
+from .metrics import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+STALENESS_BUCKETS = (0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+# How long invalidations are remembered locally; a fill that took longer than this is dropped.
+FILL_WINDOW_SECONDS = 30.0
+
+
+class TTLCache:
+    # In-process LRU with per-entry expiry; values are stored with their write time.
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        # Recent deletions by key, so a fill that read its value before one can be refused.
+        self._deleted: OrderedDict[str, float] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> tuple[Any, float] | None:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if now - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return value, now - stored_at
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._store(key, value)
+
+    def _store(self, key: str, value: Any) -> None:
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def fill(self, key: str, value: Any, started: float) -> bool:
+        # Store a value read at `started` (monotonic) unless the key was deleted since then.
+        now = time.monotonic()
+        with self._lock:
+            if now - started > FILL_WINDOW_SECONDS:
+                return False
+            deleted_at = self._deleted.get(key)
+            if deleted_at is not None and deleted_at >= started:
+                return False
+            self._store(key, value)
+        return True
+
+    def delete(self, key: str) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._entries.pop(key, None)
+            self._deleted[key] = now
+            self._deleted.move_to_end(key)
+            while self._deleted and next(iter(self._deleted.values())) < now - FILL_WINDOW_SECONDS:
+                self._deleted.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._deleted.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RemoteTier(Protocol):
+    # Shared tier across workers; values are opaque bytes. Every key carries a version that
+    # invalidations bump, so fills can compare-and-set against the version they started from.
+    def get(self, key: str) -> bytes | None: ...
+
+    def set(self, key: str, value: bytes, ttl: float) -> None: ...
+
+    def delete(self, key: str) -> None: ...
+
+    def version(self, key: str) -> int: ...
+
+    def bump(self, key: str, ttl: float) -> None: ...
+
+    def set_if_version(self, key: str, value: bytes, ttl: float, version: int) -> bool: ...
+
+
+class InMemoryRemoteTier:
+    # Stand-in for the shared tier in tests and single-process setups.
+    def __init__(self) -> None:
+        self._entries: dict[str, tuple[float, bytes]] = {}
+        self._versions: dict[str, tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(key, None)
+                return None
+            return entry[1]
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def _version(self, key: str) -> int:
+        entry = self._versions.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self._versions.pop(key, None)
+            return 0
+        return entry[1]
+
+    def version(self, key: str) -> int:
+        with self._lock:
+            return self._version(key)
+
+    def bump(self, key: str, ttl: float) -> None:
+        with self._lock:
+            self._versions[key] = (time.monotonic() + ttl, self._version(key) + 1)
+
+    def set_if_version(self, key: str, value: bytes, ttl: float, version: int) -> bool:
+        with self._lock:
+            if self._version(key) != version:
+                return False
+            self._entries[key] = (time.monotonic() + ttl, value)
+            return True
+
+
+# Writes the value only while the version key still holds what the filler read.
+_SET_IF_VERSION = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[3] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+return 1
+"""
+
+
+class RedisTier:
+    def __init__(self, url: str) -> None:
+        try:
+            import redis
+        except ImportError as exc:
+            raise RuntimeError("Install the redis package to use a Redis cache tier") from exc
+        self._client = redis.Redis.from_url(url, socket_timeout=0.05)
+        self._set_if_version = self._client.register_script(_SET_IF_VERSION)
+
+    def get(self, key: str) -> bytes | None:
+        return self._client.get(key)
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._client.set(key, value, px=int(ttl * 1000))
+
+    def delete(self, key: str) -> None:
+        self._client.delete(key)
+
+    def version(self, key: str) -> int:
+        return int(self._client.get(f"{key}:v") or 0)
+
+    def bump(self, key: str, ttl: float) -> None:
+        pipe = self._client.pipeline()
+        pipe.incr(f"{key}:v")
+        pipe.pexpire(f"{key}:v", int(ttl * 1000))
+        pipe.execute()
+
+    def set_if_version(self, key: str, value: bytes, ttl: float, version: int) -> bool:
+        return bool(self._set_if_version(keys=[key, f"{key}:v"], args=[value, int(ttl * 1000), version]))
+
+
+def remote_tier(url: str) -> RemoteTier | None:
+    # "memory" selects the in-process stand-in; any other value is a Redis URL.
+    if url == "memory":
+        return InMemoryRemoteTier()
+    if url:
+        return RedisTier(url)
+    return None
+
+
+cache_requests = Counter("object_cache_requests_total", "Object cache lookups.", ["cache", "tier", "result"])
+cache_invalidations = Counter("object_cache_invalidations_total", "Object cache invalidations.", ["cache"])
+cache_fills_refused = Counter(
+    "object_cache_fills_refused_total", "Cache fills dropped because the key was invalidated mid-read.", ["cache"]
+)
+cache_served_age = Histogram(
+    "object_cache_served_age_seconds", "Age of cache entries when served.", ["cache"], STALENESS_BUCKETS
+)
+
+
+class FillToken(NamedTuple):
+    started: float
+    version: int | None
+
+
+class ObjectCache:
+    # Two-tier read-through cache for JSON-serializable objects keyed by id.
+    def __init__(self, name: str, maxsize: int, ttl: float, remote_ttl: float, remote: RemoteTier | None = None) -> None:
+        self.name = name
+        self.local = TTLCache(maxsize, ttl)
+        self.remote = remote
+        self.remote_ttl = remote_ttl
+        self.hits = 0
+        self.misses = 0
+        Gauge(f"{name}_cache_hit_ratio", f"Hit ratio of the {name} cache since start.", collect=self._hit_ratio)
+        Gauge(f"{name}_cache_entries", f"Entries held in the local {name} cache.", collect=lambda: {(): len(self.local)})
+
+    def _hit_ratio(self) -> dict[tuple[str, ...], float]:
+        total = self.hits + self.misses
+        return {(): self.hits / total if total else 0.0}
+
+    def _key(self, key: str) -> str:
+        return f"{self.name}:{key}"
+
+    def get(self, key: str) -> Any | None:
+        started = time.monotonic()
+        cached = self.local.get(key)
+        if cached is not None:
+            value, age = cached
+            self.hits += 1
+            cache_requests.inc(self.name, "local", "hit")
+            cache_served_age.observe(age, self.name)
+            return value
+        if self.remote is not None:
+            try:
+                raw = self.remote.get(self._key(key))
+            except Exception:
+                logger.warning("Remote %s cache read failed", self.name, exc_info=True)
+                raw = None
+            if raw is not None:
+                envelope = json.loads(raw)
+                self.hits += 1
+                cache_requests.inc(self.name, "remote", "hit")
+                cache_served_age.observe(max(time.time() - envelope["stored_at"], 0.0), self.name)
+                self.local.fill(key, envelope["value"], started)
+                return envelope["value"]
+        self.misses += 1
+        cache_requests.inc(self.name, "all", "miss")
+        return None
+
+    def set(self, key: str, value: Any) -> None:
+        # Unconditional write, for keys that are never invalidated (e.g. version-stamped keys).
+        self.local.set(key, value)
+        if self.remote is not None:
+            try:
+                payload = json.dumps({"stored_at": time.time(), "value": value}).encode()
+                self.remote.set(self._key(key), payload, self.remote_ttl)
+            except Exception:
+                logger.warning("Remote %s cache write failed", self.name, exc_info=True)
+
+    def begin_fill(self, key: str) -> FillToken:
+        # Taken before reading the source of truth; fill() refuses the value if the key was
+        # invalidated in between, so a slow reader can't write back a row a writer replaced.
+        version = None
+        if self.remote is not None:
+            try:
+                version = self.remote.version(self._key(key))
+            except Exception:
+                logger.warning("Remote %s cache version read failed", self.name, exc_info=True)
+        return FillToken(time.monotonic(), version)
+
+    def fill(self, key: str, value: Any, token: FillToken) -> None:
+        if not self.local.fill(key, value, token.started):
+            cache_fills_refused.inc(self.name)
+            return
+        if self.remote is not None and token.version is not None:
+            try:
+                payload = json.dumps({"stored_at": time.time(), "value": value}).encode()
+                if not self.remote.set_if_version(self._key(key), payload, self.remote_ttl, token.version):
+                    cache_fills_refused.inc(self.name)
+            except Exception:
+                logger.warning("Remote %s cache write failed", self.name, exc_info=True)
+
+    def invalidate(self, key: str) -> None:
+        cache_invalidations.inc(self.name)
+        self.local.delete(key)
+        if self.remote is not None:
+            try:
+                # Bump first: a fill landing between the two calls then fails its version check.
+                self.remote.bump(self._key(key), self.remote_ttl)
+                self.remote.delete(self._key(key))
+            except Exception:
+                logger.warning("Remote %s cache invalidation failed", self.name, exc_info=True)
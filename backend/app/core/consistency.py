@@ -0,0 +1,30 @@
+from ..db import current_write_marker
+
+# Response header carrying the commit time of the request's last write; clients send it back.
+READ_AFTER_HEADER = "X-Read-After"
+
+
+class ReadYourWritesMiddleware:
+    # Plain ASGI middleware: hands the commit time to the client, which echoes it on later reads.
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        marker: dict = {}
+
+        async def send_wrapper(message) -> None:
+            if message["type"] == "http.response.start" and "committed_at" in marker:
+                headers = list(message.get("headers", []))
+                headers.append((READ_AFTER_HEADER.lower().encode(), f"{marker['committed_at']:.3f}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = current_write_marker.set(marker)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_write_marker.reset(token)
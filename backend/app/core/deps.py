@@ -1,13 +1,17 @@
-from fastapi import Depends, HTTPException, status
+import os
+
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import JWTError, jwt
 from sqlalchemy.orm import Session
 
-from ..db import SessionLocal
+from ..db import SessionLocal, read_after_pending, replica_usable
 from ..models import User
+from .consistency import READ_AFTER_HEADER
 from .security import JWT_ALGORITHM, JWT_SECRET
 
 security = HTTPBearer()
+ADMIN_EMAILS = {e.strip().lower() for e in os.getenv("ADMIN_EMAILS", "").split(",") if e.strip()}
 
 
 def get_db():
@@ -19,6 +23,16 @@ def get_db():
         db.close()
 
 
+def get_read_db(read_after: float | None = Header(default=None, alias=READ_AFTER_HEADER)):
+    # Session for read-only endpoints: served by the replica unless the caller just wrote.
+    db = SessionLocal()
+    db.info["use_replica"] = replica_usable() and not read_after_pending(read_after)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
 def get_current_user(
     creds: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db),
@@ -35,3 +49,10 @@ def get_current_user(
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
     return user
+
+
+def require_admin(user: User = Depends(get_current_user)) -> User:
+    # Admin access is granted by email until the app grows a proper admin role.
+    if user.email.lower() not in ADMIN_EMAILS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return user
@@ -0,0 +1,166 @@
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import weakref
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger("app.queries")
+
+# Dev/test only: capturing stack origins costs far more than the metrics counters.
+QUERY_PROFILE = os.getenv("QUERY_PROFILE", "").lower() in ("1", "true", "yes")
+REPEAT_THRESHOLD = int(os.getenv("QUERY_PROFILE_REPEAT_THRESHOLD", "3"))
+
+_APP_ROOT = Path(__file__).resolve().parents[1]
+_SKIP_FILES = {Path(__file__).resolve(), Path(__file__).resolve().with_name("metrics.py")}
+_WHITESPACE = re.compile(r"\s+")
+_PARAM_LIST = re.compile(r"\((?:\s*(?:\?|%\(\w+\)s|:\w+|\$\d+)\s*,)+\s*(?:\?|%\(\w+\)s|:\w+|\$\d+)\s*\)")
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+@dataclass
+class QueryRecord:
+    statement: str
+    shape: str
+    seconds: float
+    origin: str
+
+
+@dataclass
+class QueryProfile:
+    label: str = ""
+    queries: list[QueryRecord] = field(default_factory=list)
+
+    @property
+    def count(self) -> int:
+        return len(self.queries)
+
+    @property
+    def seconds(self) -> float:
+        return sum(q.seconds for q in self.queries)
+
+    def repeated(self, threshold: int = REPEAT_THRESHOLD) -> list[tuple[str, int]]:
+        # Identical statement shapes issued several times usually mean an N+1 loop.
+        counts = Counter(q.shape for q in self.queries)
+        return [(shape, n) for shape, n in counts.most_common() if n >= threshold]
+
+    def report(self) -> str:
+        lines = [f"{self.label or 'profile'}: {self.count} queries in {self.seconds * 1000:.1f}ms"]
+        for record in self.queries:
+            statement = _WHITESPACE.sub(" ", record.statement)
+            lines.append(f"  {record.seconds * 1000:7.2f}ms  {record.origin}  {statement[:200]}")
+        for shape, n in self.repeated():
+            lines.append(f"  repeated x{n}: {shape[:200]}")
+        return "\n".join(lines)
+
+
+current_profile: ContextVar[QueryProfile | None] = ContextVar("current_profile", default=None)
+# Budgets are tracked globally because test clients run the app on another thread.
+_budgets: list[QueryProfile] = []
+_budgets_lock = threading.Lock()
+_installed: "weakref.WeakSet[Engine]" = weakref.WeakSet()
+
+
+def statement_shape(statement: str) -> str:
+    shape = _WHITESPACE.sub(" ", statement).strip()
+    shape = _PARAM_LIST.sub("(?, ...)", shape)
+    return _LITERAL.sub("?", shape)
+
+
+def _origin() -> str:
+    # First frame inside the app package that isn't this profiling/metrics plumbing.
+    frame = sys._getframe(2)
+    while frame is not None:
+        path = Path(frame.f_code.co_filename)
+        if _APP_ROOT in path.parents and path not in _SKIP_FILES:
+            return f"{path.relative_to(_APP_ROOT.parent)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return "<outside app>"
+
+
+def install_profiler(engine: Engine) -> None:
+    if engine in _installed:
+        return
+    _installed.add(engine)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("profile_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["profile_started"].pop()
+        profile = current_profile.get()
+        with _budgets_lock:
+            targets = list(_budgets)
+        if profile is None and not targets:
+            return
+        record = QueryRecord(statement, statement_shape(statement), elapsed, _origin())
+        if profile is not None:
+            profile.queries.append(record)
+        for budget in targets:
+            if budget is not profile:
+                budget.queries.append(record)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("profile_started"):
+            connection.info["profile_started"].pop()
+
+
+@contextmanager
+def query_budget(max_queries: int, label: str = "", engine: Engine | None = None) -> Iterator[QueryProfile]:
+    # Fail when the wrapped block issues more statements than allowed, e.g. around a test client call.
+    if engine is None:
+        from ..db import engine
+    install_profiler(engine)
+    profile = QueryProfile(label=label or f"budget {max_queries}")
+    with _budgets_lock:
+        _budgets.append(profile)
+    try:
+        yield profile
+    finally:
+        with _budgets_lock:
+            _budgets.remove(profile)
+    if profile.count > max_queries:
+        raise AssertionError(f"Query budget exceeded ({profile.count} > {max_queries})\n{profile.report()}")
+
+
+class QueryProfilerMiddleware:
+    # Logs every statement per request and warns on repeated shapes; enable with QUERY_PROFILE=1.
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = QueryProfile(label=f"{scope['method']} {scope['path']}")
+        token = current_profile.set(profile)
+
+        async def send_wrapper(message) -> None:
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = [*message["headers"], (b"x-query-count", str(profile.count).encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_profile.reset(token)
+            if profile.repeated():
+                logger.warning("Possible N+1 query pattern\n%s", profile.report())
+            elif profile.queries:
+                logger.info("%s", profile.report())
@@ -0,0 +1,12 @@
+# Aggregation hubs in Nakuru County, shared by the offline parser and synthetic data.
+HUBS: dict[str, tuple[float, float]] = {
+    "Molo": (-0.2489, 35.7321),
+    "Bahati": (-0.1477, 36.1558),
+    "Naivasha": (-0.7167, 36.4333),
+    "Gilgil": (-0.4989, 36.3204),
+    "Njoro": (-0.3411, 35.9400),
+    "Rongai": (-0.1736, 35.8636),
+    "Subukia": (0.0011, 36.2300),
+    "Kuresoi": (-0.2833, 35.5500),
+    "Nakuru CBD": (-0.2833, 36.0667),
+}
@@ -1,17 +1,29 @@
+import logging
+import math
 import os
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import text
 
-from .api import analysis, auth, chat, escrow, inventory
-from .db import Base, SessionLocal, engine
-from .seed import seed_data
+from .api import analysis, auth, chat, dashboard, escrow, export, inventory, market
+from .core.admission import AdmissionMiddleware
+from .core.consistency import READ_AFTER_HEADER, ReadYourWritesMiddleware
+from .core.metrics import Gauge, MetricsMiddleware, instrument_engine, render_metrics
+from .core.profiler import QUERY_PROFILE, QueryProfilerMiddleware, install_profiler
+from .db import REPLICA_MAX_LAG_SECONDS, engine, replica_engine, replica_lag_seconds
+from .migrations import LATEST_VERSION, current_version
+from .services.auctions import AUCTION_SCHEDULER, scheduler as auction_scheduler
+from .services.market import MARKET_ROLLUP_WORKER, rollup_worker
 
 APP_NAME = os.getenv("APP_NAME", "ShambaSmart API")
 
+logger = logging.getLogger(__name__)
+
 app = FastAPI(title=APP_NAME)
 
+app.add_middleware(ReadYourWritesMiddleware)
+# Added before CORS so it sits inside it: shed responses still carry CORS headers.
+app.add_middleware(AdmissionMiddleware)
 origins = os.getenv("CORS_ORIGINS", "http://localhost:3000").split(",")
 app.add_middleware(
     CORSMiddleware,
@@ -19,46 +31,41 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"] ,
     allow_headers=["*"],
+    expose_headers=[READ_AFTER_HEADER],
 )
+app.add_middleware(MetricsMiddleware)
+instrument_engine(engine)
+if replica_engine is not None:
+    instrument_engine(replica_engine)
+    Gauge(
+        "db_replica_lag_seconds",
+        "Replication lag of the read replica.",
+        collect=lambda: {(): replica_lag_seconds(max_age=0)},
+    )
+if QUERY_PROFILE:
+    app.add_middleware(QueryProfilerMiddleware)
+    install_profiler(engine)
+    if replica_engine is not None:
+        install_profiler(replica_engine)
 
 
 @app.on_event("startup")
 def on_startup() -> None:
-    # Keep the demo DB ready on boot so the UI has something to render.
-    Base.metadata.create_all(bind=engine)
-    if engine.dialect.name == "postgresql":
-        # Ensure image payloads can exceed the old VARCHAR length and add listing type if missing.
-        with engine.begin() as connection:
-            connection.execute(text("ALTER TABLE inventory ALTER COLUMN image_url TYPE TEXT"))
-            connection.execute(
-                text(
-                    "DO $$ BEGIN "
-                    "IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'listing_type') THEN "
-                    "CREATE TYPE listing_type AS ENUM ('BIDDING', 'FIXED'); "
-                    "END IF; "
-                    "END $$;"
-                )
-            )
-            connection.execute(
-                text(
-                    "ALTER TABLE inventory "
-                    "ADD COLUMN IF NOT EXISTS listing_type listing_type DEFAULT 'BIDDING'"
-                )
-            )
-            connection.execute(
-                text(
-                    "ALTER TABLE escrow "
-                    "ADD COLUMN IF NOT EXISTS requested_quantity INTEGER"
-                )
-            )
-            connection.execute(
-                text(
-                    "ALTER TABLE escrow "
-                    "ADD COLUMN IF NOT EXISTS platform_fee INTEGER DEFAULT 0"
-                )
-            )
-    with SessionLocal() as db:
-        seed_data(db)
+    # Schema changes run through `python -m app.cli migrate`; only warn here so boot stays fast.
+    with engine.connect() as connection:
+        version = current_version(connection)
+    if version < LATEST_VERSION:
+        logger.warning("Database schema is at version %s, expected %s; run migrations", version, LATEST_VERSION)
+    if AUCTION_SCHEDULER:
+        auction_scheduler.start()
+    if MARKET_ROLLUP_WORKER:
+        rollup_worker.start()
+
+
+@app.on_event("shutdown")
+def on_shutdown() -> None:
+    auction_scheduler.stop()
+    rollup_worker.stop()
 
 
 @app.get("/health")
@@ -67,8 +74,28 @@ def health() -> dict[str, str]:
     return {"status": "ok"}
 
 
+@app.get("/health/replica")
+def replica_health() -> dict[str, object]:
+    # Reads fall back to the primary whenever the replica lags past the threshold.
+    lag = replica_lag_seconds(max_age=0)
+    return {
+        "configured": lag is not None,
+        "lag_seconds": lag if lag is None or math.isfinite(lag) else None,
+        "serving_reads": lag is not None and lag <= REPLICA_MAX_LAG_SECONDS,
+    }
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics() -> Response:
+    # Prometheus text exposition format.
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 app.include_router(auth.router)
 app.include_router(inventory.router)
 app.include_router(analysis.router)
 app.include_router(chat.router)
 app.include_router(escrow.router)
+app.include_router(export.router)
+app.include_router(market.router)
+app.include_router(dashboard.router)
@@ -0,0 +1,477 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Callable
+
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Column,
+    DateTime,
+    Enum,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Text,
+    UniqueConstraint,
+    false,
+    inspect,
+    select,
+    text,
+)
+from sqlalchemy.engine import Connection, Engine
+
+from .services.changes import backfill_changes
+from .services.inbox import rebuild_conversations
+from .services.offline_ingest import OFFLINE_DEDUPE_WINDOW_HOURS
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary key shared by every process that runs migrations against this database.
+MIGRATION_LOCK_ID = 7_240_001
+
+_version_metadata = MetaData()
+schema_version = Table(
+    "schema_version",
+    _version_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(200), nullable=False),
+    Column("applied_at", DateTime, nullable=False, default=datetime.utcnow),
+)
+
+# Tables as each migration first created them. They are frozen here rather than taken from
+# the models, so editing a model never changes what an old migration builds; every later
+# change is a migration of its own. tests/test_migrations.py checks the result matches models.
+_frozen = MetaData()
+_Sequence = BigInteger().with_variant(Integer, "sqlite")
+
+
+_inventory_status = Enum("AVAILABLE", "NEGOTIATING", "SOLD", name="inventorystatus")
+_listing_type = Enum("BIDDING", "FIXED", name="listing_type")
+_escrow_status = Enum("PENDING", "VERIFIED", "RELEASED", name="escrowstatus")
+_price_kind = Enum("BID", "SALE", name="pricekind")
+
+_users = Table(
+    "users",
+    _frozen,
+    Column("id", String, primary_key=True),
+    Column("name", String(120), nullable=False),
+    Column("email", String(255), nullable=False),
+    Column("role", Enum("FARMER", "BUYER", name="userrole"), nullable=False),
+    Column("location", String(120), nullable=False),
+    Column("rating", Float),
+    Column("hashed_password", String(255), nullable=False),
+    Column("created_at", DateTime, nullable=False),
+    Index("ix_users_email", "email", unique=True),
+)
+_inventory = Table(
+    "inventory",
+    _frozen,
+    Column("id", String, primary_key=True),
+    Column("farmer_id", String, ForeignKey("users.id"), nullable=False),
+    Column("farmer_name", String(120), nullable=False),
+    Column("crop_name", String(120), nullable=False),
+    Column("quantity", Integer, nullable=False),
+    Column("quality_score", Integer, nullable=False),
+    Column("base_price", Integer, nullable=False),
+    Column("current_bid", Integer, nullable=False),
+    Column("highest_bidder_id", String),
+    Column("location_name", String(120), nullable=False),
+    Column("location_lat", Float, nullable=False),
+    Column("location_lng", Float, nullable=False),
+    Column("image_url", Text),
+    Column("timestamp", DateTime, nullable=False),
+    Column("status", _inventory_status, nullable=False),
+    Column("listing_type", _listing_type, nullable=False),
+)
+_messages = Table(
+    "messages",
+    _frozen,
+    Column("id", String, primary_key=True),
+    Column("inventory_id", String, ForeignKey("inventory.id"), nullable=False),
+    Column("sender_id", String, ForeignKey("users.id"), nullable=False),
+    Column("text", String(2000), nullable=False),
+    Column("timestamp", DateTime, nullable=False),
+)
+
+
+def _escrow_table(metadata: MetaData, *extra) -> Table:
+    return Table(
+        "escrow",
+        metadata,
+        Column("id", String, primary_key=True),
+        Column("inventory_id", String, ForeignKey("inventory.id"), nullable=False),
+        Column("buyer_id", String, ForeignKey("users.id"), nullable=False),
+        Column("amount", Integer, nullable=False),
+        Column("platform_fee", Integer, nullable=False),
+        Column("requested_quantity", Integer),
+        *extra,
+        Column("status", _escrow_status, nullable=False),
+        Column("created_at", DateTime, nullable=False),
+        Column("updated_at", DateTime, nullable=False),
+    )
+
+
+_escrow = _escrow_table(_frozen, UniqueConstraint("inventory_id"))
+# Escrow as migration 8 leaves it on SQLite, where dropping the unique constraint means a rebuild.
+_rebuilt = MetaData()
+_users.to_metadata(_rebuilt)
+_inventory.to_metadata(_rebuilt)
+_escrow_v8 = _escrow_table(_rebuilt, Column("stock_reserved", Boolean, nullable=False, server_default=false()))
+
+
+def _m0001_initial_tables(connection: Connection) -> None:
+    # Tables as they stood before migrations existed; checkfirst keeps old databases intact.
+    _frozen.create_all(connection, tables=[_users, _inventory, _messages, _escrow], checkfirst=True)
+
+
+def _m0002_listing_type_and_escrow_fees(connection: Connection) -> None:
+    # Columns that used to be patched in on every startup.
+    if connection.dialect.name != "postgresql":
+        return
+    connection.execute(text("ALTER TABLE inventory ALTER COLUMN image_url TYPE TEXT"))
+    connection.execute(
+        text(
+            "DO $$ BEGIN "
+            "IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'listing_type') THEN "
+            "CREATE TYPE listing_type AS ENUM ('BIDDING', 'FIXED'); "
+            "END IF; "
+            "END $$;"
+        )
+    )
+    connection.execute(
+        text("ALTER TABLE inventory ADD COLUMN IF NOT EXISTS listing_type listing_type DEFAULT 'BIDDING'")
+    )
+    connection.execute(text("ALTER TABLE escrow ADD COLUMN IF NOT EXISTS requested_quantity INTEGER"))
+    connection.execute(text("ALTER TABLE escrow ADD COLUMN IF NOT EXISTS platform_fee INTEGER DEFAULT 0"))
+
+
+_price_events = Table(
+    "price_events",
+    _frozen,
+    Column("id", String, primary_key=True),
+    Column("inventory_id", String, nullable=False),
+    Column("kind", _price_kind, nullable=False),
+    Column("crop_name", String(120), nullable=False),
+    Column("hub", String(120), nullable=False),
+    Column("quality_band", String(1), nullable=False),
+    Column("price", Integer, nullable=False),
+    Column("quantity", Integer, nullable=False),
+    Column("occurred_at", DateTime, nullable=False),
+    Index("ix_price_events_bucket", "kind", "crop_name", "hub", "quality_band", "occurred_at"),
+    Index("ix_price_events_crop", "kind", "crop_name", "occurred_at"),
+)
+_price_rollups = Table(
+    "price_rollups",
+    _frozen,
+    Column("id", String, primary_key=True),
+    Column("granularity", String(8), nullable=False),
+    Column("kind", _price_kind, nullable=False),
+    Column("crop_name", String(120), nullable=False),
+    Column("hub", String(120), nullable=False),
+    Column("quality_band", String(1), nullable=False),
+    Column("bucket_start", DateTime, nullable=False),
+    Column("event_count", Integer, nullable=False),
+    Column("volume", BigInteger, nullable=False),
+    Column("price_volume", BigInteger, nullable=False),
+    Column("min_price", Integer, nullable=False),
+    Column("max_price", Integer, nullable=False),
+    Column("median_price", Float, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+    UniqueConstraint(
+        "granularity", "kind", "crop_name", "hub", "quality_band", "bucket_start", name="uq_price_rollups_bucket"
+    ),
+)
+
+
+def _m0003_price_index(connection: Connection) -> None:
+    _frozen.create_all(connection, tables=[_price_events, _price_rollups], checkfirst=True)
+
+
+def _create_index(connection: Connection, name: str, table: str, columns: str, where: str | None = None) -> None:
+    # Indexes added to existing tables, spelled out like the columns below.
+    ddl = f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"
+    connection.execute(text(f"{ddl} WHERE {where}" if where else ddl))
+
+
+def _add_column(connection: Connection, table: str, column: str, ddl: str) -> None:
+    # Columns added after a table was first created.
+    if column not in {c["name"] for c in inspect(connection).get_columns(table)}:
+        connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def _drop_column(connection: Connection, table: str, column: str) -> None:
+    if column in {c["name"] for c in inspect(connection).get_columns(table)}:
+        connection.execute(text(f"ALTER TABLE {table} DROP COLUMN {column}"))
+
+
+_messages_archive = Table(
+    "messages_archive",
+    _frozen,
+    Column("id", String, primary_key=True),
+    Column("inventory_id", String, nullable=False),
+    Column("sender_id", String, nullable=False),
+    Column("text", String(2000), nullable=False),
+    Column("timestamp", DateTime, nullable=False),
+    Column("archived_at", DateTime, nullable=False),
+    Index("ix_messages_archive_thread", "inventory_id", "timestamp", "id"),
+)
+
+
+def _m0004_message_archive(connection: Connection) -> None:
+    _create_index(connection, "ix_messages_thread", "messages", "inventory_id, timestamp, id")
+    _frozen.create_all(connection, tables=[_messages_archive], checkfirst=True)
+
+
+_conversations = Table(
+    "conversations",
+    _frozen,
+    Column("inventory_id", String, ForeignKey("inventory.id"), primary_key=True),
+    Column("message_count", Integer, nullable=False),
+    Column("last_message_id", String, nullable=False),
+    Column("last_message_text", String(200), nullable=False),
+    Column("last_sender_id", String, nullable=False),
+    Column("last_sender_name", String(120)),
+    Column("last_message_at", DateTime, nullable=False),
+)
+_conversation_members = Table(
+    "conversation_members",
+    _frozen,
+    Column("inventory_id", String, ForeignKey("conversations.inventory_id"), primary_key=True),
+    Column("user_id", String, ForeignKey("users.id"), primary_key=True),
+    Column("read_count", Integer, nullable=False),
+    Column("last_read_at", DateTime),
+    Index("ix_conversation_members_user", "user_id", "inventory_id"),
+)
+
+
+def _m0005_conversation_summaries(connection: Connection) -> None:
+    _frozen.create_all(connection, tables=[_conversations, _conversation_members], checkfirst=True)
+    rebuild_conversations(connection)
+
+
+def _m0006_dashboards(connection: Connection) -> None:
+    _add_column(connection, "users", "dashboard_version", "INTEGER NOT NULL DEFAULT 0")
+    _create_index(connection, "ix_inventory_farmer", "inventory", "farmer_id, timestamp")
+    _create_index(connection, "ix_inventory_highest_bidder", "inventory", "highest_bidder_id")
+    _create_index(connection, "ix_escrow_buyer", "escrow", "buyer_id")
+
+
+def _m0007_auction_end_times(connection: Connection) -> None:
+    _add_column(connection, "inventory", "ends_at", "TIMESTAMP")
+    _add_column(connection, "inventory", "settled_at", "TIMESTAMP")
+    _create_index(
+        connection, "ix_inventory_auction_due", "inventory", "ends_at", "settled_at IS NULL AND ends_at IS NOT NULL"
+    )
+
+
+def _drop_escrow_inventory_unique(connection: Connection) -> None:
+    unique = [
+        constraint
+        for constraint in inspect(connection).get_unique_constraints("escrow")
+        if constraint["column_names"] == ["inventory_id"]
+    ]
+    if not unique:
+        return
+    if connection.dialect.name == "postgresql":
+        connection.execute(text(f'ALTER TABLE escrow DROP CONSTRAINT "{unique[0]["name"]}"'))
+        return
+    # SQLite can't drop an inline constraint, so the table is rebuilt without it and its
+    # indexes are recreated from their own DDL.
+    indexes = connection.execute(
+        text("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = 'escrow' AND sql IS NOT NULL")
+    ).all()
+    columns = ", ".join(column["name"] for column in inspect(connection).get_columns("escrow"))
+    connection.execute(text("ALTER TABLE escrow RENAME TO escrow_old"))
+    for name, _ in indexes:
+        connection.execute(text(f'DROP INDEX "{name}"'))
+    _escrow_v8.create(connection)
+    connection.execute(text(f"INSERT INTO escrow ({columns}) SELECT {columns} FROM escrow_old"))
+    connection.execute(text("DROP TABLE escrow_old"))
+    for _, sql in indexes:
+        connection.execute(text(sql))
+
+
+def _m0008_escrow_fills(connection: Connection) -> None:
+    _add_column(connection, "escrow", "stock_reserved", "BOOLEAN NOT NULL DEFAULT false")
+    _drop_escrow_inventory_unique(connection)
+    _create_index(connection, "ix_escrow_inventory", "escrow", "inventory_id, created_at")
+
+
+_ingested_messages = Table(
+    "ingested_messages",
+    _frozen,
+    Column("key", String(64), primary_key=True),
+    Column("inventory_id", String),
+    Column("ingested_at", DateTime, nullable=False),
+)
+
+
+def _m0009_ingested_messages(connection: Connection) -> None:
+    _frozen.create_all(connection, tables=[_ingested_messages], checkfirst=True)
+
+
+_inventory_changes = Table(
+    "inventory_changes",
+    _frozen,
+    Column("seq", _Sequence, primary_key=True, autoincrement=True),
+    Column("inventory_id", String, nullable=False),
+    Column("op", Enum("UPSERT", "DELETE", name="changeop"), nullable=False),
+    Column("changed_at", DateTime, nullable=False),
+    Index("ix_inventory_changes_item", "inventory_id", "seq"),
+)
+_change_compactions = Table(
+    "inventory_change_compactions",
+    _frozen,
+    Column("id", _Sequence, primary_key=True, autoincrement=True),
+    Column("floor_seq", BigInteger, nullable=False),
+    Column("removed", Integer, nullable=False),
+    Column("compacted_at", DateTime, nullable=False),
+)
+
+
+def _m0010_inventory_change_log(connection: Connection) -> None:
+    _frozen.create_all(connection, tables=[_inventory_changes, _change_compactions], checkfirst=True)
+    backfill_changes(connection)
+
+
+_inventory_archive = Table(
+    "inventory_archive",
+    _frozen,
+    Column("id", String, primary_key=True),
+    Column("farmer_id", String, nullable=False),
+    Column("farmer_name", String(120), nullable=False),
+    Column("crop_name", String(120), nullable=False),
+    Column("quantity", Integer, nullable=False),
+    Column("quality_score", Integer, nullable=False),
+    Column("base_price", Integer, nullable=False),
+    Column("current_bid", Integer, nullable=False),
+    Column("highest_bidder_id", String),
+    Column("location_name", String(120), nullable=False),
+    Column("location_lat", Float, nullable=False),
+    Column("location_lng", Float, nullable=False),
+    Column("image_url", Text),
+    Column("timestamp", DateTime, nullable=False),
+    Column("status", _inventory_status, nullable=False),
+    Column("listing_type", _listing_type, nullable=False),
+    Column("ends_at", DateTime),
+    Column("settled_at", DateTime),
+    Column("sold_at", DateTime),
+    Column("archived_at", DateTime, nullable=False),
+    Index("ix_inventory_archive_farmer", "farmer_id", "timestamp"),
+)
+_escrow_archive = Table(
+    "escrow_archive",
+    _frozen,
+    Column("id", String, primary_key=True),
+    Column("inventory_id", String, nullable=False),
+    Column("buyer_id", String, nullable=False),
+    Column("amount", Integer, nullable=False),
+    Column("platform_fee", Integer, nullable=False),
+    Column("requested_quantity", Integer),
+    Column("stock_reserved", Boolean, nullable=False),
+    Column("status", _escrow_status, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+    Column("archived_at", DateTime, nullable=False),
+    Index("ix_escrow_archive_inventory", "inventory_id", "created_at"),
+)
+
+
+def _m0011_inventory_archive(connection: Connection) -> None:
+    _add_column(connection, "inventory", "sold_at", "TIMESTAMP")
+    # Lots sold before sold_at existed age from their last escrow update.
+    connection.execute(
+        text(
+            "UPDATE inventory SET sold_at = COALESCE("
+            "(SELECT MAX(escrow.updated_at) FROM escrow WHERE escrow.inventory_id = inventory.id), inventory.timestamp"
+            ") WHERE status = 'SOLD' AND sold_at IS NULL"
+        )
+    )
+    _create_index(connection, "ix_inventory_status", "inventory", "status, timestamp")
+    _frozen.create_all(connection, tables=[_inventory_archive, _escrow_archive], checkfirst=True)
+
+
+def _m0012_price_rollup_outbox(connection: Connection) -> None:
+    _add_column(connection, "price_events", "rolled_up_at", "TIMESTAMP")
+    _add_column(connection, "price_rollups", "price_sum", "BIGINT NOT NULL DEFAULT 0")
+    # Medians were computed on read for a while; migration 15 stores them again.
+    _drop_column(connection, "price_rollups", "median_price")
+    _create_index(connection, "ix_price_events_pending", "price_events", "occurred_at", "rolled_up_at IS NULL")
+    # Bids used to add the whole lot to volume. Zero them and let the roll-up worker
+    # rebuild every bucket from the (now all pending) events.
+    connection.execute(text("UPDATE price_events SET quantity = 0 WHERE kind = 'BID'"))
+    connection.execute(text("UPDATE price_events SET rolled_up_at = NULL"))
+    connection.execute(text("DELETE FROM price_rollups"))
+
+
+def _m0013_cancelled_fills(connection: Connection) -> None:
+    if connection.dialect.name == "postgresql":
+        connection.execute(text("ALTER TYPE escrowstatus ADD VALUE IF NOT EXISTS 'CANCELLED'"))
+    _create_index(connection, "ix_escrow_open_fills", "escrow", "created_at", "stock_reserved AND status = 'PENDING'")
+
+
+def _m0014_ingested_message_expiry(connection: Connection) -> None:
+    _add_column(connection, "ingested_messages", "expires_at", "TIMESTAMP")
+    # Old rows don't record which kind of key they hold, so all of them get one window.
+    connection.execute(
+        text("UPDATE ingested_messages SET expires_at = :expires_at WHERE expires_at IS NULL"),
+        {"expires_at": datetime.utcnow() + timedelta(hours=OFFLINE_DEDUPE_WINDOW_HOURS)},
+    )
+
+
+def _m0015_rollup_medians(connection: Connection) -> None:
+    # Stored per bucket again, filled in by the roll-up worker for closed buckets.
+    _add_column(connection, "price_rollups", "median_price", "FLOAT")
+    _create_index(
+        connection, "ix_price_rollups_median_pending", "price_rollups", "bucket_start", "median_price IS NULL"
+    )
+
+
+MIGRATIONS: list[tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "initial tables", _m0001_initial_tables),
+    (2, "listing type and escrow fees", _m0002_listing_type_and_escrow_fees),
+    (3, "market price index", _m0003_price_index),
+    (4, "message thread index and archive", _m0004_message_archive),
+    (5, "conversation summaries and read markers", _m0005_conversation_summaries),
+    (6, "dashboard version and owner indexes", _m0006_dashboards),
+    (7, "auction end times", _m0007_auction_end_times),
+    (8, "escrow partial fills", _m0008_escrow_fills),
+    (9, "ingested offline messages", _m0009_ingested_messages),
+    (10, "inventory change log", _m0010_inventory_change_log),
+    (11, "status index and sold listing archive", _m0011_inventory_archive),
+    (12, "price roll-up outbox", _m0012_price_rollup_outbox),
+    (13, "cancelled escrow fills", _m0013_cancelled_fills),
+    (14, "ingested message expiry", _m0014_ingested_message_expiry),
+    (15, "stored rollup medians", _m0015_rollup_medians),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(connection: Connection) -> int:
+    if not inspect(connection).has_table(schema_version.name):
+        return 0
+    version = connection.execute(select(schema_version.c.version).order_by(schema_version.c.version.desc())).first()
+    return version[0] if version else 0
+
+
+def migrate(engine: Engine) -> list[int]:
+    # Apply pending migrations in one transaction; the advisory lock serializes concurrent runners.
+    applied: list[int] = []
+    with engine.begin() as connection:
+        if connection.dialect.name == "postgresql":
+            connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_ID})
+        _version_metadata.create_all(connection, checkfirst=True)
+        version = current_version(connection)
+        for number, name, step in MIGRATIONS:
+            if number <= version:
+                continue
+            logger.info("Applying migration %04d %s", number, name)
+            step(connection)
+            connection.execute(schema_version.insert().values(version=number, name=name, applied_at=datetime.utcnow()))
+            applied.append(number)
+    return applied
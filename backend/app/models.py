@@ -2,7 +2,21 @@ import enum
 import uuid
 from datetime import datetime
 
-from sqlalchemy import DateTime, Enum, Float, ForeignKey, Integer, String, Text
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    DateTime,
+    Enum,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+    UniqueConstraint,
+    false,
+    text,
+)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .db import Base
@@ -28,6 +42,18 @@ class EscrowStatus(str, enum.Enum):
     PENDING = "PENDING"
     VERIFIED = "VERIFIED"
     RELEASED = "RELEASED"
+    # A reserved fill given up or left unpaid past its TTL; its quantity is back on the lot.
+    CANCELLED = "CANCELLED"
+
+
+class PriceKind(str, enum.Enum):
+    BID = "BID"
+    SALE = "SALE"
+
+
+class ChangeOp(str, enum.Enum):
+    UPSERT = "UPSERT"
+    DELETE = "DELETE"
 
 
 class User(Base):
@@ -39,6 +65,8 @@ class User(Base):
     role: Mapped[UserRole] = mapped_column(Enum(UserRole), nullable=False)
     location: Mapped[str] = mapped_column(String(120), nullable=False)
     rating: Mapped[float | None] = mapped_column(Float, nullable=True)
+    # Bumped by every write that changes what this user's dashboard shows.
+    dashboard_version: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
     hashed_password: Mapped[str] = mapped_column(String(255), nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
@@ -47,6 +75,19 @@ class User(Base):
 
 class Inventory(Base):
     __tablename__ = "inventory"
+    __table_args__ = (
+        Index("ix_inventory_farmer", "farmer_id", "timestamp"),
+        Index("ix_inventory_highest_bidder", "highest_bidder_id"),
+        # Only open auctions are indexed, so the scheduler's due query stays small.
+        Index(
+            "ix_inventory_auction_due",
+            "ends_at",
+            postgresql_where=text("settled_at IS NULL AND ends_at IS NOT NULL"),
+            sqlite_where=text("settled_at IS NULL AND ends_at IS NOT NULL"),
+        ),
+        # Hot queries filter by status; the archive mover finds sold lots through it too.
+        Index("ix_inventory_status", "status", "timestamp"),
+    )
 
     id: Mapped[str] = mapped_column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     farmer_id: Mapped[str] = mapped_column(String, ForeignKey("users.id"), nullable=False)
@@ -68,12 +109,45 @@ class Inventory(Base):
         default=ListingType.BIDDING,
         nullable=False,
     )
+    # Auctions close at ends_at; settled_at is set once the scheduler has closed them.
+    ends_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    settled_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    sold_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
 
     farmer: Mapped[User] = relationship(back_populates="inventory")
 
 
+class ArchivedInventory(Base):
+    # Sold listings, moved out of `inventory` with their escrows and messages after the retention window.
+    __tablename__ = "inventory_archive"
+    __table_args__ = (Index("ix_inventory_archive_farmer", "farmer_id", "timestamp"),)
+
+    id: Mapped[str] = mapped_column(String, primary_key=True)
+    farmer_id: Mapped[str] = mapped_column(String, nullable=False)
+    farmer_name: Mapped[str] = mapped_column(String(120), nullable=False)
+    crop_name: Mapped[str] = mapped_column(String(120), nullable=False)
+    quantity: Mapped[int] = mapped_column(Integer, nullable=False)
+    quality_score: Mapped[int] = mapped_column(Integer, nullable=False)
+    base_price: Mapped[int] = mapped_column(Integer, nullable=False)
+    current_bid: Mapped[int] = mapped_column(Integer, nullable=False)
+    highest_bidder_id: Mapped[str | None] = mapped_column(String, nullable=True)
+    location_name: Mapped[str] = mapped_column(String(120), nullable=False)
+    location_lat: Mapped[float] = mapped_column(Float, nullable=False)
+    location_lng: Mapped[float] = mapped_column(Float, nullable=False)
+    image_url: Mapped[str | None] = mapped_column(Text, nullable=True)
+    timestamp: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    status: Mapped[InventoryStatus] = mapped_column(Enum(InventoryStatus), nullable=False)
+    listing_type: Mapped[ListingType] = mapped_column(Enum(ListingType, name="listing_type"), nullable=False)
+    ends_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    settled_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    sold_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    archived_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+
 class Message(Base):
     __tablename__ = "messages"
+    # Threads are read newest-first by (timestamp, id) keyset.
+    __table_args__ = (Index("ix_messages_thread", "inventory_id", "timestamp", "id"),)
 
     id: Mapped[str] = mapped_column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     inventory_id: Mapped[str] = mapped_column(String, ForeignKey("inventory.id"), nullable=False)
@@ -82,15 +156,66 @@ class Message(Base):
     timestamp: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
 
+class ArchivedMessage(Base):
+    # Threads of sold listings, moved out of `messages` after the retention window.
+    __tablename__ = "messages_archive"
+    __table_args__ = (Index("ix_messages_archive_thread", "inventory_id", "timestamp", "id"),)
+
+    id: Mapped[str] = mapped_column(String, primary_key=True)
+    inventory_id: Mapped[str] = mapped_column(String, nullable=False)
+    sender_id: Mapped[str] = mapped_column(String, nullable=False)
+    text: Mapped[str] = mapped_column(String(2000), nullable=False)
+    timestamp: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    archived_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class Conversation(Base):
+    # One summary row per listing thread, maintained by create_message.
+    __tablename__ = "conversations"
+
+    inventory_id: Mapped[str] = mapped_column(String, ForeignKey("inventory.id"), primary_key=True)
+    message_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    last_message_id: Mapped[str] = mapped_column(String, nullable=False)
+    last_message_text: Mapped[str] = mapped_column(String(200), nullable=False)
+    last_sender_id: Mapped[str] = mapped_column(String, nullable=False)
+    last_sender_name: Mapped[str | None] = mapped_column(String(120), nullable=True)
+    last_message_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+
+class ConversationMember(Base):
+    # Read marker per participant; unread = conversation.message_count - read_count.
+    __tablename__ = "conversation_members"
+    __table_args__ = (Index("ix_conversation_members_user", "user_id", "inventory_id"),)
+
+    inventory_id: Mapped[str] = mapped_column(String, ForeignKey("conversations.inventory_id"), primary_key=True)
+    user_id: Mapped[str] = mapped_column(String, ForeignKey("users.id"), primary_key=True)
+    read_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    last_read_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+
 class Escrow(Base):
     __tablename__ = "escrow"
+    __table_args__ = (
+        Index("ix_escrow_buyer", "buyer_id"),
+        Index("ix_escrow_inventory", "inventory_id", "created_at"),
+        # Fills the expiry sweep may cancel.
+        Index(
+            "ix_escrow_open_fills",
+            "created_at",
+            postgresql_where=text("stock_reserved AND status = 'PENDING'"),
+            sqlite_where=text("stock_reserved AND status = 'PENDING'"),
+        ),
+    )
 
     id: Mapped[str] = mapped_column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    inventory_id: Mapped[str] = mapped_column(String, ForeignKey("inventory.id"), nullable=False, unique=True)
+    # FIXED lots can have one escrow per partial fill.
+    inventory_id: Mapped[str] = mapped_column(String, ForeignKey("inventory.id"), nullable=False)
     buyer_id: Mapped[str] = mapped_column(String, ForeignKey("users.id"), nullable=False)
     amount: Mapped[int] = mapped_column(Integer, nullable=False)
     platform_fee: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
     requested_quantity: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    # Fills take their quantity off the lot when reserved, so release must not decrement again.
+    stock_reserved: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False, server_default=false())
     status: Mapped[EscrowStatus] = mapped_column(Enum(EscrowStatus), default=EscrowStatus.PENDING)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -98,3 +223,130 @@ class Escrow(Base):
     @property
     def payout_amount(self) -> int:
         return max(self.amount - (self.platform_fee or 0), 0)
+
+
+class ArchivedEscrow(Base):
+    __tablename__ = "escrow_archive"
+    __table_args__ = (Index("ix_escrow_archive_inventory", "inventory_id", "created_at"),)
+
+    id: Mapped[str] = mapped_column(String, primary_key=True)
+    inventory_id: Mapped[str] = mapped_column(String, nullable=False)
+    buyer_id: Mapped[str] = mapped_column(String, nullable=False)
+    amount: Mapped[int] = mapped_column(Integer, nullable=False)
+    platform_fee: Mapped[int] = mapped_column(Integer, nullable=False)
+    requested_quantity: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    stock_reserved: Mapped[bool] = mapped_column(Boolean, nullable=False)
+    status: Mapped[EscrowStatus] = mapped_column(Enum(EscrowStatus), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    archived_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+    @property
+    def payout_amount(self) -> int:
+        return max(self.amount - (self.platform_fee or 0), 0)
+
+
+class PriceEvent(Base):
+    __tablename__ = "price_events"
+    __table_args__ = (
+        Index("ix_price_events_bucket", "kind", "crop_name", "hub", "quality_band", "occurred_at"),
+        Index("ix_price_events_crop", "kind", "crop_name", "occurred_at"),
+        # Outbox of events the roll-up worker hasn't folded in yet.
+        Index(
+            "ix_price_events_pending",
+            "occurred_at",
+            postgresql_where=text("rolled_up_at IS NULL"),
+            sqlite_where=text("rolled_up_at IS NULL"),
+        ),
+    )
+
+    id: Mapped[str] = mapped_column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    # No foreign key: price history outlives archived listings.
+    inventory_id: Mapped[str] = mapped_column(String, nullable=False)
+    kind: Mapped[PriceKind] = mapped_column(Enum(PriceKind), nullable=False)
+    crop_name: Mapped[str] = mapped_column(String(120), nullable=False)
+    hub: Mapped[str] = mapped_column(String(120), nullable=False)
+    quality_band: Mapped[str] = mapped_column(String(1), nullable=False)
+    price: Mapped[int] = mapped_column(Integer, nullable=False)
+    # Traded quantity; 0 for bids, which don't move volume.
+    quantity: Mapped[int] = mapped_column(Integer, nullable=False)
+    occurred_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    rolled_up_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+
+class PriceRollup(Base):
+    __tablename__ = "price_rollups"
+    __table_args__ = (
+        UniqueConstraint(
+            "granularity", "kind", "crop_name", "hub", "quality_band", "bucket_start", name="uq_price_rollups_bucket"
+        ),
+        # Buckets still waiting for their median.
+        Index(
+            "ix_price_rollups_median_pending",
+            "bucket_start",
+            postgresql_where=text("median_price IS NULL"),
+            sqlite_where=text("median_price IS NULL"),
+        ),
+    )
+
+    id: Mapped[str] = mapped_column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    granularity: Mapped[str] = mapped_column(String(8), nullable=False)
+    kind: Mapped[PriceKind] = mapped_column(Enum(PriceKind), nullable=False)
+    crop_name: Mapped[str] = mapped_column(String(120), nullable=False)
+    # "*" rows aggregate across all hubs or quality bands.
+    hub: Mapped[str] = mapped_column(String(120), nullable=False)
+    quality_band: Mapped[str] = mapped_column(String(1), nullable=False)
+    bucket_start: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    event_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    volume: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    price_volume: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    price_sum: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0, server_default="0")
+    min_price: Mapped[int] = mapped_column(Integer, nullable=False)
+    max_price: Mapped[int] = mapped_column(Integer, nullable=False)
+    # Set by the roll-up worker once the bucket has closed; a late event clears it again.
+    median_price: Mapped[float | None] = mapped_column(Float, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @property
+    def vwap(self) -> float:
+        # Bid buckets carry no volume, so they fall back to the mean price.
+        if self.volume:
+            return self.price_volume / self.volume
+        return self.price_sum / self.event_count if self.event_count else float(self.min_price)
+
+
+class IngestedMessage(Base):
+    # One row per gateway message turned into a listing; the key makes replays no-ops.
+    __tablename__ = "ingested_messages"
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    inventory_id: Mapped[str | None] = mapped_column(String, nullable=True)
+    ingested_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    # Content keys (no gateway id) only block repeats for a while; id keys never expire.
+    expires_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+
+# SQLite only auto-increments INTEGER primary keys.
+_Sequence = BigInteger().with_variant(Integer, "sqlite")
+
+
+class InventoryChange(Base):
+    # Append-only feed of listing changes; clients sync from the last seq they saw.
+    __tablename__ = "inventory_changes"
+    __table_args__ = (Index("ix_inventory_changes_item", "inventory_id", "seq"),)
+
+    seq: Mapped[int] = mapped_column(_Sequence, primary_key=True, autoincrement=True)
+    # No foreign key: tombstones outlive the listing.
+    inventory_id: Mapped[str] = mapped_column(String, nullable=False)
+    op: Mapped[ChangeOp] = mapped_column(Enum(ChangeOp), nullable=False)
+    changed_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class ChangeLogCompaction(Base):
+    __tablename__ = "inventory_change_compactions"
+
+    id: Mapped[int] = mapped_column(_Sequence, primary_key=True, autoincrement=True)
+    # Cursors below this may have missed a dropped tombstone and must resync from zero.
+    floor_seq: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    removed: Mapped[int] = mapped_column(Integer, nullable=False)
+    compacted_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
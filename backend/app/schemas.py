@@ -3,7 +3,7 @@ from typing import Optional
 
 from pydantic import BaseModel, EmailStr, Field, model_validator
 
-from .models import EscrowStatus, InventoryStatus, ListingType, UserRole
+from .models import EscrowStatus, InventoryStatus, ListingType, PriceKind, UserRole
 
 
 class Location(BaseModel):
@@ -56,6 +56,8 @@ class CropInventoryBase(BaseModel):
     image_url: Optional[str] = None
     status: InventoryStatus = InventoryStatus.AVAILABLE
     listing_type: ListingType = ListingType.BIDDING
+    ends_at: Optional[datetime] = None
+    settled_at: Optional[datetime] = None
 
 
 class CropInventoryCreate(BaseModel):
@@ -67,6 +69,7 @@ class CropInventoryCreate(BaseModel):
     location: Location
     image_url: Optional[str] = None
     listing_type: ListingType = ListingType.BIDDING
+    ends_at: Optional[datetime] = None
 
 
 class CropInventoryOut(CropInventoryBase):
@@ -113,6 +116,36 @@ class OfflineParseResult(BaseModel):
     farmerName: Optional[str] = None
 
 
+class OfflineBatchMessage(OfflineParseRequest):
+    # The gateway's own id; without one, repeats are recognised by sender and content.
+    message_id: Optional[str] = Field(default=None, max_length=200)
+    sender: Optional[str] = Field(default=None, max_length=64)
+
+
+class OfflineBatchRequest(BaseModel):
+    gateway: str = Field(default="sms", min_length=1, max_length=40)
+    messages: list[OfflineBatchMessage] = Field(min_length=1)
+
+
+class OfflineIngestOutcome(BaseModel):
+    index: int
+    message_id: Optional[str] = None
+    # created | updated | duplicate | failed
+    status: str
+    inventory_id: Optional[str] = None
+    error: Optional[str] = None
+
+
+class OfflineIngestSummary(BaseModel):
+    received: int
+    created: int
+    updated: int
+    duplicates: int
+    failed: int
+    elapsed_seconds: float
+    messages_per_second: float
+
+
 class MessageCreate(BaseModel):
     text: str = Field(min_length=1, max_length=2000)
 
@@ -129,6 +162,18 @@ class MessageOut(BaseModel):
         from_attributes = True
 
 
+class ConversationOut(BaseModel):
+    inventory_id: str
+    crop_name: str
+    last_message_id: str
+    last_message_text: str
+    last_sender_id: str
+    last_sender_name: Optional[str] = None
+    last_message_at: datetime
+    message_count: int
+    unread_count: int
+
+
 class EscrowStart(BaseModel):
     amount: Optional[int] = None
     quantity: Optional[int] = Field(default=None, gt=0)
@@ -141,6 +186,7 @@ class BidCreate(BaseModel):
 class InventoryUpdate(BaseModel):
     current_bid: Optional[int] = Field(default=None, gt=0)
     listing_type: Optional[ListingType] = None
+    ends_at: Optional[datetime] = None
 
 
 class EscrowOut(BaseModel):
@@ -157,3 +203,51 @@ class EscrowOut(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class BulkImportRowError(BaseModel):
+    row: int
+    error: str
+
+
+class BulkImportResult(BaseModel):
+    received: int
+    imported: int
+    failed: int
+    errors: list[BulkImportRowError]
+    errors_truncated: bool = False
+    elapsed_seconds: float
+    rows_per_second: float
+
+
+class PricePoint(BaseModel):
+    bucket_start: datetime
+    granularity: str
+    kind: PriceKind
+    crop_name: str
+    hub: str
+    quality_band: str
+    event_count: int
+    volume: int
+    min_price: int
+    max_price: int
+    # None until the bucket has closed and the worker has computed it.
+    median_price: Optional[float] = None
+    vwap: float
+
+    class Config:
+        from_attributes = True
+
+
+class FarmerDashboard(BaseModel):
+    user: UserOut
+    listings: list[CropInventoryOut]
+    escrows: list[EscrowOut]
+    conversations: list[ConversationOut]
+
+
+class BuyerDashboard(BaseModel):
+    user: UserOut
+    active_bids: list[CropInventoryOut]
+    escrows: list[EscrowOut]
+    conversations: list[ConversationOut]
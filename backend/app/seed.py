@@ -1,9 +1,18 @@
-from datetime import datetime
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable
 
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
-from .models import Inventory, InventoryStatus, User, UserRole
+from .locations import HUBS
+from .models import Escrow, EscrowStatus, Inventory, InventoryStatus, ListingType, Message, User, UserRole
 from .core.security import hash_password
+from .services.bulk_import import bulk_insert
+from .services.changes import backfill_changes, log_changes
+from .services.escrow import calculate_platform_fee
+from .services.inbox import rebuild_conversations
 
 
 def seed_data(db: Session) -> None:
@@ -131,4 +140,233 @@ def seed_data(db: Session) -> None:
     ]
 
     db.add_all(items)
+    db.flush()
+    log_changes(db, *(item.id for item in items))
+    db.commit()
+
+
+SYNTHETIC_NAMESPACE = uuid.UUID("6f1c1a52-3c55-4b0e-9a43-5a0d1f0b7e21")
+SYNTHETIC_BATCH_SIZE = 5000
+
+# (crop, relative share of listings, typical KES/kg)
+CROP_MIX = [
+    ("Maize", 22, 38),
+    ("Potatoes (Shangi)", 18, 45),
+    ("Cabbage", 12, 25),
+    ("Carrots", 10, 32),
+    ("Sukuma Wiki", 9, 20),
+    ("Tomatoes", 8, 70),
+    ("Beans", 7, 110),
+    ("Onions", 6, 80),
+    ("Peas", 4, 120),
+    ("Wheat", 4, 50),
+]
+# Relative listing volume per hub; the big producing areas dominate.
+HUB_WEIGHTS = {
+    "Molo": 16,
+    "Njoro": 16,
+    "Kuresoi": 12,
+    "Bahati": 11,
+    "Rongai": 10,
+    "Subukia": 9,
+    "Naivasha": 9,
+    "Gilgil": 8,
+    "Nakuru CBD": 9,
+}
+CHAT_LINES = [
+    "Bei ya mwisho?",
+    "Can you deliver to Nakuru CBD?",
+    "Quality looks good, how many bags?",
+    "Nitachukua yote kesho.",
+    "Is the price negotiable?",
+    "Ready for pickup on Friday.",
+]
+
+
+def _synthetic_id(seed: int, kind: str, index: int) -> str:
+    # Derived ids keep runs reproducible without holding millions of ids in memory.
+    return str(uuid.uuid5(SYNTHETIC_NAMESPACE, f"{seed}:{kind}:{index}"))
+
+
+def _skewed_index(rng: random.Random, count: int) -> int:
+    # Cubing a uniform draw concentrates traffic on a small set of hot listings.
+    return min(int(count * rng.random() ** 3), count - 1)
+
+
+def _spread_timestamp(rng: random.Random, now: datetime, days: int) -> datetime:
+    # Recent activity is denser than old activity.
+    return now - timedelta(seconds=days * 86400 * rng.random() ** 2)
+
+
+def _flush(db: Session, table, rows: list[dict]) -> None:
+    bulk_insert(db, table, rows)
     db.commit()
+    rows.clear()
+
+
+def generate_synthetic_data(
+    db: Session,
+    *,
+    farmers: int = 2000,
+    buyers: int = 1000,
+    listings: int = 100_000,
+    messages: int = 300_000,
+    escrow_share: float = 0.15,
+    days: int = 180,
+    seed: int = 42,
+    batch_size: int = SYNTHETIC_BATCH_SIZE,
+    progress: Callable[[str, int], None] | None = None,
+) -> dict[str, int]:
+    # Deterministic, bulk-inserted volume data for measuring queries at production scale.
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    password_hash = hash_password("password123")
+    hubs = list(HUB_WEIGHTS)
+    hub_weights = list(HUB_WEIGHTS.values())
+    crop_weights = [share for _, share, _ in CROP_MIX]
+    report = progress or (lambda table, count: None)
+    counts = {"users": 0, "inventory": 0, "bids": 0, "escrow": 0, "messages": 0}
+
+    farmer_names: list[str] = []
+    rows: list[dict] = []
+    for index in range(farmers + buyers):
+        is_farmer = index < farmers
+        name = f"{'Farmer' if is_farmer else 'Buyer'} {index:06d}"
+        if is_farmer:
+            farmer_names.append(name)
+        rows.append(
+            {
+                "id": _synthetic_id(seed, "user", index),
+                "name": name,
+                "email": f"{'farmer' if is_farmer else 'buyer'}{index:06d}.{seed}@synthetic.shamba",
+                "role": UserRole.FARMER if is_farmer else UserRole.BUYER,
+                "location": rng.choices(hubs, hub_weights)[0],
+                "rating": round(rng.uniform(3.0, 5.0), 1),
+                "hashed_password": password_hash,
+                "created_at": _spread_timestamp(rng, now, days * 2),
+            }
+        )
+        if len(rows) >= batch_size:
+            counts["users"] += len(rows)
+            _flush(db, User.__table__, rows)
+    counts["users"] += len(rows)
+    _flush(db, User.__table__, rows)
+    report("users", counts["users"])
+
+    escrow_rows: list[dict] = []
+    for index in range(listings):
+        farmer_index = rng.randrange(farmers)
+        crop, _, unit_price = rng.choices(CROP_MIX, crop_weights)[0]
+        hub = rng.choices(hubs, hub_weights)[0]
+        lat, lng = HUBS[hub]
+        base_price = max(int(unit_price * rng.uniform(0.7, 1.3)), 1)
+        listing_type = ListingType.FIXED if rng.random() < 0.3 else ListingType.BIDDING
+
+        # Roughly half of the bidding lots have attracted a bid.
+        current_bid = base_price
+        bidder_id = None
+        if listing_type == ListingType.BIDDING and rng.random() < 0.5:
+            current_bid = base_price + rng.randint(1, max(base_price // 4, 1))
+            bidder_id = _synthetic_id(seed, "user", farmers + rng.randrange(buyers))
+            counts["bids"] += 1
+
+        roll = rng.random()
+        if roll < escrow_share:
+            status = InventoryStatus.SOLD if roll < escrow_share / 2 else InventoryStatus.NEGOTIATING
+        else:
+            status = InventoryStatus.NEGOTIATING if bidder_id else InventoryStatus.AVAILABLE
+
+        listing_id = _synthetic_id(seed, "inventory", index)
+        created_at = _spread_timestamp(rng, now, days)
+        quantity = max(int(rng.lognormvariate(6.0, 0.9)), 10)
+        rows.append(
+            {
+                "id": listing_id,
+                "farmer_id": _synthetic_id(seed, "user", farmer_index),
+                "farmer_name": farmer_names[farmer_index],
+                "crop_name": crop,
+                "quantity": 0 if status == InventoryStatus.SOLD else quantity,
+                "quality_score": max(min(int(rng.gauss(78, 10)), 100), 20),
+                "base_price": base_price,
+                "current_bid": current_bid,
+                "highest_bidder_id": bidder_id,
+                "location_name": hub,
+                "location_lat": lat + rng.uniform(-0.03, 0.03),
+                "location_lng": lng + rng.uniform(-0.03, 0.03),
+                "image_url": None,
+                "timestamp": created_at,
+                "status": status,
+                "listing_type": listing_type,
+                "sold_at": None,
+            }
+        )
+
+        if roll < escrow_share:
+            amount = current_bid * quantity
+            fee = calculate_platform_fee(amount)
+            settled = status == InventoryStatus.SOLD
+            escrow_rows.append(
+                {
+                    "id": _synthetic_id(seed, "escrow", index),
+                    "inventory_id": listing_id,
+                    "buyer_id": bidder_id or _synthetic_id(seed, "user", farmers + rng.randrange(buyers)),
+                    "amount": amount,
+                    "platform_fee": fee,
+                    "requested_quantity": quantity,
+                    "status": EscrowStatus.RELEASED if settled else EscrowStatus.PENDING,
+                    "created_at": created_at + timedelta(hours=rng.uniform(1, 48)),
+                    "updated_at": created_at + timedelta(hours=rng.uniform(48, 96)),
+                }
+            )
+            if settled:
+                rows[-1]["sold_at"] = escrow_rows[-1]["updated_at"]
+
+        if len(rows) >= batch_size:
+            counts["inventory"] += len(rows)
+            _flush(db, Inventory.__table__, rows)
+            report("inventory", counts["inventory"])
+        if len(escrow_rows) >= batch_size:
+            counts["escrow"] += len(escrow_rows)
+            _flush(db, Escrow.__table__, escrow_rows)
+    if rows:
+        counts["inventory"] += len(rows)
+        _flush(db, Inventory.__table__, rows)
+        report("inventory", counts["inventory"])
+    counts["escrow"] += len(escrow_rows)
+    _flush(db, Escrow.__table__, escrow_rows)
+    report("escrow", counts["escrow"])
+    # Only this run's listings: its farmers are new, so everything they own was generated here.
+    generated = select(Inventory.id).where(
+        Inventory.farmer_id.in_(select(User.id).where(User.email.endswith(f".{seed}@synthetic.shamba")))
+    )
+    # Bulk-loaded listings bypass log_changes; give each one a feed entry so delta sync sees it.
+    if listings:
+        backfill_changes(db.connection(), generated)
+        db.commit()
+
+    if listings:
+        for index in range(messages):
+            from_buyer = rng.random() < 0.6
+            user_index = farmers + rng.randrange(buyers) if from_buyer else rng.randrange(farmers)
+            rows.append(
+                {
+                    "id": _synthetic_id(seed, "message", index),
+                    "inventory_id": _synthetic_id(seed, "inventory", _skewed_index(rng, listings)),
+                    "sender_id": _synthetic_id(seed, "user", user_index),
+                    "text": rng.choice(CHAT_LINES),
+                    "timestamp": _spread_timestamp(rng, now, days),
+                }
+            )
+            if len(rows) >= batch_size:
+                counts["messages"] += len(rows)
+                _flush(db, Message.__table__, rows)
+                report("messages", counts["messages"])
+        if rows:
+            counts["messages"] += len(rows)
+            _flush(db, Message.__table__, rows)
+            report("messages", counts["messages"])
+        # Bulk-loaded messages bypass create_message, so derive the inbox summaries afterwards.
+        rebuild_conversations(db.connection(), generated)
+        db.commit()
+
+    return counts
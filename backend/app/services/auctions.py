@@ -0,0 +1,233 @@
+import heapq
+import logging
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session, sessionmaker
+
+from ..core.metrics import Counter, Histogram
+from ..db import SessionLocal
+from ..models import Escrow, EscrowStatus, Inventory, InventoryStatus, ListingType
+from .changes import log_changes
+from .dashboard import bump_dashboards
+from .escrow import calculate_platform_fee
+from .listings import invalidate_listing
+
+logger = logging.getLogger(__name__)
+
+# Duration given to BIDDING lots created without an explicit end; 0 leaves them open-ended.
+AUCTION_DEFAULT_HOURS = float(os.getenv("AUCTION_DEFAULT_HOURS", "0"))
+AUCTION_SCHEDULER = os.getenv("AUCTION_SCHEDULER", "1").lower() in ("1", "true", "yes")
+AUCTION_BATCH_SIZE = int(os.getenv("AUCTION_BATCH_SIZE", "500"))
+# How often the timer heap is reloaded, which picks up auctions created by other workers.
+AUCTION_REFRESH_SECONDS = float(os.getenv("AUCTION_REFRESH_SECONDS", "30"))
+AUCTION_HEAP_SIZE = 1000
+# Shared by every worker so only one settles at a time.
+AUCTION_LOCK_ID = 7_240_002
+
+auctions_settled = Counter("auctions_settled_total", "Auctions closed by the scheduler.", ["outcome"])
+settlement_delay = Histogram(
+    "auction_settlement_delay_seconds",
+    "Time between an auction's end and its settlement.",
+    buckets=(0.1, 0.5, 1, 2, 5, 10, 30, 60, 300),
+)
+
+
+def as_utc(moment: datetime | None) -> datetime | None:
+    # Timestamps are stored as naive UTC.
+    if moment is None or moment.tzinfo is None:
+        return moment
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def auction_end(listing_type: ListingType, ends_at: datetime | None, created_at: datetime) -> datetime | None:
+    if listing_type != ListingType.BIDDING:
+        return None
+    if ends_at is not None:
+        return as_utc(ends_at)
+    if AUCTION_DEFAULT_HOURS > 0:
+        return created_at + timedelta(hours=AUCTION_DEFAULT_HOURS)
+    return None
+
+
+def auction_closed(item: Inventory, now: datetime | None = None) -> bool:
+    if item.settled_at is not None:
+        return True
+    return item.ends_at is not None and item.ends_at <= (now or datetime.utcnow())
+
+
+def _open_auctions() -> tuple:
+    # Unsettled BIDDING lots with an end time. Sold lots and fixed-price lots (whose stock
+    # fills move through NEGOTIATING) are never touched by settlement.
+    return (
+        Inventory.settled_at.is_(None),
+        Inventory.ends_at.is_not(None),
+        Inventory.listing_type == ListingType.BIDDING,
+        Inventory.status != InventoryStatus.SOLD,
+    )
+
+
+def _due_batch(db: Session, now: datetime, limit: int) -> list[Inventory]:
+    query = (
+        select(Inventory)
+        .where(*_open_auctions(), Inventory.ends_at <= now)
+        .order_by(Inventory.ends_at)
+        .limit(limit)
+    )
+    if db.get_bind().dialect.name == "postgresql":
+        # Rows another settler holds are skipped rather than waited on.
+        query = query.with_for_update(skip_locked=True)
+    return list(db.scalars(query))
+
+
+def _try_lock(db: Session) -> bool:
+    if db.get_bind().dialect.name != "postgresql":
+        return True
+    return bool(db.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": AUCTION_LOCK_ID}).scalar())
+
+
+def settle_due_auctions(db: Session, batch_size: int = AUCTION_BATCH_SIZE) -> int:
+    # Closes every auction past its end, a batch per transaction; returns how many were settled.
+    settled = 0
+    while True:
+        now = datetime.utcnow()
+        if not _try_lock(db):
+            db.rollback()
+            return settled
+        items = _due_batch(db, now, batch_size)
+        if not items:
+            db.rollback()
+            return settled
+
+        ids = [item.id for item in items]
+        with_escrow = set(db.scalars(select(Escrow.inventory_id).where(Escrow.inventory_id.in_(ids))))
+        escrows = []
+        for item in items:
+            item.settled_at = now
+            settlement_delay.observe((now - item.ends_at).total_seconds())
+            if item.highest_bidder_id is None:
+                # No bids: the lot goes back to plain availability until the farmer relists it.
+                item.status = InventoryStatus.AVAILABLE
+                auctions_settled.inc("unsold")
+                continue
+            item.status = InventoryStatus.NEGOTIATING
+            auctions_settled.inc("won")
+            if item.id in with_escrow:
+                continue
+            amount = item.current_bid * item.quantity
+            escrows.append(
+                Escrow(
+                    inventory_id=item.id,
+                    buyer_id=item.highest_bidder_id,
+                    amount=amount,
+                    platform_fee=calculate_platform_fee(amount),
+                    requested_quantity=item.quantity,
+                    status=EscrowStatus.PENDING,
+                )
+            )
+        db.add_all(escrows)
+        log_changes(db, *ids)
+        bump_dashboards(db, *(item.farmer_id for item in items), *(item.highest_bidder_id for item in items))
+        db.commit()
+        for inventory_id in ids:
+            invalidate_listing(inventory_id)
+        settled += len(items)
+        if len(items) < batch_size:
+            return settled
+
+
+class AuctionScheduler:
+    # Sleeps until the earliest known end time; the heap is only a timer, settlement
+    # always re-reads what is due from the indexed ends_at query.
+    def __init__(self, session_factory: sessionmaker) -> None:
+        self.session_factory = session_factory
+        self._heap: list[tuple[datetime, str]] = []
+        self._wake = threading.Condition()
+        self._stopping = False
+        self._thread: threading.Thread | None = None
+        self._refreshed_at = datetime.min
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="auction-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._wake:
+            self._stopping = True
+            self._wake.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def schedule(self, inventory_id: str, ends_at: datetime | None) -> None:
+        # Called after commit by write paths in this process so new auctions don't wait for a refresh.
+        if ends_at is None or self._thread is None:
+            return
+        with self._wake:
+            heapq.heappush(self._heap, (ends_at, inventory_id))
+            if self._heap[0][1] == inventory_id:
+                self._wake.notify()
+
+    def _refresh(self, db: Session) -> None:
+        upcoming = db.execute(
+            select(Inventory.ends_at, Inventory.id)
+            .where(*_open_auctions())
+            .order_by(Inventory.ends_at)
+            .limit(AUCTION_HEAP_SIZE)
+        ).all()
+        db.rollback()
+        heap = [(ends_at, inventory_id) for ends_at, inventory_id in upcoming]
+        heapq.heapify(heap)
+        with self._wake:
+            self._heap = heap
+        self._refreshed_at = datetime.utcnow()
+
+    def _next_wait(self, now: datetime) -> float:
+        refresh_in = (self._refreshed_at + timedelta(seconds=AUCTION_REFRESH_SECONDS) - now).total_seconds()
+        if self._heap:
+            return max(min((self._heap[0][0] - now).total_seconds(), refresh_in), 0.0)
+        return max(refresh_in, 0.0)
+
+    def _pop_due(self, now: datetime) -> bool:
+        due = False
+        while self._heap and self._heap[0][0] <= now:
+            heapq.heappop(self._heap)
+            due = True
+        return due
+
+    def _run(self) -> None:
+        while True:
+            try:
+                with self.session_factory() as db:
+                    now = datetime.utcnow()
+                    if now - self._refreshed_at >= timedelta(seconds=AUCTION_REFRESH_SECONDS):
+                        self._refresh(db)
+                        # Anything overdue (e.g. closed while no worker was running) settles now.
+                        with self._wake:
+                            self._pop_due(now)
+                        due = True
+                    else:
+                        with self._wake:
+                            due = self._pop_due(now)
+                    if due:
+                        count = settle_due_auctions(db)
+                        if count:
+                            logger.info("Settled %d auctions", count)
+            except Exception:
+                logger.exception("Auction settlement pass failed")
+                # Back off until the next refresh instead of retrying in a tight loop.
+                self._refreshed_at = datetime.utcnow()
+            with self._wake:
+                if self._stopping:
+                    return
+                self._wake.wait(self._next_wait(datetime.utcnow()))
+                if self._stopping:
+                    return
+
+
+scheduler = AuctionScheduler(SessionLocal)
@@ -0,0 +1,287 @@
+import csv
+import enum
+import io
+import json
+import os
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import AsyncIterator
+
+from pydantic import ValidationError
+from sqlalchemy import Table, insert
+from sqlalchemy.orm import Session
+
+from ..models import Inventory, InventoryStatus, User
+from ..schemas import BulkImportResult, BulkImportRowError, CropInventoryCreate
+from .auctions import auction_end
+from .changes import log_changes
+from .dashboard import bump_dashboards
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "2000"))
+MAX_REPORTED_ERRORS = int(os.getenv("IMPORT_MAX_REPORTED_ERRORS", "500"))
+# Physical lines one quoted CSV cell may span before the record is given up as unterminated.
+MAX_RECORD_LINES = int(os.getenv("IMPORT_MAX_RECORD_LINES", "50"))
+
+
+class NotUtf8Error(ValueError):
+    def __init__(self, line: int) -> None:
+        super().__init__(f"Line {line} is not valid UTF-8")
+        self.line = line
+
+
+def _decode(line: bytes, line_number: int) -> str:
+    try:
+        return line.decode("utf-8").rstrip("\r")
+    except UnicodeDecodeError as exc:
+        raise NotUtf8Error(line_number) from exc
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    # Re-split the request body on newlines without buffering the whole upload.
+    pending = b""
+    line_number = 0
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            line_number += 1
+            yield _decode(line, line_number)
+    if pending:
+        yield _decode(pending, line_number + 1)
+
+
+class _LineFeed:
+    # Lets one csv.reader consume lines as they arrive from the request body.
+    def __init__(self) -> None:
+        self.lines: deque[str] = deque()
+
+    def __iter__(self) -> "_LineFeed":
+        return self
+
+    def __next__(self) -> str:
+        if not self.lines:
+            raise StopIteration
+        return self.lines.popleft()
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+
+def _ends_quoted(line: str, quoted: bool) -> bool:
+    # Whether a quoted cell is still open at the end of the line. Same rules as csv.reader:
+    # a quote only opens a cell at its start, so a stray 5" in a bare cell is just text.
+    state = "quoted" if quoted else "start"
+    for char in line:
+        if state == "quoted":
+            if char == '"':
+                state = "closing"
+        elif state == "closing":
+            # A second quote is an escaped one; anything else follows the closed cell.
+            state = "quoted" if char == '"' else "start" if char == "," else "bare"
+        elif char == ",":
+            state = "start"
+        elif state == "start":
+            state = "quoted" if char == '"' else "bare"
+    return state == "quoted"
+
+
+async def _csv_records(lines: AsyncIterator[str]) -> AsyncIterator[tuple[int, dict | str]]:
+    # A single reader sees every record, so quoted cells may hold commas and newlines.
+    # Lines are handed over only once no quoted cell is left open, i.e. the record is complete.
+    feed = _LineFeed()
+    reader = csv.reader(feed)
+    header: list[str] | None = None
+    line_number = 0
+    record_start = 0
+    quoted = False
+    async for line in lines:
+        line_number += 1
+        if not feed:
+            record_start = line_number
+        feed.lines.append(line + "\n")
+        quoted = _ends_quoted(line, quoted)
+        if quoted:
+            if len(feed) < MAX_RECORD_LINES:
+                continue
+            # Give up on the record rather than buffer the rest of the upload behind it.
+            feed.lines.clear()
+            quoted = False
+            yield record_start, "Unterminated quoted field"
+            continue
+        try:
+            values = next(reader)
+        except csv.Error as exc:
+            feed.lines.clear()
+            yield record_start, f"Invalid CSV: {exc}"
+            continue
+        if not any(value.strip() for value in values):
+            continue
+        if header is None:
+            header = [column.strip() for column in values]
+            continue
+        if len(values) != len(header):
+            yield record_start, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        yield record_start, {key: value for key, value in zip(header, values) if value != ""}
+    if feed:
+        yield record_start, "Unterminated quoted field"
+
+
+async def iter_records(lines: AsyncIterator[str], fmt: str) -> AsyncIterator[tuple[int, dict | str]]:
+    # Yield (line_number, raw record); unparseable rows come back as an error string.
+    if fmt == "csv":
+        async for record in _csv_records(lines):
+            yield record
+        return
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as exc:
+            yield line_number, f"Invalid JSON: {exc.msg}"
+            continue
+        if not isinstance(record, dict):
+            yield line_number, "Expected a JSON object per line"
+            continue
+        yield line_number, record
+
+
+def _nest_location(record: dict) -> dict:
+    # CSV rows carry the location as flat columns; the schema expects an object.
+    if "location" in record or "location_name" not in record:
+        return record
+    nested = dict(record)
+    nested["location"] = {
+        "name": nested.pop("location_name"),
+        "lat": nested.pop("location_lat", None),
+        "lng": nested.pop("location_lng", None),
+    }
+    return nested
+
+
+def validate_record(record: dict) -> CropInventoryCreate:
+    return CropInventoryCreate.model_validate(_nest_location(record))
+
+
+def _row_values(farmer: User, payload: CropInventoryCreate, created_at: datetime) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "farmer_id": farmer.id,
+        "farmer_name": farmer.name,
+        "crop_name": payload.crop_name,
+        "quantity": payload.quantity,
+        "quality_score": payload.quality_score,
+        "base_price": payload.base_price,
+        "current_bid": payload.current_bid,
+        "highest_bidder_id": None,
+        "location_name": payload.location.name,
+        "location_lat": payload.location.lat,
+        "location_lng": payload.location.lng,
+        "image_url": payload.image_url,
+        "timestamp": created_at,
+        "status": InventoryStatus.AVAILABLE,
+        "listing_type": payload.listing_type,
+        "ends_at": auction_end(payload.listing_type, payload.ends_at, created_at),
+        "settled_at": None,
+        "sold_at": None,
+    }
+
+
+def _copy_value(value: object) -> object:
+    # Enums are stored by name, matching how the ORM writes them.
+    if isinstance(value, enum.Enum):
+        return value.name
+    return "" if value is None else value
+
+
+def _copy_rows(db: Session, table: Table, rows: list[dict]) -> None:
+    # COPY is the fastest ingest path on Postgres.
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([_copy_value(row[column]) for column in columns])
+    buffer.seek(0)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+
+
+def bulk_insert(db: Session, table: Table, rows: list[dict]) -> None:
+    # Rows must share the same keys; COPY on Postgres, executemany everywhere else.
+    if not rows:
+        return
+    if db.get_bind().dialect.name == "postgresql":
+        _copy_rows(db, table, rows)
+    else:
+        db.execute(insert(table), rows)
+
+
+def insert_chunk(db: Session, rows: list[dict]) -> None:
+    # One transaction per chunk so a bad chunk never rolls back earlier ones.
+    try:
+        bulk_insert(db, Inventory.__table__, rows)
+        bump_dashboards(db, *{row["farmer_id"] for row in rows})
+        log_changes(db, *(row["id"] for row in rows))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+
+class ImportReport:
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.received = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors: list[BulkImportRowError] = []
+
+    def add_error(self, row: int, error: str) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(BulkImportRowError(row=row, error=error))
+
+    def result(self) -> BulkImportResult:
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        return BulkImportResult(
+            received=self.received,
+            imported=self.imported,
+            failed=self.failed,
+            errors=self.errors,
+            errors_truncated=self.failed > len(self.errors),
+            elapsed_seconds=round(elapsed, 4),
+            rows_per_second=round(self.imported / elapsed, 1),
+        )
+
+
+def build_chunk(
+    farmer: User, records: list[tuple[int, dict | str]], report: ImportReport
+) -> tuple[list[int], list[dict]]:
+    # Validate a chunk up front so only clean rows reach the database.
+    row_numbers: list[int] = []
+    rows: list[dict] = []
+    created_at = datetime.utcnow()
+    for row_number, record in records:
+        report.received += 1
+        if isinstance(record, str):
+            report.add_error(row_number, record)
+            continue
+        try:
+            payload = validate_record(record)
+        except ValidationError as exc:
+            first = exc.errors()[0]
+            location = ".".join(str(part) for part in first["loc"])
+            report.add_error(row_number, f"{location}: {first['msg']}" if location else first["msg"])
+            continue
+        row_numbers.append(row_number)
+        rows.append(_row_values(farmer, payload, created_at))
+    return row_numbers, rows
+
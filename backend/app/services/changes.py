@@ -0,0 +1,126 @@
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import Select, delete, event, exists, func, insert, literal, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session, aliased
+
+from ..db import RoutingSession
+from ..models import ChangeLogCompaction, ChangeOp, Inventory, InventoryChange
+
+CHANGE_FEED_LIMIT = int(os.getenv("CHANGE_FEED_LIMIT", "1000"))
+# Sequence numbers are handed out at insert, not commit, so a lower seq can still become
+# visible shortly after a higher one. Entries are inserted as the transaction commits, so the
+# gap is one flush and a COMMIT; the returned cursor stays behind entries younger than this.
+CHANGE_FEED_SETTLE_SECONDS = float(os.getenv("CHANGE_FEED_SETTLE_SECONDS", "2"))
+CHANGE_LOG_RETENTION_HOURS = float(os.getenv("CHANGE_LOG_RETENTION_HOURS", "72"))
+
+
+@dataclass
+class ChangeBatch:
+    seq: int
+    upserts: list[Inventory]
+    deletes: list[str]
+    more: bool
+
+
+def log_changes(db: Session, *inventory_ids: str | None, op: ChangeOp = ChangeOp.UPSERT) -> None:
+    # Call inside the write's transaction; the entries are inserted when it commits.
+    if not db.in_transaction():
+        # Otherwise a rollback before any SQL wouldn't reach _drop_changes.
+        db.begin()
+    queued = db.info.setdefault("inventory_changes", {})
+    for inventory_id in inventory_ids:
+        if inventory_id:
+            # The last op for a listing wins and takes the latest position.
+            queued.pop(inventory_id, None)
+            queued[inventory_id] = op
+
+
+@event.listens_for(RoutingSession, "before_commit")
+def _insert_changes(session: Session) -> None:
+    # Written as the transaction's last statement: a seq and changed_at taken at the start of a
+    # slow write could commit behind a reader's cursor and never be seen.
+    queued = session.info.pop("inventory_changes", None)
+    if queued:
+        session.flush()
+        now = datetime.utcnow()
+        rows = [{"inventory_id": inventory_id, "op": op, "changed_at": now} for inventory_id, op in queued.items()]
+        session.execute(insert(InventoryChange), rows)
+
+
+@event.listens_for(RoutingSession, "after_soft_rollback")
+def _drop_changes(session: Session, previous_transaction) -> None:
+    session.info.pop("inventory_changes", None)
+
+
+def backfill_changes(connection: Connection, inventory_ids: Select | None = None) -> None:
+    # One upsert per existing listing, or per listing `inventory_ids` selects, for rows written
+    # before the log existed or bulk-loaded around it.
+    listings = select(Inventory.id, literal(ChangeOp.UPSERT, InventoryChange.op.type), literal(datetime.utcnow()))
+    if inventory_ids is not None:
+        listings = listings.where(Inventory.id.in_(inventory_ids))
+    connection.execute(insert(InventoryChange).from_select(["inventory_id", "op", "changed_at"], listings))
+
+
+def compaction_floor(db: Session) -> int:
+    return db.scalar(select(func.max(ChangeLogCompaction.floor_seq))) or 0
+
+
+def read_changes(db: Session, since: int, limit: int = CHANGE_FEED_LIMIT) -> ChangeBatch:
+    # Several changes to one listing collapse into its current row, or a tombstone once it's gone.
+    entries = db.execute(
+        select(InventoryChange.seq, InventoryChange.inventory_id, InventoryChange.op, InventoryChange.changed_at)
+        .where(InventoryChange.seq > since)
+        .order_by(InventoryChange.seq)
+        .limit(limit)
+    ).all()
+
+    horizon = datetime.utcnow() - timedelta(seconds=CHANGE_FEED_SETTLE_SECONDS)
+    cursor = since
+    for entry in entries:
+        if entry.changed_at > horizon:
+            break
+        cursor = entry.seq
+
+    latest = {entry.inventory_id: entry.op for entry in entries}
+    wanted = [inventory_id for inventory_id, op in latest.items() if op == ChangeOp.UPSERT]
+    found = {item.id: item for item in db.scalars(select(Inventory).where(Inventory.id.in_(wanted)))} if wanted else {}
+    return ChangeBatch(
+        seq=cursor,
+        upserts=[found[inventory_id] for inventory_id in wanted if inventory_id in found],
+        deletes=[inventory_id for inventory_id in latest if inventory_id not in found],
+        # Unsettled entries end the page early; the client picks them up on its next sync.
+        more=len(entries) == limit and cursor == entries[-1].seq,
+    )
+
+
+def compact_changes(db: Session, retention_hours: float = CHANGE_LOG_RETENTION_HOURS) -> int:
+    # Entries superseded by a newer one for the same listing can go at any time: every cursor
+    # below them also sees the newer entry. Old tombstones go after the retention window, which
+    # raises the floor below which clients must resync.
+    newer = aliased(InventoryChange)
+    removed = db.execute(
+        delete(InventoryChange).where(
+            exists().where(newer.inventory_id == InventoryChange.inventory_id, newer.seq > InventoryChange.seq)
+        )
+    ).rowcount
+
+    cutoff = datetime.utcnow() - timedelta(hours=retention_hours)
+    floor = compaction_floor(db)
+    expired = db.scalar(
+        select(func.max(InventoryChange.seq)).where(
+            InventoryChange.op == ChangeOp.DELETE, InventoryChange.changed_at < cutoff
+        )
+    )
+    if expired is not None:
+        removed += db.execute(
+            delete(InventoryChange).where(InventoryChange.op == ChangeOp.DELETE, InventoryChange.seq <= expired)
+        ).rowcount
+        floor = max(floor, expired)
+
+    if removed:
+        db.add(ChangeLogCompaction(floor_seq=floor, removed=removed, compacted_at=datetime.utcnow()))
+    db.commit()
+    return removed
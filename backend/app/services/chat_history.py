@@ -0,0 +1,98 @@
+import logging
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, delete, func, insert, literal, or_, select
+from sqlalchemy.orm import Session
+
+from ..models import ArchivedMessage, Inventory, InventoryStatus, Message, User
+from ..schemas import MessageOut
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_PAGE_SIZE = int(os.getenv("MESSAGE_PAGE_SIZE", "50"))
+MESSAGE_PAGE_MAX = 200
+# Threads of sold listings stay in the live table this long after their last message.
+CHAT_ARCHIVE_AFTER_DAYS = int(os.getenv("CHAT_ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_BATCH_THREADS = 200
+
+_COLUMNS = ("id", "inventory_id", "sender_id", "text", "timestamp")
+
+
+def _cursor(db: Session, before: str) -> tuple[datetime, str] | None:
+    for model in (Message, ArchivedMessage):
+        timestamp = db.scalar(select(model.timestamp).where(model.id == before))
+        if timestamp is not None:
+            return timestamp, before
+    return None
+
+
+def _page(db: Session, model, inventory_id: str, cursor: tuple[datetime, str] | None, limit: int) -> list[MessageOut]:
+    # Keyset on (timestamp, id) walks the thread index backwards without an OFFSET scan.
+    query = (
+        select(model, User.name)
+        .outerjoin(User, User.id == model.sender_id)
+        .where(model.inventory_id == inventory_id)
+    )
+    if cursor is not None:
+        timestamp, message_id = cursor
+        query = query.where(
+            or_(model.timestamp < timestamp, and_(model.timestamp == timestamp, model.id < message_id))
+        )
+    rows = db.execute(query.order_by(model.timestamp.desc(), model.id.desc()).limit(limit)).all()
+    return [
+        MessageOut(
+            id=msg.id,
+            inventory_id=msg.inventory_id,
+            sender_id=msg.sender_id,
+            text=msg.text,
+            timestamp=msg.timestamp,
+            sender_name=sender_name,
+        )
+        for msg, sender_name in rows
+    ]
+
+
+def message_page(db: Session, inventory_id: str, before: str | None, limit: int) -> list[MessageOut] | None:
+    # Newest `limit` messages older than `before`, returned oldest-first. None means an unknown cursor.
+    cursor = None
+    if before is not None:
+        cursor = _cursor(db, before)
+        if cursor is None:
+            return None
+
+    page = _page(db, Message, inventory_id, cursor, limit)
+    if len(page) < limit:
+        # Archived messages are always older than whatever is still live for the thread.
+        older = cursor
+        if page:
+            older = (page[-1].timestamp, page[-1].id)
+        page += _page(db, ArchivedMessage, inventory_id, older, limit - len(page))
+    page.reverse()
+    return page
+
+
+def archive_closed_threads(db: Session, older_than_days: int = CHAT_ARCHIVE_AFTER_DAYS) -> int:
+    # Moves whole threads of sold listings, a batch of threads per transaction.
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    moved = 0
+    while True:
+        thread_ids = db.scalars(
+            select(Message.inventory_id)
+            .join(Inventory, Inventory.id == Message.inventory_id)
+            .where(Inventory.status == InventoryStatus.SOLD)
+            .group_by(Message.inventory_id)
+            .having(func.max(Message.timestamp) < cutoff)
+            .limit(ARCHIVE_BATCH_THREADS)
+        ).all()
+        if not thread_ids:
+            return moved
+
+        # The cutoff guard leaves alone anything posted to these threads since they were picked.
+        moving = and_(Message.inventory_id.in_(thread_ids), Message.timestamp < cutoff)
+        source = select(*(getattr(Message, column) for column in _COLUMNS), literal(datetime.utcnow())).where(moving)
+        result = db.execute(insert(ArchivedMessage).from_select([*_COLUMNS, "archived_at"], source))
+        db.execute(delete(Message).where(moving))
+        db.commit()
+        moved += result.rowcount
+        logger.info("Archived %d threads (%d messages so far)", len(thread_ids), moved)
@@ -0,0 +1,131 @@
+import hashlib
+import logging
+import os
+
+from sqlalchemy import event, or_, select, update
+from sqlalchemy.orm import Session
+
+from ..core.cache import ObjectCache, remote_tier
+from ..db import RoutingSession, engine
+from ..models import ConversationMember, Escrow, Inventory, InventoryStatus, User
+from ..schemas import EscrowOut
+from .listings import inventory_out
+
+DASHBOARD_CACHE_SIZE = int(os.getenv("DASHBOARD_CACHE_SIZE", "2000"))
+# Keys carry the user's version, so the TTL only bounds memory, not staleness.
+DASHBOARD_CACHE_TTL_SECONDS = float(os.getenv("DASHBOARD_CACHE_TTL_SECONDS", "300"))
+DASHBOARD_CACHE_REDIS_URL = os.getenv("DASHBOARD_CACHE_REDIS_URL", "")
+DASHBOARD_LISTING_LIMIT = 200
+DASHBOARD_ESCROW_LIMIT = 200
+
+logger = logging.getLogger(__name__)
+
+dashboard_cache = ObjectCache(
+    "dashboard",
+    maxsize=DASHBOARD_CACHE_SIZE,
+    ttl=DASHBOARD_CACHE_TTL_SECONDS,
+    remote_ttl=DASHBOARD_CACHE_TTL_SECONDS,
+    remote=remote_tier(DASHBOARD_CACHE_REDIS_URL),
+)
+
+
+def _bump():
+    # Plain UPDATE; loaded User objects don't need syncing for a counter nobody reads back.
+    return (
+        update(User)
+        .values(dashboard_version=User.dashboard_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _queue(db: Session, stmt) -> None:
+    db.info.setdefault("dashboard_bumps", []).append(stmt)
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _apply_bumps(session: Session) -> None:
+    # Bumps run in their own short transaction once the write is visible. Inside the write they
+    # serialized every write per user and took user locks in a different order than listings.
+    statements = session.info.pop("dashboard_bumps", None)
+    if not statements:
+        return
+    try:
+        with engine.begin() as connection:
+            for stmt in statements:
+                connection.execute(stmt)
+    except Exception:
+        # The stale entry ages out with DASHBOARD_CACHE_TTL_SECONDS.
+        logger.exception("Dashboard version bump failed")
+
+
+@event.listens_for(RoutingSession, "after_soft_rollback")
+def _drop_bumps(session: Session, previous_transaction) -> None:
+    session.info.pop("dashboard_bumps", None)
+
+
+def bump_dashboards(db: Session, *user_ids: str | None) -> None:
+    # Queued on the session and applied after it commits; dropped on rollback.
+    ids = sorted({user_id for user_id in user_ids if user_id})
+    if ids:
+        _queue(db, _bump().where(User.id.in_(ids)))
+
+
+def bump_listing_dashboards(db: Session, inventory_id: str, *user_ids: str | None) -> None:
+    # The listing's farmer plus any other affected users, without loading the listing.
+    farmer = select(Inventory.farmer_id).where(Inventory.id == inventory_id)
+    ids = [user_id for user_id in user_ids if user_id]
+    _queue(db, _bump().where(or_(User.id.in_(farmer), User.id.in_(ids))))
+
+
+def bump_thread_dashboards(db: Session, inventory_id: str) -> None:
+    members = select(ConversationMember.user_id).where(ConversationMember.inventory_id == inventory_id)
+    _queue(db, _bump().where(User.id.in_(members)))
+
+
+def dashboard_key(user: User) -> str:
+    return f"{user.role.value}:{user.id}:{user.dashboard_version}"
+
+
+def dashboard_etag(key: str) -> str:
+    return f'W/"{hashlib.sha1(key.encode()).hexdigest()[:20]}"'
+
+
+def farmer_listings(db: Session, user_id: str) -> list[dict]:
+    items = db.scalars(
+        select(Inventory)
+        .where(Inventory.farmer_id == user_id)
+        .order_by(Inventory.timestamp.desc())
+        .limit(DASHBOARD_LISTING_LIMIT)
+    ).all()
+    return [inventory_out(item).model_dump(mode="json") for item in items]
+
+
+def farmer_escrows(db: Session, user_id: str) -> list[dict]:
+    escrows = db.scalars(
+        select(Escrow)
+        .join(Inventory, Inventory.id == Escrow.inventory_id)
+        .where(Inventory.farmer_id == user_id)
+        .order_by(Escrow.created_at.desc())
+        .limit(DASHBOARD_ESCROW_LIMIT)
+    ).all()
+    return [EscrowOut.model_validate(escrow).model_dump(mode="json") for escrow in escrows]
+
+
+def buyer_active_bids(db: Session, user_id: str) -> list[dict]:
+    items = db.scalars(
+        select(Inventory)
+        .where(Inventory.highest_bidder_id == user_id, Inventory.status != InventoryStatus.SOLD)
+        .order_by(Inventory.timestamp.desc())
+        .limit(DASHBOARD_LISTING_LIMIT)
+    ).all()
+    return [inventory_out(item).model_dump(mode="json") for item in items]
+
+
+def buyer_escrows(db: Session, user_id: str) -> list[dict]:
+    escrows = db.scalars(
+        select(Escrow)
+        .where(Escrow.buyer_id == user_id)
+        .order_by(Escrow.created_at.desc())
+        .limit(DASHBOARD_ESCROW_LIMIT)
+    ).all()
+    return [EscrowOut.model_validate(escrow).model_dump(mode="json") for escrow in escrows]
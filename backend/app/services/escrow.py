@@ -0,0 +1,107 @@
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, literal, select, update
+from sqlalchemy.orm import Session
+
+from ..models import Escrow, EscrowStatus, Inventory, InventoryStatus, ListingType
+
+PLATFORM_FEE_RATE = 0.02
+# Reserved fills still PENDING after this long give their quantity back; 0 keeps them open.
+ESCROW_FILL_TTL_MINUTES = float(os.getenv("ESCROW_FILL_TTL_MINUTES", "60"))
+ESCROW_EXPIRY_BATCH = int(os.getenv("ESCROW_EXPIRY_BATCH", "500"))
+
+
+def calculate_platform_fee(amount: int) -> int:
+    return max(int(round(amount * PLATFORM_FEE_RATE)), 0)
+
+
+def reserve_fill(db: Session, inventory_id: str, buyer_id: str, quantity: int, amount: int | None) -> Escrow | None:
+    # One conditional decrement matches the order: concurrent buyers serialize on the row
+    # and the quantity guard makes overselling impossible. None means not enough stock left.
+    remaining = Inventory.quantity - quantity
+    row = db.execute(
+        update(Inventory)
+        .where(
+            Inventory.id == inventory_id,
+            Inventory.listing_type == ListingType.FIXED,
+            Inventory.status != InventoryStatus.SOLD,
+            Inventory.quantity >= quantity,
+        )
+        .values(
+            quantity=remaining,
+            status=case(
+                (remaining == 0, literal(InventoryStatus.NEGOTIATING, Inventory.status.type)),
+                else_=Inventory.status,
+            ),
+        )
+        .returning(Inventory.current_bid)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if row is None:
+        return None
+
+    amount = amount or int(row.current_bid * quantity)
+    escrow = Escrow(
+        inventory_id=inventory_id,
+        buyer_id=buyer_id,
+        amount=amount,
+        platform_fee=calculate_platform_fee(amount),
+        requested_quantity=quantity,
+        stock_reserved=True,
+        status=EscrowStatus.PENDING,
+    )
+    db.add(escrow)
+    return escrow
+
+
+def cancel_fill(db: Session, escrow: Escrow) -> bool:
+    # Takes the lot lock first, in the same order as reserve and release, then flips the
+    # fill only if it is still PENDING, so its quantity goes back exactly once.
+    db.execute(select(Inventory.id).where(Inventory.id == escrow.inventory_id).with_for_update())
+    row = db.execute(
+        update(Escrow)
+        .where(Escrow.id == escrow.id, Escrow.stock_reserved.is_(True), Escrow.status == EscrowStatus.PENDING)
+        .values(status=EscrowStatus.CANCELLED, updated_at=datetime.utcnow())
+        .returning(Escrow.requested_quantity)
+    ).first()
+    if row is None:
+        return False
+    # A lot that ran out is for sale again.
+    db.execute(
+        update(Inventory)
+        .where(Inventory.id == escrow.inventory_id)
+        .values(
+            quantity=Inventory.quantity + row.requested_quantity,
+            status=case(
+                (
+                    Inventory.status == InventoryStatus.NEGOTIATING,
+                    literal(InventoryStatus.AVAILABLE, Inventory.status.type),
+                ),
+                else_=Inventory.status,
+            ),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    return True
+
+
+def expire_stale_fills(
+    db: Session,
+    inventory_id: str | None = None,
+    ttl_minutes: float = ESCROW_FILL_TTL_MINUTES,
+    limit: int = ESCROW_EXPIRY_BATCH,
+) -> list[Escrow]:
+    # Cancels reserved fills left unpaid past the TTL, on one lot or across all of them.
+    # The caller commits; the returned fills tell it whose dashboards and listings changed.
+    if ttl_minutes <= 0:
+        return []
+    query = select(Escrow).where(
+        Escrow.stock_reserved.is_(True),
+        Escrow.status == EscrowStatus.PENDING,
+        Escrow.created_at < datetime.utcnow() - timedelta(minutes=ttl_minutes),
+    )
+    if inventory_id is not None:
+        query = query.where(Escrow.inventory_id == inventory_id)
+    stale = db.scalars(query.order_by(Escrow.created_at).limit(limit)).all()
+    return [escrow for escrow in stale if cancel_fill(db, escrow)]
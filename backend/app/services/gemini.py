@@ -6,13 +6,15 @@ from typing import Tuple
 from google import genai
 from google.genai import types
 
+from ..core.metrics import model_timer
+from ..locations import HUBS
 from ..schemas import AnalysisResult, OfflineParseResult
 
 
 DEFAULT_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
 
 
-def _parse_data_url(data_url: str) -> Tuple[str, bytes]:
+def parse_data_url(data_url: str) -> Tuple[str, bytes]:
     # Expect a browser-friendly data URL for uploads.
     if not data_url.startswith("data:"):
         raise ValueError("Invalid image data. Expected data URL format.")
@@ -28,7 +30,7 @@ def analyze_produce(image_data_url: str) -> AnalysisResult:
     if not api_key:
         raise RuntimeError("GEMINI_API_KEY is not configured")
 
-    mime_type, image_bytes = _parse_data_url(image_data_url)
+    mime_type, image_bytes = parse_data_url(image_data_url)
 
     client = genai.Client(api_key=api_key)
 
@@ -41,17 +43,18 @@ def analyze_produce(image_data_url: str) -> AnalysisResult:
         "Return JSON only."
     )
 
-    response = client.models.generate_content(
-        model=DEFAULT_MODEL,
-        contents=[
-            types.Part.from_bytes(data=image_bytes, mime_type=mime_type),
-            prompt,
-        ],
-        config=types.GenerateContentConfig(
-            response_mime_type="application/json",
-            response_schema=AnalysisResult,
-        ),
-    )
+    with model_timer("analyze_produce"):
+        response = client.models.generate_content(
+            model=DEFAULT_MODEL,
+            contents=[
+                types.Part.from_bytes(data=image_bytes, mime_type=mime_type),
+                prompt,
+            ],
+            config=types.GenerateContentConfig(
+                response_mime_type="application/json",
+                response_schema=AnalysisResult,
+            ),
+        )
     # Prefer structured responses, then fall back to JSON text.
     if response.parsed is not None:
         return AnalysisResult.model_validate(response.parsed)
@@ -78,27 +81,28 @@ def parse_offline_message(text: str | None = None, audio_data_url: str | None =
         "Identify: "
         "- cropName (e.g., Maize, Cabbage, Potatoes) "
         "- quantity (estimate in KG if bags/units mentioned. 1 bag is roughly 90kg unless specified) "
-        "- locationName (Must match one of: Molo, Bahati, Naivasha, Gilgil, Njoro, Rongai, Subukia, Kuresoi, Nakuru CBD) "
+        f"- locationName (Must match one of: {', '.join(HUBS)}) "
         "- farmerName (if mentioned, else use \"Farmer\") "
         "Return JSON only."
     )
 
     parts: list[types.Part | str] = []
     if audio_data_url:
-        mime_type, audio_bytes = _parse_data_url(audio_data_url)
+        mime_type, audio_bytes = parse_data_url(audio_data_url)
         parts.append(prompt)
         parts.append(types.Part.from_bytes(data=audio_bytes, mime_type=mime_type))
     else:
         parts.append(f'{prompt} Farmer Message: \"{text}\"')
 
-    response = client.models.generate_content(
-        model=DEFAULT_MODEL,
-        contents=parts,
-        config=types.GenerateContentConfig(
-            response_mime_type="application/json",
-            response_schema=OfflineParseResult,
-        ),
-    )
+    with model_timer("parse_offline_message"):
+        response = client.models.generate_content(
+            model=DEFAULT_MODEL,
+            contents=parts,
+            config=types.GenerateContentConfig(
+                response_mime_type="application/json",
+                response_schema=OfflineParseResult,
+            ),
+        )
 
     if response.parsed is not None:
         return OfflineParseResult.model_validate(response.parsed)
@@ -0,0 +1,152 @@
+from datetime import datetime
+
+from sqlalchemy import Select, delete, func, insert, literal, select, union
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from ..db import upsert
+from ..models import Conversation, ConversationMember, Inventory, Message, User
+from ..schemas import ConversationOut
+
+INBOX_LIMIT = 100
+PREVIEW_LENGTH = 200
+
+
+def record_message(db: Session, message: Message, sender: User, farmer_id: str) -> None:
+    # Same transaction as the message: bump the summary, mark it read for the sender,
+    # and make sure the listing's farmer sees the thread.
+    summary = {
+        "last_message_id": message.id,
+        "last_message_text": message.text[:PREVIEW_LENGTH],
+        "last_sender_id": sender.id,
+        "last_sender_name": sender.name,
+        "last_message_at": message.timestamp,
+    }
+    stmt = upsert(db, Conversation).values(inventory_id=message.inventory_id, message_count=1, **summary)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["inventory_id"],
+        set_={"message_count": Conversation.message_count + 1, **summary},
+    ).returning(Conversation.message_count)
+    message_count = db.execute(stmt).scalar_one()
+
+    member = upsert(db, ConversationMember).values(
+        inventory_id=message.inventory_id, user_id=sender.id, read_count=message_count, last_read_at=message.timestamp
+    )
+    db.execute(
+        member.on_conflict_do_update(
+            index_elements=["inventory_id", "user_id"],
+            set_={"read_count": member.excluded.read_count, "last_read_at": member.excluded.last_read_at},
+        )
+    )
+    if farmer_id != sender.id:
+        farmer = upsert(db, ConversationMember).values(inventory_id=message.inventory_id, user_id=farmer_id, read_count=0)
+        db.execute(farmer.on_conflict_do_nothing(index_elements=["inventory_id", "user_id"]))
+
+
+def mark_read(db: Session, inventory_id: str, user_id: str) -> None:
+    # Catch the marker up to the summary's count in one statement; joins the thread if needed.
+    source = select(
+        Conversation.inventory_id, literal(user_id), Conversation.message_count, literal(datetime.utcnow())
+    ).where(Conversation.inventory_id == inventory_id)
+    stmt = upsert(db, ConversationMember).from_select(
+        ["inventory_id", "user_id", "read_count", "last_read_at"], source
+    )
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["inventory_id", "user_id"],
+            set_={"read_count": stmt.excluded.read_count, "last_read_at": stmt.excluded.last_read_at},
+        )
+    )
+
+
+def inbox(db: Session, user_id: str, limit: int = INBOX_LIMIT) -> list[ConversationOut]:
+    # Reads only summary and marker rows, so the cost doesn't grow with thread length.
+    rows = db.execute(
+        select(Conversation, ConversationMember.read_count, Inventory.crop_name)
+        .join(ConversationMember, ConversationMember.inventory_id == Conversation.inventory_id)
+        .join(Inventory, Inventory.id == Conversation.inventory_id)
+        .where(ConversationMember.user_id == user_id)
+        .order_by(Conversation.last_message_at.desc())
+        .limit(limit)
+    ).all()
+    return [
+        ConversationOut(
+            inventory_id=conversation.inventory_id,
+            crop_name=crop_name,
+            last_message_id=conversation.last_message_id,
+            last_message_text=conversation.last_message_text,
+            last_sender_id=conversation.last_sender_id,
+            last_sender_name=conversation.last_sender_name,
+            last_message_at=conversation.last_message_at,
+            message_count=conversation.message_count,
+            unread_count=max(conversation.message_count - read_count, 0),
+        )
+        for conversation, read_count, crop_name in rows
+    ]
+
+
+def rebuild_conversations(connection: Connection, inventory_ids: Select | None = None) -> None:
+    # Recomputes summaries from live messages for data loaded outside create_message, for
+    # every thread or only the listings `inventory_ids` selects; other threads keep their
+    # read markers. Rebuilt history counts as read for everyone.
+    def scoped(statement, column):
+        return statement if inventory_ids is None else statement.where(column.in_(inventory_ids))
+
+    connection.execute(scoped(delete(ConversationMember), ConversationMember.inventory_id))
+    connection.execute(scoped(delete(Conversation), Conversation.inventory_id))
+
+    threads = select(
+        Message.inventory_id,
+        Message.id,
+        Message.text,
+        Message.sender_id,
+        Message.timestamp,
+        func.row_number()
+        .over(partition_by=Message.inventory_id, order_by=(Message.timestamp.desc(), Message.id.desc()))
+        .label("position"),
+        func.count().over(partition_by=Message.inventory_id).label("total"),
+    )
+    ranked = scoped(threads, Message.inventory_id).subquery()
+    latest = (
+        select(
+            ranked.c.inventory_id,
+            ranked.c.total,
+            ranked.c.id,
+            func.substr(ranked.c.text, 1, PREVIEW_LENGTH),
+            ranked.c.sender_id,
+            User.name,
+            ranked.c.timestamp,
+        )
+        .outerjoin(User, User.id == ranked.c.sender_id)
+        .where(ranked.c.position == 1)
+    )
+    connection.execute(
+        insert(Conversation).from_select(
+            [
+                "inventory_id",
+                "message_count",
+                "last_message_id",
+                "last_message_text",
+                "last_sender_id",
+                "last_sender_name",
+                "last_message_at",
+            ],
+            latest,
+        )
+    )
+
+    participants = union(
+        scoped(select(Message.inventory_id, Message.sender_id.label("user_id")), Message.inventory_id),
+        scoped(
+            select(Conversation.inventory_id, Inventory.farmer_id).join(
+                Inventory, Inventory.id == Conversation.inventory_id
+            ),
+            Conversation.inventory_id,
+        ),
+    ).subquery()
+    members = select(
+        participants.c.inventory_id, participants.c.user_id, Conversation.message_count, Conversation.last_message_at
+    ).join(Conversation, Conversation.inventory_id == participants.c.inventory_id)
+    connection.execute(
+        insert(ConversationMember).from_select(["inventory_id", "user_id", "read_count", "last_read_at"], members)
+    )
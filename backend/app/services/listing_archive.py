@@ -0,0 +1,76 @@
+import logging
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, literal, select
+from sqlalchemy.orm import Session
+
+from ..models import (
+    ArchivedEscrow,
+    ArchivedInventory,
+    ArchivedMessage,
+    ChangeOp,
+    Conversation,
+    ConversationMember,
+    Escrow,
+    Inventory,
+    InventoryStatus,
+    Message,
+)
+from .changes import log_changes
+from .dashboard import bump_dashboards
+from .listings import invalidate_listing
+
+logger = logging.getLogger(__name__)
+
+# Sold listings stay in the live tables this long after the sale.
+INVENTORY_ARCHIVE_AFTER_DAYS = int(os.getenv("INVENTORY_ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_BATCH_LISTINGS = int(os.getenv("INVENTORY_ARCHIVE_BATCH_SIZE", "500"))
+
+
+def _copy(db: Session, source, target, where) -> int:
+    # INSERT ... SELECT of every live column plus the archive timestamp.
+    columns = [column.key for column in source.__table__.columns]
+    rows = select(*(getattr(source, column) for column in columns), literal(datetime.utcnow())).where(where)
+    return db.execute(insert(target).from_select([*columns, "archived_at"], rows)).rowcount
+
+
+def archive_sold_listings(db: Session, older_than_days: int = INVENTORY_ARCHIVE_AFTER_DAYS) -> int:
+    # Moves sold lots with their escrows and messages, a batch of lots per transaction,
+    # so listing, heatmap and dashboard queries only ever walk live lots.
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    moved = 0
+    while True:
+        query = (
+            select(Inventory.id, Inventory.farmer_id)
+            .where(Inventory.status == InventoryStatus.SOLD, Inventory.sold_at < cutoff)
+            .order_by(Inventory.sold_at)
+            .limit(ARCHIVE_BATCH_LISTINGS)
+        )
+        if db.get_bind().dialect.name == "postgresql":
+            query = query.with_for_update(skip_locked=True)
+        rows = db.execute(query).all()
+        if not rows:
+            db.rollback()
+            return moved
+
+        ids = [inventory_id for inventory_id, _ in rows]
+        buyers = db.scalars(select(Escrow.buyer_id).where(Escrow.inventory_id.in_(ids)).distinct()).all()
+        _copy(db, Inventory, ArchivedInventory, Inventory.id.in_(ids))
+        _copy(db, Escrow, ArchivedEscrow, Escrow.inventory_id.in_(ids))
+        _copy(db, Message, ArchivedMessage, Message.inventory_id.in_(ids))
+        # Threads of archived lots leave the inbox; their messages stay readable from the archive.
+        db.execute(delete(ConversationMember).where(ConversationMember.inventory_id.in_(ids)))
+        db.execute(delete(Conversation).where(Conversation.inventory_id.in_(ids)))
+        db.execute(delete(Message).where(Message.inventory_id.in_(ids)))
+        db.execute(delete(Escrow).where(Escrow.inventory_id.in_(ids)))
+        db.execute(delete(Inventory).where(Inventory.id.in_(ids)))
+        log_changes(db, *ids, op=ChangeOp.DELETE)
+        bump_dashboards(db, *(farmer_id for _, farmer_id in rows), *buyers)
+        db.commit()
+        for inventory_id in ids:
+            invalidate_listing(inventory_id)
+        moved += len(ids)
+        logger.info("Archived %d sold listings", moved)
+        if len(rows) < ARCHIVE_BATCH_LISTINGS:
+            return moved
@@ -0,0 +1,92 @@
+import os
+
+from sqlalchemy.orm import Session
+
+from ..core.cache import ObjectCache, remote_tier
+from ..db import engine
+from ..models import ArchivedInventory, Inventory
+from ..schemas import CropInventoryOut, Location
+
+LISTING_CACHE_SIZE = int(os.getenv("LISTING_CACHE_SIZE", "5000"))
+# Local entries can't be invalidated from other workers, so they stay short-lived.
+LISTING_CACHE_TTL_SECONDS = float(os.getenv("LISTING_CACHE_TTL_SECONDS", "5"))
+LISTING_CACHE_REMOTE_TTL_SECONDS = float(os.getenv("LISTING_CACHE_REMOTE_TTL_SECONDS", "300"))
+LISTING_CACHE_REDIS_URL = os.getenv("LISTING_CACHE_REDIS_URL", "")
+
+
+listing_cache = ObjectCache(
+    "listing",
+    maxsize=LISTING_CACHE_SIZE,
+    ttl=LISTING_CACHE_TTL_SECONDS,
+    remote_ttl=LISTING_CACHE_REMOTE_TTL_SECONDS,
+    remote=remote_tier(LISTING_CACHE_REDIS_URL),
+)
+
+
+def image_ref(item: Inventory | ArchivedInventory) -> str | None:
+    # Inline uploads are multi-MB data URLs; payloads point at the image endpoint instead.
+    if item.image_url and item.image_url.startswith("data:"):
+        return f"/inventory/{item.id}/image"
+    return item.image_url
+
+
+def inventory_out(item: Inventory | ArchivedInventory) -> CropInventoryOut:
+    return CropInventoryOut(
+        id=item.id,
+        farmer_id=item.farmer_id,
+        farmer_name=item.farmer_name,
+        crop_name=item.crop_name,
+        quantity=item.quantity,
+        quality_score=item.quality_score,
+        base_price=item.base_price,
+        current_bid=item.current_bid,
+        highest_bidder_id=item.highest_bidder_id,
+        location=Location(name=item.location_name, lat=item.location_lat, lng=item.location_lng),
+        image_url=image_ref(item),
+        timestamp=item.timestamp,
+        status=item.status,
+        listing_type=item.listing_type,
+        ends_at=item.ends_at,
+        settled_at=item.settled_at,
+    )
+
+
+def get_listing(db: Session, inventory_id: str) -> CropInventoryOut | None:
+    # Read-through lookup for hot lots; write paths call invalidate_listing after commit.
+    cached = listing_cache.get(inventory_id)
+    if cached is not None:
+        return CropInventoryOut.model_validate(cached)
+    # Fills read the primary: a lagging replica row cached here would outlive the invalidation.
+    token = listing_cache.begin_fill(inventory_id)
+    item = db.get(Inventory, inventory_id, populate_existing=True, bind_arguments={"bind": engine})
+    if item is None:
+        return None
+    listing = inventory_out(item)
+    listing_cache.fill(inventory_id, listing.model_dump(mode="json"), token)
+    return listing
+
+
+def listing_image(db: Session, inventory_id: str) -> str | None:
+    # Raw stored image (usually a data URL) for live or archived lots.
+    row = db.query(Inventory.image_url).filter(Inventory.id == inventory_id).first()
+    if row is None:
+        row = db.query(ArchivedInventory.image_url).filter(ArchivedInventory.id == inventory_id).first()
+    return row[0] if row is not None else None
+
+
+def get_archived_listing(db: Session, inventory_id: str) -> CropInventoryOut | None:
+    # Historical lookups for sold lots the archive mover has taken out of `inventory`; not cached.
+    item = db.get(ArchivedInventory, inventory_id)
+    return inventory_out(item) if item is not None else None
+
+
+def listing_exists(db: Session, inventory_id: str, include_archived: bool = False) -> bool:
+    if listing_cache.get(inventory_id) is not None:
+        return True
+    if db.query(Inventory.id).filter(Inventory.id == inventory_id).first() is not None:
+        return True
+    return include_archived and db.get(ArchivedInventory, inventory_id) is not None
+
+
+def invalidate_listing(inventory_id: str) -> None:
+    listing_cache.invalidate(inventory_id)
@@ -0,0 +1,271 @@
+import logging
+import os
+import statistics
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, case, event, func, or_, select, update
+from sqlalchemy.orm import Session, sessionmaker
+
+from ..core.metrics import Counter
+from ..db import RoutingSession, SessionLocal, upsert
+from ..models import Inventory, PriceEvent, PriceKind, PriceRollup
+
+logger = logging.getLogger(__name__)
+
+ALL = "*"
+GRANULARITIES = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+MARKET_ROLLUP_WORKER = os.getenv("MARKET_ROLLUP_WORKER", "1").lower() in ("1", "true", "yes")
+MARKET_ROLLUP_INTERVAL_SECONDS = float(os.getenv("MARKET_ROLLUP_INTERVAL_SECONDS", "5"))
+MARKET_ROLLUP_BATCH = int(os.getenv("MARKET_ROLLUP_BATCH", "1000"))
+# Rows per upsert statement, well under SQLite's bound-parameter limit.
+_UPSERT_CHUNK = 500
+
+price_events_rolled_up = Counter("price_events_rolled_up_total", "Price events folded into the rollups.")
+
+
+def quality_band(score: int) -> str:
+    if score >= 85:
+        return "A"
+    if score >= 70:
+        return "B"
+    return "C"
+
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    if granularity == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def record_price(db: Session, item: Inventory, kind: PriceKind, price: int, quantity: int) -> PriceEvent:
+    # One insert in the caller's transaction. The event doubles as an outbox row: the
+    # roll-up worker folds it into the rollups after commit, off the bid and release path.
+    event = PriceEvent(
+        inventory_id=item.id,
+        kind=kind,
+        crop_name=item.crop_name,
+        hub=item.location_name,
+        quality_band=quality_band(item.quality_score),
+        price=price,
+        quantity=max(quantity, 0),
+        occurred_at=datetime.utcnow(),
+    )
+    db.add(event)
+    db.info["price_events"] = True
+    return event
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _wake_rollup_worker(session: Session) -> None:
+    if session.info.pop("price_events", False):
+        rollup_worker.notify()
+
+
+@event.listens_for(RoutingSession, "after_soft_rollback")
+def _forget_price_events(session: Session, previous_transaction) -> None:
+    session.info.pop("price_events", None)
+
+
+def _rollup_rows(events: list[PriceEvent], now: datetime) -> list[dict]:
+    # Pre-aggregate the batch so every bucket row is upserted exactly once.
+    rows: dict[tuple, dict] = {}
+    for event in events:
+        for granularity in GRANULARITIES:
+            start = bucket_start(event.occurred_at, granularity)
+            for hub in (event.hub, ALL):
+                for band in (event.quality_band, ALL):
+                    key = (granularity, event.kind.value, event.crop_name, hub, band, start)
+                    row = rows.get(key)
+                    if row is None:
+                        row = rows[key] = {
+                            "id": str(uuid.uuid4()),
+                            "granularity": granularity,
+                            "kind": event.kind,
+                            "crop_name": event.crop_name,
+                            "hub": hub,
+                            "quality_band": band,
+                            "bucket_start": start,
+                            "event_count": 0,
+                            "volume": 0,
+                            "price_volume": 0,
+                            "price_sum": 0,
+                            "min_price": event.price,
+                            "max_price": event.price,
+                            "updated_at": now,
+                        }
+                    row["event_count"] += 1
+                    row["volume"] += event.quantity
+                    row["price_volume"] += event.price * event.quantity
+                    row["price_sum"] += event.price
+                    row["min_price"] = min(row["min_price"], event.price)
+                    row["max_price"] = max(row["max_price"], event.price)
+    # A fixed order keeps concurrent roll-ups from deadlocking on shared "*" rows.
+    return [rows[key] for key in sorted(rows)]
+
+
+def _upsert_rollups(db: Session, rows: list[dict]) -> None:
+    table = PriceRollup.__table__
+    for offset in range(0, len(rows), _UPSERT_CHUNK):
+        stmt = upsert(db, PriceRollup).values(rows[offset : offset + _UPSERT_CHUNK])
+        new = stmt.excluded
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["granularity", "kind", "crop_name", "hub", "quality_band", "bucket_start"],
+                set_={
+                    "event_count": table.c.event_count + new.event_count,
+                    "volume": table.c.volume + new.volume,
+                    "price_volume": table.c.price_volume + new.price_volume,
+                    "price_sum": table.c.price_sum + new.price_sum,
+                    "min_price": case((new.min_price < table.c.min_price, new.min_price), else_=table.c.min_price),
+                    "max_price": case((new.max_price > table.c.max_price, new.max_price), else_=table.c.max_price),
+                    # A late event changes the bucket's median; fill_medians computes it again.
+                    "median_price": None,
+                    "updated_at": new.updated_at,
+                },
+            )
+        )
+
+
+def roll_up_prices(db: Session, limit: int | None = None) -> int:
+    # Folds one batch of pending events into the rollups and commits; returns the batch size.
+    query = (
+        select(PriceEvent)
+        .where(PriceEvent.rolled_up_at.is_(None))
+        .order_by(PriceEvent.occurred_at)
+        .limit(limit or MARKET_ROLLUP_BATCH)
+    )
+    if db.get_bind().dialect.name == "postgresql":
+        # Concurrent workers each take a disjoint batch.
+        query = query.with_for_update(skip_locked=True)
+    events = db.scalars(query).all()
+    if not events:
+        db.rollback()
+        return 0
+    now = datetime.utcnow()
+    _upsert_rollups(db, _rollup_rows(events, now))
+    db.execute(
+        update(PriceEvent).where(PriceEvent.id.in_([e.id for e in events])).values(rolled_up_at=now),
+        execution_options={"synchronize_session": False},
+    )
+    db.commit()
+    price_events_rolled_up.inc(amount=len(events))
+    return len(events)
+
+
+class PriceRollupWorker:
+    # Drains the outbox whenever this process commits a price event, and every interval
+    # to pick up events written by other workers.
+    def __init__(self, session_factory: sessionmaker) -> None:
+        self.session_factory = session_factory
+        self._wake = threading.Condition()
+        self._pending = False
+        self._stopping = False
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="price-rollup", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._wake:
+            self._stopping = True
+            self._wake.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def notify(self) -> None:
+        if self._thread is None:
+            return
+        with self._wake:
+            self._pending = True
+            self._wake.notify()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                with self.session_factory() as db:
+                    while roll_up_prices(db) >= MARKET_ROLLUP_BATCH:
+                        pass
+                    while fill_medians(db) >= MARKET_ROLLUP_BATCH:
+                        pass
+            except Exception:
+                logger.exception("Price roll-up pass failed")
+            with self._wake:
+                if self._stopping:
+                    return
+                if not self._pending:
+                    self._wake.wait(MARKET_ROLLUP_INTERVAL_SECONDS)
+                self._pending = False
+                if self._stopping:
+                    return
+
+
+rollup_worker = PriceRollupWorker(SessionLocal)
+
+
+def _bucket_median(db: Session, rollup: PriceRollup) -> float | None:
+    filters = [
+        PriceEvent.kind == rollup.kind,
+        PriceEvent.crop_name == rollup.crop_name,
+        PriceEvent.occurred_at >= rollup.bucket_start,
+        PriceEvent.occurred_at < rollup.bucket_start + GRANULARITIES[rollup.granularity],
+    ]
+    if rollup.hub != ALL:
+        filters.append(PriceEvent.hub == rollup.hub)
+    if rollup.quality_band != ALL:
+        filters.append(PriceEvent.quality_band == rollup.quality_band)
+    if db.get_bind().dialect.name == "postgresql":
+        median = db.scalar(select(func.percentile_cont(0.5).within_group(PriceEvent.price)).where(*filters))
+        return None if median is None else float(median)
+    prices = db.scalars(select(PriceEvent.price).where(*filters)).all()
+    return float(statistics.median(prices)) if prices else None
+
+
+def fill_medians(db: Session, limit: int | None = None) -> int:
+    # Medians aren't additive, so each bucket's is computed once from its events after the
+    # bucket has closed, and stored on the rollup; reads never touch the events. Commits and
+    # returns how many buckets were filled.
+    now = datetime.utcnow()
+    closed = or_(
+        *(
+            and_(PriceRollup.granularity == granularity, PriceRollup.bucket_start <= now - width)
+            for granularity, width in GRANULARITIES.items()
+        )
+    )
+    rollups = db.scalars(
+        select(PriceRollup)
+        .where(PriceRollup.median_price.is_(None), closed)
+        .order_by(PriceRollup.bucket_start)
+        .limit(limit or MARKET_ROLLUP_BATCH)
+    ).all()
+    for rollup in rollups:
+        rollup.median_price = _bucket_median(db, rollup)
+    db.commit()
+    return len(rollups)
+
+
+def latest_price(db: Session, crop_name: str, hub: str) -> int | None:
+    # Most recent daily VWAP for the crop, preferring sales over bids and the hub over all hubs.
+    for kind in (PriceKind.SALE, PriceKind.BID):
+        for scope in (hub, ALL):
+            rollup = db.scalars(
+                select(PriceRollup)
+                .where(
+                    PriceRollup.granularity == "day",
+                    PriceRollup.kind == kind,
+                    PriceRollup.crop_name == crop_name,
+                    PriceRollup.hub == scope,
+                    PriceRollup.quality_band == ALL,
+                )
+                .order_by(PriceRollup.bucket_start.desc())
+                .limit(1)
+            ).first()
+            if rollup is not None:
+                return round(rollup.vwap)
+    return None
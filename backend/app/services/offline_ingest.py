@@ -0,0 +1,312 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Callable
+
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+
+from ..core.metrics import Counter
+from ..db import SessionLocal, upsert
+from ..locations import HUBS
+from ..models import Escrow, EscrowStatus, IngestedMessage, Inventory, InventoryStatus, ListingType
+from ..schemas import OfflineBatchMessage, OfflineIngestOutcome, OfflineIngestSummary, OfflineParseResult
+from .changes import log_changes
+from .dashboard import bump_dashboards
+from .listings import invalidate_listing
+from .market import latest_price
+
+logger = logging.getLogger(__name__)
+
+OFFLINE_BATCH_MAX = int(os.getenv("OFFLINE_BATCH_MAX", "500"))
+OFFLINE_PARSE_WORKERS = int(os.getenv("OFFLINE_PARSE_WORKERS", "8"))
+OFFLINE_WRITE_CHUNK = int(os.getenv("OFFLINE_WRITE_CHUNK", "100"))
+# Asking price for crops the market index has not priced yet.
+OFFLINE_DEFAULT_PRICE = int(os.getenv("OFFLINE_DEFAULT_PRICE", "50"))
+OFFLINE_QUALITY_SCORE = int(os.getenv("OFFLINE_QUALITY_SCORE", "70"))
+# How long the same sender and text count as a repeat when the gateway sends no message id.
+OFFLINE_DEDUPE_WINDOW_HOURS = float(os.getenv("OFFLINE_DEDUPE_WINDOW_HOURS", "24"))
+
+# Shared by every batch so concurrent uploads can't multiply the model calls in flight.
+parse_pool = ThreadPoolExecutor(max_workers=OFFLINE_PARSE_WORKERS, thread_name_prefix="offline-parse")
+
+offline_messages = Counter("offline_messages_total", "Gateway messages by ingestion outcome.", ["outcome"])
+
+_HUB_NAMES = {name.lower(): name for name in HUBS}
+
+
+@dataclass
+class ParsedMessage:
+    index: int
+    key: str
+    message_id: str | None
+    result: OfflineParseResult
+
+
+def message_key(gateway: str, message: OfflineBatchMessage) -> str:
+    # Gateways retry with the same id; without one, the same sender and content count as a repeat.
+    if message.message_id:
+        raw = f"{gateway}\x00id\x00{message.message_id}"
+    else:
+        content = " ".join((message.text or "").lower().split()) or message.audio_base64 or ""
+        raw = f"{gateway}\x00{message.sender or ''}\x00{content}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _live():
+    return or_(IngestedMessage.expires_at.is_(None), IngestedMessage.expires_at > datetime.utcnow())
+
+
+def known_keys(keys: set[str]) -> dict[str, str | None]:
+    with SessionLocal() as db:
+        rows = db.execute(
+            select(IngestedMessage.key, IngestedMessage.inventory_id).where(IngestedMessage.key.in_(keys), _live())
+        ).all()
+    return {key: inventory_id for key, inventory_id in rows}
+
+
+def _failed(parsed: ParsedMessage, error: str) -> OfflineIngestOutcome:
+    return OfflineIngestOutcome(index=parsed.index, message_id=parsed.message_id, status="failed", error=error)
+
+
+def _claim(db: Session, claims: list[dict]) -> set[str]:
+    # Keys another batch already committed are skipped; only the ones inserted here, or taken
+    # over from an expired row, are applied.
+    stmt = upsert(db, IngestedMessage).values(claims)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["key"],
+        set_={
+            "inventory_id": stmt.excluded.inventory_id,
+            "ingested_at": stmt.excluded.ingested_at,
+            "expires_at": stmt.excluded.expires_at,
+        },
+        where=IngestedMessage.expires_at < stmt.excluded.ingested_at,
+    ).returning(IngestedMessage.key)
+    return set(db.scalars(stmt))
+
+
+def _reserved_quantities(db: Session, inventory_ids: list[str]) -> dict[str, int]:
+    if not inventory_ids:
+        return {}
+    rows = db.execute(
+        select(Escrow.inventory_id, func.sum(Escrow.requested_quantity))
+        .where(
+            Escrow.inventory_id.in_(inventory_ids),
+            Escrow.stock_reserved.is_(True),
+            Escrow.status.in_((EscrowStatus.PENDING, EscrowStatus.VERIFIED)),
+        )
+        .group_by(Escrow.inventory_id)
+    )
+    return {inventory_id: quantity for inventory_id, quantity in rows}
+
+
+def write_chunk(farmer_id: str, farmer_name: str, chunk: list[ParsedMessage]) -> list[OfflineIngestOutcome]:
+    # One transaction per chunk: new lots are created, and a farmer's open lot of the same crop
+    # at the same hub takes the newly reported quantity instead of being listed twice. Farmers
+    # text what they have in store now, so the latest report replaces the quantity, not adds to it;
+    # fills reserved but not yet released are still in that store, so they come off the report.
+    outcomes: list[OfflineIngestOutcome] = []
+    planned: list[tuple[ParsedMessage, tuple[str, str, str], int]] = []
+    for parsed in sorted(chunk, key=lambda item: item.index):
+        hub = _HUB_NAMES.get(parsed.result.locationName.strip().lower())
+        quantity = round(parsed.result.quantity)
+        if hub is None:
+            outcomes.append(_failed(parsed, f"Unknown location: {parsed.result.locationName}"))
+        elif quantity <= 0:
+            outcomes.append(_failed(parsed, "Quantity must be positive"))
+        else:
+            name = (parsed.result.farmerName or "").strip() or farmer_name
+            planned.append((parsed, (name, parsed.result.cropName.strip().title(), hub), quantity))
+    if not planned:
+        return outcomes
+
+    now = datetime.utcnow()
+    content_expiry = now + timedelta(hours=OFFLINE_DEDUPE_WINDOW_HOURS)
+    with SessionLocal() as db:
+        try:
+            open_lots = db.scalars(
+                select(Inventory).where(
+                    Inventory.farmer_id == farmer_id,
+                    Inventory.status != InventoryStatus.SOLD,
+                    Inventory.listing_type == ListingType.FIXED,
+                    Inventory.crop_name.in_({lot[1] for _, lot, _ in planned}),
+                    Inventory.location_name.in_({lot[2] for _, lot, _ in planned}),
+                )
+                # Held until commit so no fill is reserved against a quantity about to be replaced.
+                .with_for_update()
+            ).all()
+            reserved = _reserved_quantities(db, [item.id for item in open_lots])
+            lots = {(item.farmer_name, item.crop_name, item.location_name): item for item in open_lots}
+            targets: dict[str, Inventory] = {}
+            prices: dict[tuple[str, str], int] = {}
+            for parsed, lot, _ in planned:
+                item = lots.get(lot)
+                if item is None:
+                    name, crop_name, hub = lot
+                    if (crop_name, hub) not in prices:
+                        prices[crop_name, hub] = latest_price(db, crop_name, hub) or OFFLINE_DEFAULT_PRICE
+                    price = prices[crop_name, hub]
+                    lat, lng = HUBS[hub]
+                    item = lots[lot] = Inventory(
+                        id=str(uuid.uuid4()),
+                        farmer_id=farmer_id,
+                        farmer_name=name,
+                        crop_name=crop_name,
+                        quantity=0,
+                        quality_score=OFFLINE_QUALITY_SCORE,
+                        base_price=price,
+                        current_bid=price,
+                        location_name=hub,
+                        location_lat=lat,
+                        location_lng=lng,
+                        timestamp=now,
+                        status=InventoryStatus.AVAILABLE,
+                        listing_type=ListingType.FIXED,
+                    )
+                targets[parsed.key] = item
+
+            claimed = _claim(
+                db,
+                [
+                    {
+                        "key": parsed.key,
+                        "inventory_id": targets[parsed.key].id,
+                        "ingested_at": now,
+                        "expires_at": None if parsed.message_id else content_expiry,
+                    }
+                    for parsed, _, _ in planned
+                ],
+            )
+            created: set[str] = set()
+            updated: set[str] = set()
+            for parsed, _, quantity in planned:
+                item = targets[parsed.key]
+                if parsed.key not in claimed:
+                    # Another batch committed this message between the key check and now.
+                    outcomes.append(
+                        OfflineIngestOutcome(index=parsed.index, message_id=parsed.message_id, status="duplicate")
+                    )
+                    continue
+                if item in db:
+                    updated.add(item.id)
+                    status_name = "updated"
+                else:
+                    db.add(item)
+                    created.add(item.id)
+                    status_name = "created"
+                item.quantity = max(quantity - reserved.get(item.id, 0), 0)
+                # Same rule as reserving a fill: a lot with nothing left waits on its open fills.
+                item.status = InventoryStatus.AVAILABLE if item.quantity else InventoryStatus.NEGOTIATING
+                outcomes.append(
+                    OfflineIngestOutcome(
+                        index=parsed.index, message_id=parsed.message_id, status=status_name, inventory_id=item.id
+                    )
+                )
+            if created or updated:
+                bump_dashboards(db, farmer_id)
+                log_changes(db, *created, *updated)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+    for inventory_id in updated - created:
+        invalidate_listing(inventory_id)
+    return outcomes
+
+
+class IngestReport:
+    def __init__(self, received: int) -> None:
+        self.started = time.perf_counter()
+        self.received = received
+        self.counts = {"created": 0, "updated": 0, "duplicate": 0, "failed": 0}
+
+    def line(self, outcome: OfflineIngestOutcome) -> str:
+        self.counts[outcome.status] += 1
+        offline_messages.inc(outcome.status)
+        return outcome.model_dump_json(exclude_none=True) + "\n"
+
+    def summary(self) -> str:
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        summary = OfflineIngestSummary(
+            received=self.received,
+            created=self.counts["created"],
+            updated=self.counts["updated"],
+            duplicates=self.counts["duplicate"],
+            failed=self.counts["failed"],
+            elapsed_seconds=round(elapsed, 4),
+            messages_per_second=round(self.received / elapsed, 1),
+        )
+        return json.dumps({"summary": summary.model_dump()}) + "\n"
+
+
+def _parse_error(exc: Exception) -> str:
+    if isinstance(exc, (ValueError, RuntimeError)) and not isinstance(exc, ValidationError):
+        return str(exc)
+    logger.exception("Offline message parsing failed", exc_info=exc)
+    return "Offline parsing failed"
+
+
+async def ingest_batch(
+    farmer_id: str,
+    farmer_name: str,
+    gateway: str,
+    messages: list[OfflineBatchMessage],
+    parse: Callable[[OfflineBatchMessage], OfflineParseResult],
+) -> AsyncIterator[str]:
+    # Repeats are dropped before any model call; the rest are parsed on the shared pool and
+    # written in chunks while later messages are still being parsed. Yields NDJSON lines.
+    report = IngestReport(len(messages))
+    keys = [message_key(gateway, message) for message in messages]
+    seen = await run_in_threadpool(known_keys, set(keys))
+
+    loop = asyncio.get_running_loop()
+    pending: dict[asyncio.Future, tuple[int, str, OfflineBatchMessage]] = {}
+    first_seen: set[str] = set()
+    try:
+        for index, (message, key) in enumerate(zip(messages, keys)):
+            if key in seen or key in first_seen:
+                yield report.line(
+                    OfflineIngestOutcome(
+                        index=index, message_id=message.message_id, status="duplicate", inventory_id=seen.get(key)
+                    )
+                )
+                continue
+            first_seen.add(key)
+            pending[loop.run_in_executor(parse_pool, parse, message)] = (index, key, message)
+
+        chunk: list[ParsedMessage] = []
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                index, key, message = pending.pop(future)
+                try:
+                    chunk.append(ParsedMessage(index, key, message.message_id, future.result()))
+                except Exception as exc:
+                    yield report.line(
+                        OfflineIngestOutcome(
+                            index=index, message_id=message.message_id, status="failed", error=_parse_error(exc)
+                        )
+                    )
+            if chunk and (len(chunk) >= OFFLINE_WRITE_CHUNK or not pending):
+                try:
+                    outcomes = await run_in_threadpool(write_chunk, farmer_id, farmer_name, chunk)
+                except Exception as exc:
+                    logger.exception("Offline ingest chunk failed")
+                    outcomes = [_failed(parsed, f"Write failed: {exc.__class__.__name__}") for parsed in chunk]
+                for outcome in outcomes:
+                    yield report.line(outcome)
+                chunk = []
+    finally:
+        # A client that disconnects mid-batch shouldn't keep spending model calls.
+        for future in pending:
+            future.cancel()
+    yield report.summary()
@@ -0,0 +1,135 @@
+import io
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from PIL import Image, ImageChops, ImageFilter, ImageStat, UnidentifiedImageError
+
+from ..core.metrics import Counter, Histogram
+from .gemini import parse_data_url
+
+PRESCREEN_ENABLED = os.getenv("PRESCREEN_ENABLED", "1") != "0"
+PRESCREEN_WORKERS = int(os.getenv("PRESCREEN_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Shortest side in pixels; smaller photos don't carry enough detail to grade.
+PRESCREEN_MIN_SIDE = int(os.getenv("PRESCREEN_MIN_SIDE", "224"))
+# Variance of the Laplacian on the downscaled greyscale image; sharp photos score in the hundreds.
+PRESCREEN_MIN_SHARPNESS = float(os.getenv("PRESCREEN_MIN_SHARPNESS", "40"))
+# Mean luminance bounds (0-255) and the share of crushed or blown-out pixels tolerated.
+PRESCREEN_MIN_BRIGHTNESS = float(os.getenv("PRESCREEN_MIN_BRIGHTNESS", "35"))
+PRESCREEN_MAX_BRIGHTNESS = float(os.getenv("PRESCREEN_MAX_BRIGHTNESS", "230"))
+PRESCREEN_MAX_CLIPPED = float(os.getenv("PRESCREEN_MAX_CLIPPED", "0.6"))
+# Colourfulness (Hasler-Suesstrunk) below this reads as a document, screenshot or greyscale
+# shot rather than produce. 0 turns the check off.
+PRESCREEN_MIN_COLORFULNESS = float(os.getenv("PRESCREEN_MIN_COLORFULNESS", "0"))
+# Checks run on a thumbnail of this size; JPEGs are decoded straight to it.
+_WORKING_SIZE = 512
+
+# Own pool so a burst of uploads queues here instead of taking the request threadpool.
+prescreen_pool = ThreadPoolExecutor(max_workers=PRESCREEN_WORKERS, thread_name_prefix="prescreen")
+
+prescreen_images = Counter("prescreen_images_total", "Analysis uploads by pre-screen outcome.", ["outcome"])
+prescreen_seconds = Histogram(
+    "prescreen_duration_seconds",
+    "Time spent pre-screening an upload.",
+    ["outcome"],
+    (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5),
+)
+
+_LAPLACIAN = ImageFilter.Kernel((3, 3), [0, 1, 0, 1, -4, 1, 0, 1, 0], scale=1, offset=128)
+
+_RETAKE = {
+    "undecodable": "The photo could not be read. Please retake it.",
+    "too_small": "The photo is too small. Move closer or use a higher camera resolution.",
+    "blurry": "The photo is blurry. Hold the phone steady and tap to focus on the produce.",
+    "too_dark": "The photo is too dark. Retake it in daylight or with more light.",
+    "overexposed": "The photo is too bright. Move out of direct glare and retake it.",
+    "not_produce": "This doesn't look like a photo of produce. Please photograph the crop itself.",
+}
+
+
+class ImageRejected(ValueError):
+    def __init__(self, reason: str) -> None:
+        super().__init__(_RETAKE[reason])
+        self.reason = reason
+
+
+@dataclass
+class PrescreenReport:
+    width: int
+    height: int
+    sharpness: float
+    brightness: float
+    shadows: float
+    highlights: float
+    colorfulness: float
+
+
+def _colorfulness(image: Image.Image) -> float:
+    # Signed opponent channels are stored halved around 128 so they fit in 8 bits.
+    red, green, blue = image.split()
+    rg = ImageStat.Stat(ImageChops.subtract(red, green, scale=2, offset=128))
+    yb = ImageStat.Stat(ImageChops.subtract(ImageChops.add(red, green, scale=2), blue, scale=2, offset=128))
+    spread = math.hypot(rg.stddev[0], yb.stddev[0])
+    mean = math.hypot(rg.mean[0] - 128, yb.mean[0] - 128)
+    return 2 * (spread + 0.3 * mean)
+
+
+def inspect_image(image_bytes: bytes) -> PrescreenReport:
+    # Raises ImageRejected with the first check that fails, cheapest checks first.
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        width, height = image.size
+        if min(width, height) < PRESCREEN_MIN_SIDE:
+            raise ImageRejected("too_small")
+        image.draft("RGB", (_WORKING_SIZE, _WORKING_SIZE))
+        if image.mode in ("1", "P"):
+            # Palette images only resize nearest-neighbour, which would fake sharpness.
+            image = image.convert("RGB")
+        # Shrunk before any conversion: JPEGs decode at a DCT scale, other formats are
+        # box-reduced in C first, so no full-size RGB copy is made.
+        image.thumbnail((_WORKING_SIZE, _WORKING_SIZE))
+        image = image.convert("RGB")
+    # Pillow refuses decompression bombs on open, so oversized uploads land here too.
+    except (UnidentifiedImageError, OSError, SyntaxError, Image.DecompressionBombError) as exc:
+        raise ImageRejected("undecodable") from exc
+    grey = image.convert("L")
+
+    histogram = grey.histogram()
+    pixels = grey.width * grey.height
+    brightness = ImageStat.Stat(grey).mean[0]
+    shadows = sum(histogram[:8]) / pixels
+    highlights = sum(histogram[248:]) / pixels
+    if brightness < PRESCREEN_MIN_BRIGHTNESS or shadows > PRESCREEN_MAX_CLIPPED:
+        raise ImageRejected("too_dark")
+    if brightness > PRESCREEN_MAX_BRIGHTNESS or highlights > PRESCREEN_MAX_CLIPPED:
+        raise ImageRejected("overexposed")
+
+    sharpness = ImageStat.Stat(grey.filter(_LAPLACIAN)).var[0]
+    if sharpness < PRESCREEN_MIN_SHARPNESS:
+        raise ImageRejected("blurry")
+
+    colorfulness = _colorfulness(image)
+    if colorfulness < PRESCREEN_MIN_COLORFULNESS:
+        raise ImageRejected("not_produce")
+    return PrescreenReport(width, height, sharpness, brightness, shadows, highlights, colorfulness)
+
+
+def prescreen_image(image_data_url: str) -> PrescreenReport | None:
+    # Runs before the model call; bad uploads are turned away in milliseconds instead of a model round-trip.
+    if not PRESCREEN_ENABLED:
+        return None
+    _, image_bytes = parse_data_url(image_data_url)
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        report = inspect_image(image_bytes)
+        outcome = "accepted"
+        return report
+    except ImageRejected as exc:
+        outcome = exc.reason
+        raise
+    finally:
+        prescreen_images.inc(outcome)
+        prescreen_seconds.observe(time.perf_counter() - started, outcome)
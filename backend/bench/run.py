@@ -0,0 +1,398 @@
+import argparse
+import asyncio
+import base64
+import io
+import json
+import logging
+import os
+import platform
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable
+
+import httpx
+from PIL import Image, ImageFilter
+
+PASSWORD = "password123"
+FARMER_EMAIL = "mzee@example.com"
+BUYER_EMAILS = ["wilson@example.com", "aisha@example.com", "daniel@example.com"]
+LISTING_QUANTITY = 1000
+OFFLINE_BATCH_SIZE = 50
+
+
+def _data_url(image: Image.Image) -> str:
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=85)
+    return "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+# Sharp, colourful and evenly lit so it passes the pre-screen; the blurred copy is turned away.
+_noise = Image.effect_noise((1024, 768), 48)
+_photo = Image.merge("RGB", (_noise, _noise.point(lambda value: value // 2 + 40), Image.new("L", _noise.size, 50)))
+PHOTO = _data_url(_photo)
+BLURRY_PHOTO = _data_url(_photo.filter(ImageFilter.GaussianBlur(6)))
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.statuses: dict[str, dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        self.errors: dict[str, int] = defaultdict(int)
+
+    async def call(
+        self, client: httpx.AsyncClient, route: str, method: str, url: str, ok: tuple[int, ...] = (200, 201), **kwargs
+    ) -> httpx.Response | None:
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.errors[route] += 1
+            return None
+        self.latencies[route].append(time.perf_counter() - started)
+        self.statuses[route][response.status_code] += 1
+        if response.status_code not in ok:
+            self.errors[route] += 1
+        return response
+
+
+def _percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(recorder: Recorder, elapsed: dict[str, float]) -> dict[str, dict]:
+    routes: dict[str, dict] = {}
+    for route, values in sorted(recorder.latencies.items()):
+        ordered = sorted(values)
+        duration = elapsed.get(route.split(" ", 1)[0], 0.0) or 1e-9
+        routes[route] = {
+            "requests": len(ordered),
+            "errors": recorder.errors[route],
+            "statuses": {str(code): count for code, count in sorted(recorder.statuses[route].items())},
+            "throughput_rps": round(len(ordered) / duration, 1),
+            "p50_ms": round(_percentile(ordered, 50) * 1000, 2),
+            "p95_ms": round(_percentile(ordered, 95) * 1000, 2),
+            "p99_ms": round(_percentile(ordered, 99) * 1000, 2),
+        }
+    return routes
+
+
+# --- app under test -------------------------------------------------------------------------
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def boot_app(database_url: str, model_latency: float) -> tuple[str, Callable[[], None]]:
+    # Environment must be set before the app package reads it at import time.
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("GEMINI_API_KEY", "bench-fake")
+    # A handful of bench users would trip the per-user rate limits; bulkheads stay on.
+    for name in ("ANALYSIS", "CHAT"):
+        os.environ.setdefault(f"ADMISSION_{name}_RATE", "0")
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+    import uvicorn
+
+    from app.api import analysis
+    from app.cli import main as cli
+    from app.main import app
+    from app.schemas import AnalysisResult, OfflineParseResult
+
+    cli(["migrate"])
+    cli(["seed"])
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    # Local fake so model latency is fixed and no quota is spent.
+    def fake_analyze(image_data_url: str) -> AnalysisResult:
+        time.sleep(model_latency)
+        return AnalysisResult(cropName="Carrots", freshnessScore=88, estimatedShelfLife="7 days", marketInsight="Steady")
+
+    def fake_parse(text: str | None = None, audio_data_url: str | None = None) -> OfflineParseResult:
+        time.sleep(model_latency)
+        return OfflineParseResult(cropName="Maize", quantity=900, locationName="Molo", farmerName="Farmer")
+
+    analysis.analyze_produce = fake_analyze
+    analysis.parse_offline_message = fake_parse
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    def stop() -> None:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+    return f"http://127.0.0.1:{port}", stop
+
+
+# --- scenarios ------------------------------------------------------------------------------
+
+
+async def _token(client: httpx.AsyncClient, email: str) -> dict[str, str]:
+    response = await client.post("/auth/login", json={"email": email, "password": PASSWORD})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def _create_listing(client: httpx.AsyncClient, farmer: dict[str, str], listing_type: str = "BIDDING") -> str:
+    response = await client.post(
+        "/inventory",
+        headers=farmer,
+        json={
+            "crop_name": "Carrots",
+            "quantity": LISTING_QUANTITY,
+            "quality_score": 80,
+            "base_price": 30,
+            "current_bid": 30,
+            "location": {"name": "Njoro", "lat": -0.34, "lng": 35.94},
+            "listing_type": listing_type,
+        },
+    )
+    response.raise_for_status()
+    return response.json()["id"]
+
+
+Scenario = Callable[[httpx.AsyncClient, Recorder, dict], Awaitable[None]]
+
+
+async def inventory_scenario(client: httpx.AsyncClient, rec: Recorder, ctx: dict) -> None:
+    await rec.call(client, "inventory GET /inventory", "GET", "/inventory")
+    await rec.call(client, "inventory GET /inventory?crop_name", "GET", "/inventory", params={"crop_name": "Carrots"})
+
+
+async def heatmap_scenario(client: httpx.AsyncClient, rec: Recorder, ctx: dict) -> None:
+    await rec.call(client, "heatmap GET /inventory/heatmap", "GET", "/inventory/heatmap")
+
+
+async def hot_bid_scenario(client: httpx.AsyncClient, rec: Recorder, ctx: dict) -> None:
+    # Many buyers racing on one lot; outbid (400) and lost-race (409) responses are expected, not errors.
+    ctx["bid"] += 1
+    buyer = ctx["buyers"][ctx["bid"] % len(ctx["buyers"])]
+    await rec.call(
+        client,
+        "bids POST /inventory/{id}/bid",
+        "POST",
+        f"/inventory/{ctx['hot_listing']}/bid",
+        ok=(200, 400, 409),
+        headers=buyer,
+        json={"amount": ctx["bid"]},
+    )
+
+
+async def fills_scenario(client: httpx.AsyncClient, rec: Recorder, ctx: dict) -> None:
+    # Buyers take small slices of one FIXED lot; once it runs out 409 is the expected answer.
+    ctx["fill"] += 1
+    buyer = ctx["buyers"][ctx["fill"] % len(ctx["buyers"])]
+    await rec.call(
+        client,
+        "fills POST /escrow/{id}/start",
+        "POST",
+        f"/escrow/{ctx['fixed_listing']}/start",
+        ok=(201, 409),
+        headers=buyer,
+        json={"quantity": 7},
+    )
+
+
+async def check_fills(client: httpx.AsyncClient, ctx: dict) -> dict:
+    # Reserved fills plus what is left must add up to the original stock: nothing oversold or lost.
+    listing = (await client.get(f"/inventory/{ctx['fixed_listing']}")).json()
+    fills = (await client.get(f"/escrow/{ctx['fixed_listing']}/fills", headers=ctx["farmer"])).json()
+    reserved = sum(fill["requested_quantity"] for fill in fills)
+    return {
+        "fills": len(fills),
+        "reserved": reserved,
+        "remaining": listing["quantity"],
+        "ok": reserved + listing["quantity"] == LISTING_QUANTITY,
+    }
+
+
+async def chat_scenario(client: httpx.AsyncClient, rec: Recorder, ctx: dict) -> None:
+    url = f"/chat/{ctx['hot_listing']}/messages"
+    await rec.call(client, "chat POST /chat/{id}/messages", "POST", url, headers=ctx["buyers"][0], json={"text": "Bei?"})
+    await rec.call(client, "chat GET /chat/{id}/messages", "GET", url)
+
+
+async def escrow_scenario(client: httpx.AsyncClient, rec: Recorder, ctx: dict) -> None:
+    listing = await _create_listing(client, ctx["farmer"])
+    buyer = ctx["buyers"][0]
+    await rec.call(client, "escrow POST /escrow/{id}/start", "POST", f"/escrow/{listing}/start", headers=buyer, json={})
+    await rec.call(client, "escrow POST /escrow/{id}/verify", "POST", f"/escrow/{listing}/verify", headers=buyer)
+    await rec.call(client, "escrow POST /escrow/{id}/release", "POST", f"/escrow/{listing}/release", headers=buyer)
+    await rec.call(client, "escrow GET /escrow/{id}", "GET", f"/escrow/{listing}")
+
+
+async def analysis_scenario(client: httpx.AsyncClient, rec: Recorder, ctx: dict) -> None:
+    await rec.call(client, "analysis POST /analysis", "POST", "/analysis", json={"image_base64": PHOTO})
+
+
+async def prescreen_scenario(client: httpx.AsyncClient, rec: Recorder, ctx: dict) -> None:
+    # Rejections never reach the model, so this measures the local pre-screen alone.
+    await rec.call(
+        client, "prescreen POST /analysis (blurry)", "POST", "/analysis", ok=(422,), json={"image_base64": BLURRY_PHOTO}
+    )
+
+
+async def offline_batch_scenario(client: httpx.AsyncClient, rec: Recorder, ctx: dict) -> None:
+    # A gateway batch of fresh SMS; the summary line carries the server-side messages/second.
+    ctx["sms"] += 1
+    messages = [
+        {"message_id": f"bench-{ctx['sms']}-{index}", "text": "Nina magunia kumi ya mahindi Molo"}
+        for index in range(OFFLINE_BATCH_SIZE)
+    ]
+    await rec.call(
+        client,
+        "offline_batch POST /analysis/offline/batch",
+        "POST",
+        "/analysis/offline/batch",
+        headers=ctx["farmer"],
+        json={"messages": messages},
+    )
+
+
+SCENARIOS: dict[str, Scenario] = {
+    "inventory": inventory_scenario,
+    "heatmap": heatmap_scenario,
+    "bids": hot_bid_scenario,
+    "fills": fills_scenario,
+    "chat": chat_scenario,
+    "escrow": escrow_scenario,
+    "analysis": analysis_scenario,
+    "prescreen": prescreen_scenario,
+    "offline_batch": offline_batch_scenario,
+}
+
+
+async def run_scenarios(base_url: str, names: list[str], duration: float, concurrency: int) -> tuple[dict, dict]:
+    recorder = Recorder()
+    checks: dict[str, dict] = {}
+    elapsed: dict[str, float] = {}
+    limits = httpx.Limits(max_connections=concurrency * 2)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        farmer = await _token(client, FARMER_EMAIL)
+        ctx = {
+            "farmer": farmer,
+            "buyers": [await _token(client, email) for email in BUYER_EMAILS],
+            "hot_listing": await _create_listing(client, farmer),
+            "fixed_listing": await _create_listing(client, farmer, "FIXED"),
+            "bid": 1000,
+            "fill": 0,
+            "sms": 0,
+        }
+        for name in names:
+            scenario = SCENARIOS[name]
+            deadline = time.perf_counter() + duration
+
+            async def worker() -> None:
+                while time.perf_counter() < deadline:
+                    await scenario(client, recorder, ctx)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            elapsed[name] = time.perf_counter() - started
+        if "fills" in names:
+            checks["fills"] = await check_fills(client, ctx)
+    return summarize(recorder, elapsed), checks
+
+
+# --- baseline comparison --------------------------------------------------------------------
+
+
+def compare(results: dict, baseline: dict, latency_threshold: float, throughput_threshold: float) -> list[str]:
+    # Flag routes whose p95 grew or throughput shrank beyond the allowed fraction.
+    regressions: list[str] = []
+    for route, base in baseline.get("routes", {}).items():
+        current = results["routes"].get(route)
+        if current is None:
+            regressions.append(f"{route}: missing from this run")
+            continue
+        if base["p95_ms"] and current["p95_ms"] > base["p95_ms"] * (1 + latency_threshold):
+            regressions.append(f"{route}: p95 {current['p95_ms']}ms vs baseline {base['p95_ms']}ms")
+        if base["throughput_rps"] and current["throughput_rps"] < base["throughput_rps"] * (1 - throughput_threshold):
+            regressions.append(
+                f"{route}: throughput {current['throughput_rps']}/s vs baseline {base['throughput_rps']}/s"
+            )
+    return regressions
+
+
+def print_table(routes: dict) -> None:
+    print(f"{'route':48} {'reqs':>7} {'err':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for route, stats in routes.items():
+        print(
+            f"{route:48} {stats['requests']:>7} {stats['errors']:>5} {stats['throughput_rps']:>8} "
+            f"{stats['p50_ms']:>8} {stats['p95_ms']:>8} {stats['p99_ms']:>8}"
+        )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench.run", description="Load-test the API hot paths")
+    parser.add_argument("--database-url", help="Defaults to a throwaway SQLite file")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated scenario names")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--model-latency", type=float, default=0.3, help="Seconds the fake Gemini sleeps")
+    parser.add_argument("--output", default="bench-results.json")
+    parser.add_argument("--baseline", help="Results file to compare against")
+    parser.add_argument("--latency-threshold", type=float, default=0.2, help="Allowed p95 growth (0.2 = 20%%)")
+    parser.add_argument("--throughput-threshold", type=float, default=0.2, help="Allowed throughput drop")
+    args = parser.parse_args(argv)
+
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(unknown)}")
+
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    base_url, stop = boot_app(database_url, args.model_latency)
+    try:
+        routes, checks = asyncio.run(run_scenarios(base_url, names, args.duration, args.concurrency))
+    finally:
+        stop()
+
+    results = {
+        "created_at": datetime.utcnow().isoformat(),
+        "database": database_url.split("://", 1)[0],
+        "python": platform.python_version(),
+        "duration": args.duration,
+        "concurrency": args.concurrency,
+        "routes": routes,
+        "checks": checks,
+    }
+    Path(args.output).write_text(json.dumps(results, indent=2))
+    print_table(routes)
+    print(f"Saved results to {args.output}")
+
+    failed = [name for name, check in checks.items() if not check["ok"]]
+    for name in failed:
+        print(f"CHECK FAILED {name}: {checks[name]}")
+    if failed:
+        return 1
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        regressions = compare(results, baseline, args.latency_threshold, args.throughput_threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+        print("No regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
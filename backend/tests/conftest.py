@@ -0,0 +1,67 @@
+import os
+import tempfile
+import uuid
+
+import pytest
+
+# Configured before the app is imported: a throwaway SQLite database, no background
+# threads, and no per-user rate limits getting in the way of back-to-back calls.
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/test.db"
+os.environ.setdefault("AUCTION_SCHEDULER", "0")
+os.environ.setdefault("MARKET_ROLLUP_WORKER", "0")
+for _name in ("ANALYSIS", "CHAT"):
+    os.environ.setdefault(f"ADMISSION_{_name}_RATE", "0")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.cli import main as cli  # noqa: E402
+from app.db import SessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+
+PASSWORD = "password123"
+FARMER = "mzee@example.com"
+BUYERS = ("wilson@example.com", "aisha@example.com", "daniel@example.com")
+
+
+@pytest.fixture(scope="session")
+def client():
+    cli(["migrate"])
+    cli(["seed"])
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def db(client):
+    with SessionLocal() as session:
+        yield session
+
+
+@pytest.fixture
+def login(client):
+    def _login(email: str = FARMER) -> dict[str, str]:
+        response = client.post("/auth/login", json={"email": email, "password": PASSWORD})
+        assert response.status_code == 200, response.text
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    return _login
+
+
+@pytest.fixture
+def create_listing(client, login):
+    def _create(**overrides) -> dict:
+        payload = {
+            "crop_name": f"Test crop {uuid.uuid4().hex[:8]}",
+            "quantity": 100,
+            "quality_score": 80,
+            "base_price": 40,
+            "current_bid": 40,
+            "location": {"name": "Molo", "lat": -0.25, "lng": 35.73},
+            "listing_type": "BIDDING",
+            **overrides,
+        }
+        response = client.post("/inventory", json=payload, headers=login())
+        assert response.status_code == 201, response.text
+        return response.json()
+
+    return _create
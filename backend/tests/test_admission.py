@@ -0,0 +1,17 @@
+from fastapi.testclient import TestClient
+from starlette.responses import PlainTextResponse
+
+from app.core.admission import AdmissionMiddleware, AdmissionPolicy
+
+
+async def _ok(scope, receive, send):
+    await PlainTextResponse("ok")(scope, receive, send)
+
+
+def test_chat_reads_are_not_rate_limited():
+    policy = AdmissionPolicy(concurrency=4, queue=4, max_wait=1.0, rate=0.01, burst=2, rate_methods=frozenset({"POST"}))
+    client = TestClient(AdmissionMiddleware(_ok, {"/chat": policy}))
+
+    # A dashboard polling dozens of threads never touches the send budget.
+    assert all(client.get(f"/chat/{index}/messages").status_code == 200 for index in range(50))
+    assert [client.post("/chat/1/messages").status_code for _ in range(3)] == [200, 200, 429]
@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+
+from app.models import Escrow, EscrowStatus, Inventory, InventoryStatus, ListingType
+from app.services.auctions import settle_due_auctions
+from conftest import BUYERS
+
+LATER = (datetime.utcnow() + timedelta(hours=1)).isoformat()
+
+
+def _set(db, inventory_id: str, **values) -> None:
+    db.query(Inventory).filter(Inventory.id == inventory_id).update(values)
+    db.commit()
+
+
+def test_sold_auction_cannot_be_reopened(client, login, create_listing, db):
+    listing = create_listing()
+    _set(db, listing["id"], status=InventoryStatus.SOLD, settled_at=datetime.utcnow())
+
+    response = client.patch(f"/inventory/{listing['id']}", json={"ends_at": LATER}, headers=login())
+    assert response.status_code == 409
+    db.expire_all()
+    assert db.get(Inventory, listing["id"]).status == InventoryStatus.SOLD
+
+
+def test_fixed_lot_rejects_end_time(client, login, create_listing):
+    listing = create_listing(listing_type="FIXED")
+    response = client.patch(f"/inventory/{listing['id']}", json={"ends_at": LATER}, headers=login())
+    assert response.status_code == 400
+
+
+def test_lot_with_escrow_rejects_end_time(client, login, create_listing, db):
+    listing = create_listing()
+    buyer_id = client.get("/auth/me", headers=login(BUYERS[0])).json()["id"]
+    db.add(Escrow(inventory_id=listing["id"], buyer_id=buyer_id, amount=4000, status=EscrowStatus.PENDING))
+    db.commit()
+
+    response = client.patch(f"/inventory/{listing['id']}", json={"ends_at": LATER}, headers=login())
+    assert response.status_code == 409
+
+
+def test_settlement_only_touches_open_auctions(client, create_listing, db):
+    past = datetime.utcnow() - timedelta(minutes=1)
+    fixed = create_listing(listing_type="FIXED")
+    sold = create_listing()
+    open_auction = create_listing()
+    # Rows as the old PATCH could leave them: an end time on a reserved fixed lot and a sold lot.
+    _set(db, fixed["id"], ends_at=past, quantity=0, status=InventoryStatus.NEGOTIATING)
+    _set(db, sold["id"], ends_at=past, status=InventoryStatus.SOLD)
+    _set(db, open_auction["id"], ends_at=past)
+
+    settle_due_auctions(db)
+    db.expire_all()
+    assert db.get(Inventory, fixed["id"]).status == InventoryStatus.NEGOTIATING
+    assert db.get(Inventory, fixed["id"]).listing_type == ListingType.FIXED
+    assert db.get(Inventory, sold["id"]).status == InventoryStatus.SOLD
+    assert db.get(Inventory, sold["id"]).settled_at is None
+    settled = db.get(Inventory, open_auction["id"])
+    assert (settled.status, settled.settled_at is not None) == (InventoryStatus.AVAILABLE, True)
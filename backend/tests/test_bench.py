@@ -0,0 +1,84 @@
+import asyncio
+
+import httpx
+
+from app.main import app
+from bench.run import (
+    BUYER_EMAILS,
+    FARMER_EMAIL,
+    LISTING_QUANTITY,
+    Recorder,
+    _create_listing,
+    _token,
+    check_fills,
+    compare,
+    fills_scenario,
+    summarize,
+)
+
+
+def test_summary_reports_percentiles_and_throughput():
+    recorder = Recorder()
+    route = "bids POST /inventory/{id}/bid"
+    recorder.latencies[route] = [index / 1000 for index in range(100, 0, -1)]
+    recorder.statuses[route].update({200: 97, 409: 3})
+    recorder.errors[route] = 1
+
+    assert summarize(recorder, {"bids": 4.0}) == {
+        route: {
+            "requests": 100,
+            "errors": 1,
+            "statuses": {"200": 97, "409": 3},
+            "throughput_rps": 25.0,
+            "p50_ms": 50.0,
+            "p95_ms": 95.0,
+            "p99_ms": 99.0,
+        }
+    }
+
+
+def test_compare_flags_slower_or_missing_routes():
+    def stats(p95_ms: float, throughput_rps: float) -> dict:
+        return {"p95_ms": p95_ms, "throughput_rps": throughput_rps}
+
+    baseline = {"routes": {"a": stats(10, 100), "b": stats(10, 100), "c": stats(10, 100), "d": stats(10, 100)}}
+    results = {"routes": {"a": stats(11.9, 81), "b": stats(12.5, 100), "c": stats(10, 70)}}
+
+    assert compare(results, baseline, latency_threshold=0.2, throughput_threshold=0.2) == [
+        "b: p95 12.5ms vs baseline 10ms",
+        "c: throughput 70/s vs baseline 100/s",
+        "d: missing from this run",
+    ]
+
+
+def test_fills_scenario_checks_stock_adds_up(client):
+    async def run() -> tuple[Recorder, dict]:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as bench_client:
+            farmer = await _token(bench_client, FARMER_EMAIL)
+            ctx = {
+                "farmer": farmer,
+                "buyers": [await _token(bench_client, email) for email in BUYER_EMAILS],
+                "fixed_listing": await _create_listing(bench_client, farmer, "FIXED"),
+                "fill": 0,
+            }
+            recorder = Recorder()
+
+            async def worker() -> None:
+                # Enough 7 kg slices to run the lot dry, and a few more.
+                while ctx["fill"] < LISTING_QUANTITY // 7 + 5:
+                    await fills_scenario(bench_client, recorder, ctx)
+
+            await asyncio.gather(*(worker() for _ in range(4)))
+            return recorder, await check_fills(bench_client, ctx)
+
+    recorder, check = asyncio.run(run())
+
+    assert dict(recorder.statuses["fills POST /escrow/{id}/start"]) == {201: LISTING_QUANTITY // 7, 409: 5}
+    assert recorder.errors == {}
+    assert check == {
+        "fills": LISTING_QUANTITY // 7,
+        "reserved": LISTING_QUANTITY // 7 * 7,
+        "remaining": LISTING_QUANTITY % 7,
+        "ok": True,
+    }
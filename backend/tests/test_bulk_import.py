@@ -0,0 +1,124 @@
+import asyncio
+import uuid
+
+from app.api import inventory as inventory_api
+from app.models import Inventory
+from app.services import bulk_import
+from app.services.bulk_import import iter_records
+
+CSV_HEADER = (
+    "crop_name,quantity,quality_score,base_price,current_bid,location_name,location_lat,location_lng,listing_type\n"
+)
+
+
+async def _lines(text: str):
+    for line in text.split("\n"):
+        yield line
+
+
+def _records(text: str, fmt: str = "csv") -> list:
+    async def collect():
+        return [record async for record in iter_records(_lines(text), fmt)]
+
+    return asyncio.run(collect())
+
+
+def _import(client, login, body: bytes) -> dict:
+    response = client.post("/inventory/import", content=body, headers={**login(), "Content-Type": "text/csv"})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_quoted_cells_keep_newlines_and_commas():
+    text = (
+        "crop_name,quantity,notes\n"
+        '"Maize\nwhite",10,"dry, sorted"\n'
+        'Beans,5,"said ""grade A"""\n'
+    )
+    assert _records(text) == [
+        (2, {"crop_name": "Maize\nwhite", "quantity": "10", "notes": "dry, sorted"}),
+        (4, {"crop_name": "Beans", "quantity": "5", "notes": 'said "grade A"'}),
+    ]
+
+
+def test_errors_report_physical_lines():
+    text = 'crop_name,quantity\n\nMaize\n"Sorghum\n\nred",3\nBeans,1\n"Peas,2'
+    assert _records(text) == [
+        (3, "Expected 2 columns, got 1"),
+        (4, {"crop_name": "Sorghum\n\nred", "quantity": "3"}),
+        (7, {"crop_name": "Beans", "quantity": "1"}),
+        (8, "Unterminated quoted field"),
+    ]
+
+
+def test_import_stores_multiline_crop_name(client, login, db):
+    body = (
+        "crop_name,quantity,quality_score,base_price,current_bid,location_name,location_lat,location_lng,listing_type\n"
+        '"Maize\nwhite, dried",20,80,40,40,Molo,-0.25,35.73,FIXED\n'
+    )
+    response = client.post(
+        "/inventory/import", content=body, headers={**login(), "Content-Type": "text/csv"}
+    )
+    assert response.status_code == 200, response.text
+    assert response.json()["imported"] == 1
+    assert db.query(Inventory).filter(Inventory.crop_name == "Maize\nwhite, dried").count() == 1
+
+
+def test_stray_quote_in_a_bare_cell_is_text():
+    text = 'crop_name,quantity\nMaize 5" cobs,10\nBeans,5\n'
+    assert _records(text) == [
+        (2, {"crop_name": 'Maize 5" cobs', "quantity": "10"}),
+        (3, {"crop_name": "Beans", "quantity": "5"}),
+    ]
+
+
+def test_unterminated_cell_gives_up_after_max_lines(monkeypatch):
+    monkeypatch.setattr(bulk_import, "MAX_RECORD_LINES", 3)
+    text = 'crop_name,quantity\n"Maize,10\nBeans,5\nPeas,1\nRice,2\nKale,4\n'
+    assert _records(text) == [
+        (2, "Unterminated quoted field"),
+        (5, {"crop_name": "Rice", "quantity": "2"}),
+        (6, {"crop_name": "Kale", "quantity": "4"}),
+    ]
+
+
+def test_ndjson_rows_report_their_own_errors():
+    text = '{"crop_name": "Maize"}\n\n[1, 2]\n{not json\n'
+    assert _records(text, "ndjson") == [
+        (1, {"crop_name": "Maize"}),
+        (3, "Expected a JSON object per line"),
+        (4, "Invalid JSON: Expecting property name enclosed in double quotes"),
+    ]
+
+
+def test_import_validates_rows_and_commits_in_chunks(client, login, db, monkeypatch):
+    monkeypatch.setattr(inventory_api, "IMPORT_CHUNK_SIZE", 2)
+    crop = f"Import {uuid.uuid4().hex[:8]}"
+    body = CSV_HEADER + "".join(
+        [
+            f"{crop},20,80,40,40,Molo,-0.25,35.73,FIXED\n",
+            f"{crop},lots,80,40,40,Molo,-0.25,35.73,FIXED\n",
+            f"{crop},5,80,40,40,Molo,-0.25,35.73,BIDDING\n",
+            f"{crop},7,80,40\n",
+        ]
+    )
+    result = _import(client, login, body.encode())
+
+    assert (result["received"], result["imported"], result["failed"]) == (4, 2, 2)
+    assert [error["row"] for error in result["errors"]] == [3, 5]
+    assert result["errors"][0]["error"].startswith("quantity: ")
+    assert result["errors"][1]["error"] == "Expected 9 columns, got 4"
+    assert db.query(Inventory).filter(Inventory.crop_name == crop).count() == 2
+
+
+def test_non_utf8_line_keeps_the_committed_rows(client, login, db, monkeypatch):
+    monkeypatch.setattr(inventory_api, "IMPORT_CHUNK_SIZE", 2)
+    crop = f"Import {uuid.uuid4().hex[:8]}"
+    row = f"{crop},20,80,40,40,Molo,-0.25,35.73,FIXED\n".encode()
+    body = CSV_HEADER.encode() + row * 3 + "Café,1,80,40,40,Molo,-0.25,35.73,FIXED\n".encode("latin-1") + row
+
+    result = _import(client, login, body)
+
+    assert (result["received"], result["imported"], result["failed"]) == (4, 3, 1)
+    assert result["errors"] == [{"row": 5, "error": "Line 5 is not valid UTF-8; the rest of the upload was not read"}]
+    assert db.query(Inventory).filter(Inventory.crop_name == crop).count() == 3
@@ -0,0 +1,41 @@
+from sqlalchemy import func, select
+
+from app.db import SessionLocal
+from app.models import InventoryChange
+from app.services.changes import log_changes
+
+
+def _seq(db, inventory_id: str) -> int:
+    return db.scalar(select(func.max(InventoryChange.seq)).where(InventoryChange.inventory_id == inventory_id))
+
+
+def test_slow_write_logs_behind_a_later_commit(client, create_listing, db):
+    slow, fast = create_listing(), create_listing()
+    with SessionLocal() as first, SessionLocal() as second:
+        # The slow write starts first but commits last; its entry must land after the fast one.
+        log_changes(first, slow["id"])
+        log_changes(second, fast["id"])
+        second.commit()
+        first.commit()
+    assert _seq(db, slow["id"]) > _seq(db, fast["id"])
+
+
+def test_rolled_back_write_logs_nothing(client, create_listing, db):
+    listing = create_listing()
+    before = _seq(db, listing["id"])
+    with SessionLocal() as session:
+        log_changes(session, listing["id"])
+        session.rollback()
+        session.commit()
+    assert _seq(db, listing["id"]) == before
+
+
+def test_feed_points_at_inline_images(client, create_listing, db):
+    since = db.scalar(select(func.max(InventoryChange.seq)))
+    listing = create_listing(image_url="data:image/png;base64," + "A" * 4096)
+
+    payload = client.get(f"/inventory/changes?since={since}", params={"format": "json"}).json()
+    # Entries younger than the settle window hold the cursor back but are already returned.
+    rows = [dict(zip(payload["columns"], row)) for row in payload["upserts"]]
+    row = next(row for row in rows if row["id"] == listing["id"])
+    assert row["image_url"] == f"/inventory/{listing['id']}/image"
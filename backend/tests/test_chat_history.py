@@ -0,0 +1,83 @@
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from app.models import ArchivedMessage, Inventory, InventoryStatus, Message
+from app.services.chat_history import archive_closed_threads
+
+
+def _post(db, listing: dict, farmer_id: str, timestamps: list[datetime]) -> list[tuple[datetime, str]]:
+    # Direct inserts, so several messages can share one timestamp.
+    keys = []
+    for timestamp in timestamps:
+        message = Message(
+            id=str(uuid.uuid4()), inventory_id=listing["id"], sender_id=farmer_id, text="x", timestamp=timestamp
+        )
+        db.add(message)
+        keys.append((timestamp, message.id))
+    db.commit()
+    return keys
+
+
+def _mark_sold(db, listing: dict) -> None:
+    db.query(Inventory).filter(Inventory.id == listing["id"]).update({"status": InventoryStatus.SOLD})
+    db.commit()
+
+
+def _count(db, model, inventory_id: str) -> int:
+    return db.scalar(select(func.count()).select_from(model).where(model.inventory_id == inventory_id))
+
+
+def _walk(client, inventory_id: str, limit: int) -> list[tuple[datetime, str]]:
+    # Follows `before` from the newest page back to the start of the thread.
+    seen: list[tuple[datetime, str]] = []
+    before = None
+    while True:
+        params = {"limit": limit, **({"before": before} if before else {})}
+        page = client.get(f"/chat/{inventory_id}/messages", params=params).json()
+        if not page:
+            return seen
+        seen[:0] = [(datetime.fromisoformat(m["timestamp"]), m["id"]) for m in page]
+        before = page[0]["id"]
+
+
+def test_pages_cross_from_live_into_archive_without_gaps(client, login, create_listing, db):
+    listing = create_listing()
+    farmer_id = listing["farmer_id"]
+    old = datetime.utcnow() - timedelta(days=40)
+    archived = _post(db, listing, farmer_id, [old, old + timedelta(seconds=1)] + [old + timedelta(seconds=2)] * 3)
+    _mark_sold(db, listing)
+    archive_closed_threads(db, older_than_days=30)
+    assert (_count(db, Message, listing["id"]), _count(db, ArchivedMessage, listing["id"])) == (0, 5)
+
+    now = datetime.utcnow().replace(microsecond=0)
+    live = _post(db, listing, farmer_id, [now] * 3 + [now + timedelta(seconds=1)] * 2)
+    expected = sorted(archived + live)
+
+    for limit in (1, 2, 3, 4, 7, 50):
+        walked = _walk(client, listing["id"], limit)
+        assert walked == expected, f"limit={limit}"
+
+
+def test_unknown_cursor_is_rejected(client, create_listing):
+    listing = create_listing()
+    response = client.get(f"/chat/{listing['id']}/messages", params={"before": "missing"})
+    assert response.status_code == 400
+
+
+def test_archive_only_moves_quiet_threads_of_sold_lots(client, create_listing, db):
+    quiet_sold, busy_sold, quiet_open = create_listing(), create_listing(), create_listing()
+    old = datetime.utcnow() - timedelta(days=40)
+    for listing in (quiet_sold, busy_sold, quiet_open):
+        _post(db, listing, listing["farmer_id"], [old, old + timedelta(minutes=1)])
+    _post(db, busy_sold, busy_sold["farmer_id"], [datetime.utcnow()])
+    _mark_sold(db, quiet_sold)
+    _mark_sold(db, busy_sold)
+
+    assert archive_closed_threads(db, older_than_days=30) >= 2
+    assert (_count(db, Message, quiet_sold["id"]), _count(db, ArchivedMessage, quiet_sold["id"])) == (0, 2)
+    assert (_count(db, Message, busy_sold["id"]), _count(db, ArchivedMessage, busy_sold["id"])) == (3, 0)
+    assert (_count(db, Message, quiet_open["id"]), _count(db, ArchivedMessage, quiet_open["id"])) == (2, 0)
+    # Nothing left to move.
+    assert archive_closed_threads(db, older_than_days=30) == 0
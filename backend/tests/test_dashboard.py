@@ -0,0 +1,33 @@
+from app.db import SessionLocal
+from app.models import User
+from app.services.dashboard import bump_dashboards
+from conftest import FARMER
+
+
+def _version(email: str) -> int:
+    with SessionLocal() as session:
+        return session.query(User.dashboard_version).filter(User.email == email).scalar()
+
+
+def test_bumps_apply_after_commit_only(client, db):
+    farmer_id = db.query(User.id).filter(User.email == FARMER).scalar()
+    before = _version(FARMER)
+
+    bump_dashboards(db, farmer_id)
+    db.rollback()
+    assert _version(FARMER) == before
+
+    bump_dashboards(db, farmer_id)
+    assert _version(FARMER) == before
+    db.commit()
+    assert _version(FARMER) == before + 1
+
+
+def test_writes_bump_the_dashboard(client, login, create_listing):
+    headers = login()
+    first = client.get("/dashboard/farmer", headers=headers)
+    assert first.status_code == 200
+    create_listing()
+    second = client.get("/dashboard/farmer", headers={**headers, "If-None-Match": first.headers["etag"]})
+    assert second.status_code == 200
+    assert second.headers["etag"] != first.headers["etag"]
@@ -0,0 +1,126 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from app.db import SessionLocal
+from app.models import Escrow, EscrowStatus, Inventory
+from app.services.auctions import settle_due_auctions
+from app.services.escrow import ESCROW_FILL_TTL_MINUTES, reserve_fill
+from conftest import BUYERS
+
+
+def _won_auction(client, login, create_listing, db) -> dict:
+    listing = create_listing(quantity=10)
+    for buyer, amount in zip(BUYERS[:2], (50, 60)):
+        response = client.post(f"/inventory/{listing['id']}/bid", json={"amount": amount}, headers=login(buyer))
+        assert response.status_code == 200, response.text
+    db.query(Inventory).filter(Inventory.id == listing["id"]).update(
+        {"ends_at": datetime.utcnow() - timedelta(seconds=1)}
+    )
+    db.commit()
+    settle_due_auctions(db)
+    return listing
+
+
+def test_losing_buyer_cannot_take_over_won_escrow(client, login, create_listing, db):
+    listing = _won_auction(client, login, create_listing, db)
+    winner_escrow = db.query(Escrow).filter(Escrow.inventory_id == listing["id"]).one()
+
+    response = client.post(f"/escrow/{listing['id']}/start", json={"amount": 1}, headers=login(BUYERS[0]))
+    assert response.status_code == 409
+    db.refresh(winner_escrow)
+    assert winner_escrow.amount == 600
+    assert winner_escrow.buyer_id == client.get("/auth/me", headers=login(BUYERS[1])).json()["id"]
+
+
+def test_winner_starts_at_the_winning_bid(client, login, create_listing, db):
+    listing = _won_auction(client, login, create_listing, db)
+    winner = login(BUYERS[1])
+
+    assert client.post(f"/escrow/{listing['id']}/start", json={"amount": 1}, headers=winner).status_code == 400
+    response = client.post(f"/escrow/{listing['id']}/start", json={}, headers=winner)
+    assert response.status_code == 201, response.text
+    assert response.json()["amount"] == 600
+
+
+def _buyer_ids(client, login) -> list[str]:
+    return [client.get("/auth/me", headers=login(buyer)).json()["id"] for buyer in BUYERS]
+
+
+def test_concurrent_fills_never_oversell(client, login, create_listing, db):
+    listing = create_listing(listing_type="FIXED", quantity=10)
+    buyer_ids = _buyer_ids(client, login)
+    start = threading.Barrier(8)
+
+    def buy(n: int) -> bool:
+        with SessionLocal() as session:
+            start.wait()
+            escrow = reserve_fill(session, listing["id"], buyer_ids[n % len(buyer_ids)], 3, None)
+            if escrow is None:
+                session.rollback()
+                return False
+            session.commit()
+            return True
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(buy, range(8)))
+
+    assert results.count(True) == 3
+    item = db.get(Inventory, listing["id"])
+    assert item.quantity == 1
+    reserved = db.query(Escrow).filter(Escrow.inventory_id == listing["id"]).all()
+    assert sum(escrow.requested_quantity for escrow in reserved) == 9
+
+
+def test_cancelled_fill_returns_its_quantity(client, login, create_listing, db):
+    listing = create_listing(listing_type="FIXED", quantity=10)
+    buyer = login(BUYERS[0])
+    fill = client.post(f"/escrow/{listing['id']}/start", json={"quantity": 10}, headers=buyer).json()
+    assert client.get(f"/inventory/{listing['id']}").json()["status"] == "NEGOTIATING"
+    cancel = f"/escrow/{listing['id']}/cancel?escrow_id={fill['id']}"
+
+    assert client.post(cancel, headers=login(BUYERS[1])).status_code == 403
+    response = client.post(cancel, headers=buyer)
+    assert response.status_code == 200, response.text
+    assert response.json()["status"] == "CANCELLED"
+    lot = client.get(f"/inventory/{listing['id']}").json()
+    assert (lot["quantity"], lot["status"]) == (10, "AVAILABLE")
+
+    # Cancelling twice, or paying a cancelled fill, changes nothing.
+    assert client.post(cancel, headers=buyer).status_code == 409
+    release = client.post(f"/escrow/{listing['id']}/release?escrow_id={fill['id']}", headers=buyer)
+    assert release.status_code == 409
+    assert client.get(f"/inventory/{listing['id']}").json()["quantity"] == 10
+
+
+def test_stale_fills_expire_before_a_new_fill(client, login, create_listing, db):
+    listing = create_listing(listing_type="FIXED", quantity=10)
+    start = f"/escrow/{listing['id']}/start"
+    stale = client.post(start, json={"quantity": 10}, headers=login(BUYERS[0])).json()
+    assert client.post(start, json={"quantity": 4}, headers=login(BUYERS[1])).status_code == 409
+
+    db.query(Escrow).filter(Escrow.id == stale["id"]).update(
+        {"created_at": datetime.utcnow() - timedelta(minutes=ESCROW_FILL_TTL_MINUTES + 1)}
+    )
+    db.commit()
+    response = client.post(start, json={"quantity": 4}, headers=login(BUYERS[1]))
+    assert response.status_code == 201, response.text
+    db.expire_all()
+    assert db.get(Escrow, stale["id"]).status == EscrowStatus.CANCELLED
+    assert db.get(Inventory, listing["id"]).quantity == 6
+
+
+def test_sold_out_lot_conflicts_without_a_quantity(client, login, create_listing, db):
+    fixed = create_listing(listing_type="FIXED", quantity=5)
+    start = f"/escrow/{fixed['id']}/start"
+    assert client.post(start, json={}, headers=login(BUYERS[0])).status_code == 201
+
+    response = client.post(start, json={}, headers=login(BUYERS[1]))
+    assert response.status_code == 409, response.text
+    assert response.json()["detail"] == "Requested quantity exceeds available stock"
+
+    bidding = create_listing()
+    db.query(Inventory).filter(Inventory.id == bidding["id"]).update({"quantity": 0})
+    db.commit()
+    response = client.post(f"/escrow/{bidding['id']}/start", json={}, headers=login(BUYERS[1]))
+    assert response.status_code == 409, response.text
@@ -0,0 +1,23 @@
+import anyio
+
+from app.api.export import _run_export
+
+
+def test_abandoned_export_closes_cursor():
+    closed = []
+
+    def batches():
+        try:
+            for index in range(10):
+                yield f"{index}\n"
+        finally:
+            closed.append(True)
+
+    async def read_one():
+        stream = _run_export(batches())
+        assert await stream.__anext__() == "0\n"
+        # What Starlette does when the client goes away mid-stream.
+        await stream.aclose()
+
+    anyio.run(read_one)
+    assert closed == [True]
@@ -0,0 +1,93 @@
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import Session
+
+from app.migrations import migrate
+from app.models import Conversation, ConversationMember, Escrow, Inventory, InventoryChange, Message, User
+from app.seed import generate_synthetic_data
+from conftest import BUYERS, FARMER
+
+SIZES = {"farmers": 4, "buyers": 6, "listings": 40, "messages": 150, "batch_size": 16}
+
+
+def _generate(db: Session, seed: int) -> dict[str, int]:
+    return generate_synthetic_data(db, **SIZES, seed=seed)
+
+
+def _generated(seed: int):
+    farmers = select(User.id).where(User.email.endswith(f".{seed}@synthetic.shamba"))
+    return select(Inventory.id).where(Inventory.farmer_id.in_(farmers))
+
+
+def _snapshot(db: Session, seed: int) -> dict[str, list]:
+    lots = select(Inventory.id, Inventory.crop_name, Inventory.quantity, Inventory.status, Inventory.highest_bidder_id)
+    fills = select(Escrow.id, Escrow.amount, Escrow.status)
+    messages = select(Message.id, Message.inventory_id, Message.sender_id)
+    return {
+        "lots": db.execute(lots.where(Inventory.id.in_(_generated(seed))).order_by(Inventory.id)).all(),
+        "fills": db.execute(fills.where(Escrow.inventory_id.in_(_generated(seed))).order_by(Escrow.id)).all(),
+        "messages": db.execute(messages.where(Message.inventory_id.in_(_generated(seed))).order_by(Message.id)).all(),
+    }
+
+
+def test_same_seed_generates_the_same_data(tmp_path):
+    snapshots = []
+    for name in ("first", "second"):
+        engine = create_engine(f"sqlite:///{tmp_path / name}.db")
+        migrate(engine)
+        with Session(engine) as db:
+            counts = _generate(db, seed=7)
+            snapshots.append((counts, _snapshot(db, seed=7)))
+
+    assert snapshots[0] == snapshots[1]
+    counts, rows = snapshots[0]
+    assert (counts["users"], counts["inventory"], counts["messages"]) == (10, 40, 150)
+    assert (len(rows["lots"]), len(rows["fills"]), len(rows["messages"])) == (40, counts["escrow"], 150)
+
+
+def test_generation_leaves_real_threads_alone(client, login, create_listing, db):
+    listing = create_listing()
+    client.post(f"/chat/{listing['id']}/messages", json={"text": "Still available?"}, headers=login(BUYERS[0]))
+    real_members = db.execute(
+        select(ConversationMember.user_id, ConversationMember.read_count, ConversationMember.last_read_at)
+        .where(ConversationMember.inventory_id == listing["id"])
+        .order_by(ConversationMember.user_id)
+    ).all()
+    # The farmer hasn't opened the thread yet.
+    assert sorted(read_count for _, read_count, _ in real_members) == [0, 1]
+    conversations = db.scalar(select(func.count()).select_from(Conversation))
+    changes = db.scalar(select(func.count()).where(InventoryChange.inventory_id == listing["id"]))
+
+    _generate(db, seed=31)
+
+    db.expire_all()
+    assert (
+        db.execute(
+            select(ConversationMember.user_id, ConversationMember.read_count, ConversationMember.last_read_at)
+            .where(ConversationMember.inventory_id == listing["id"])
+            .order_by(ConversationMember.user_id)
+        ).all()
+        == real_members
+    )
+    assert db.scalar(select(func.count()).where(InventoryChange.inventory_id == listing["id"])) == changes
+    inbox = client.get("/chat/inbox", headers=login(FARMER)).json()
+    assert next(thread for thread in inbox if thread["inventory_id"] == listing["id"])["unread_count"] == 1
+
+    # Every generated thread got a summary with its farmer in it, and every generated listing a feed entry.
+    generated = _generated(seed=31)
+    threads = db.scalar(
+        select(func.count(func.distinct(Message.inventory_id))).where(Message.inventory_id.in_(generated))
+    )
+    assert db.scalar(select(func.count()).select_from(Conversation)) == conversations + threads
+    farmers_in = (
+        select(func.count())
+        .select_from(Conversation)
+        .join(Inventory, Inventory.id == Conversation.inventory_id)
+        .join(
+            ConversationMember,
+            (ConversationMember.inventory_id == Conversation.inventory_id)
+            & (ConversationMember.user_id == Inventory.farmer_id),
+        )
+        .where(Conversation.inventory_id.in_(generated))
+    )
+    assert db.scalar(farmers_in) == threads
+    assert db.scalar(select(func.count()).where(InventoryChange.inventory_id.in_(generated))) == 40
@@ -0,0 +1,21 @@
+from conftest import BUYERS
+
+
+def _conversation(client, headers, inventory_id):
+    inbox = client.get("/chat/inbox", headers=headers).json()
+    return next(c for c in inbox if c["inventory_id"] == inventory_id)
+
+
+def test_inbox_tracks_unread_until_marked_read(client, login, create_listing):
+    listing = create_listing()
+    farmer, buyer = login(), login(BUYERS[0])
+    for text in ("Is it dry?", "Can you deliver?"):
+        response = client.post(f"/chat/{listing['id']}/messages", json={"text": text}, headers=buyer)
+        assert response.status_code == 201, response.text
+
+    conversation = _conversation(client, farmer, listing["id"])
+    assert (conversation["message_count"], conversation["unread_count"]) == (2, 2)
+
+    assert client.post(f"/chat/{listing['id']}/read", headers=farmer).status_code == 204
+    conversation = _conversation(client, farmer, listing["id"])
+    assert (conversation["message_count"], conversation["unread_count"]) == (2, 0)
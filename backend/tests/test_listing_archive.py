@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from app.models import (
+    ArchivedEscrow,
+    ArchivedInventory,
+    ArchivedMessage,
+    ChangeOp,
+    Conversation,
+    Escrow,
+    Inventory,
+    InventoryChange,
+    Message,
+)
+from app.services.listing_archive import archive_sold_listings
+from conftest import BUYERS
+
+
+def _sold_listing(client, login, create_listing, db) -> dict:
+    listing = create_listing(quantity=20)
+    buyer, farmer = login(BUYERS[0]), login()
+    for text in ("Bei gani?", "Nitachukua yote"):
+        assert client.post(f"/chat/{listing['id']}/messages", json={"text": text}, headers=buyer).status_code == 201
+    assert client.post(f"/escrow/{listing['id']}/start", json={}, headers=buyer).status_code == 201
+    assert client.post(f"/escrow/{listing['id']}/release", headers=farmer).status_code == 200
+    # Age the sale past the retention window.
+    db.query(Inventory).filter(Inventory.id == listing["id"]).update(
+        {"sold_at": datetime.utcnow() - timedelta(days=31)}
+    )
+    db.commit()
+    return listing
+
+
+def _count(db, model, inventory_id: str) -> int:
+    column = model.id if model in (Inventory, ArchivedInventory) else model.inventory_id
+    return db.scalar(select(func.count()).select_from(model).where(column == inventory_id))
+
+
+def test_archived_lot_still_resolves(client, login, create_listing, db):
+    listing = _sold_listing(client, login, create_listing, db)
+    assert archive_sold_listings(db, older_than_days=30) >= 1
+
+    lot = client.get(f"/inventory/{listing['id']}")
+    assert lot.status_code == 200
+    assert (lot.json()["status"], lot.json()["crop_name"]) == ("SOLD", listing["crop_name"])
+    escrow = client.get(f"/escrow/{listing['id']}")
+    assert escrow.status_code == 200
+    assert escrow.json()["status"] == "RELEASED"
+    fills = client.get(f"/escrow/{listing['id']}/fills", headers=login(BUYERS[0]))
+    assert [fill["id"] for fill in fills.json()] == [escrow.json()["id"]]
+    messages = client.get(f"/chat/{listing['id']}/messages")
+    assert [message["text"] for message in messages.json()] == ["Bei gani?", "Nitachukua yote"]
+
+
+def test_archive_moves_rows_out_of_the_live_tables(client, login, create_listing, db):
+    listing = _sold_listing(client, login, create_listing, db)
+    archive_sold_listings(db, older_than_days=30)
+
+    for model in (Inventory, Escrow, Message, Conversation):
+        assert _count(db, model, listing["id"]) == 0, model.__name__
+    for model in (ArchivedInventory, ArchivedEscrow):
+        assert _count(db, model, listing["id"]) == 1, model.__name__
+    assert _count(db, ArchivedMessage, listing["id"]) == 2
+    # Delta sync clients drop the lot.
+    latest = db.scalars(
+        select(InventoryChange.op)
+        .where(InventoryChange.inventory_id == listing["id"])
+        .order_by(InventoryChange.seq.desc())
+        .limit(1)
+    ).one()
+    assert latest == ChangeOp.DELETE
+
+
+def test_second_run_is_a_no_op(client, login, create_listing, db):
+    listing = _sold_listing(client, login, create_listing, db)
+    archive_sold_listings(db, older_than_days=30)
+    archive_models = (ArchivedInventory, ArchivedEscrow, ArchivedMessage)
+    archived = [_count(db, model, listing["id"]) for model in archive_models]
+
+    assert archive_sold_listings(db, older_than_days=30) == 0
+    assert [_count(db, model, listing["id"]) for model in archive_models] == archived
+
+
+def test_recent_sales_stay_live(client, login, create_listing, db):
+    listing = _sold_listing(client, login, create_listing, db)
+    db.query(Inventory).filter(Inventory.id == listing["id"]).update({"sold_at": datetime.utcnow()})
+    db.commit()
+
+    archive_sold_listings(db, older_than_days=30)
+    assert _count(db, Inventory, listing["id"]) == 1
+    assert _count(db, ArchivedInventory, listing["id"]) == 0
@@ -0,0 +1,53 @@
+import base64
+import copy
+import itertools
+
+from app.core.cache import InMemoryRemoteTier, ObjectCache, TTLCache
+from app.services.listings import listing_cache
+
+
+_names = itertools.count()
+
+
+def _cache(remote=None) -> ObjectCache:
+    return ObjectCache(f"test{next(_names)}", maxsize=10, ttl=60, remote_ttl=60, remote=remote)
+
+
+def test_fill_after_invalidation_is_dropped():
+    remote = InMemoryRemoteTier()
+    cache = _cache(remote)
+    token = cache.begin_fill("lot")
+    cache.invalidate("lot")  # a writer commits while the reader is still on its query
+    cache.fill("lot", {"bid": 40}, token)
+    assert cache.get("lot") is None
+
+    token = cache.begin_fill("lot")
+    cache.fill("lot", {"bid": 45}, token)
+    assert cache.get("lot") == {"bid": 45}
+
+
+def test_remote_fill_checks_version_across_workers():
+    remote = InMemoryRemoteTier()
+    reader = _cache(remote)
+    # Another worker: same shared tier, its own local tier.
+    writer = copy.copy(reader)
+    writer.local = TTLCache(10, 60)
+    token = reader.begin_fill("lot")
+    writer.invalidate("lot")
+    reader.fill("lot", {"bid": 40}, token)
+    assert remote.get(reader._key("lot")) is None
+
+
+def test_cached_listing_links_image(client, create_listing):
+    photo = base64.b64encode(b"\xff\xd8\xff\xe0fake-jpeg").decode()
+    listing = create_listing(image_url=f"data:image/jpeg;base64,{photo}")
+    assert listing["image_url"] == f"/inventory/{listing['id']}/image"
+
+    listing_cache.invalidate(listing["id"])
+    assert client.get(f"/inventory/{listing['id']}").json()["image_url"] == listing["image_url"]
+    assert "data:" not in str(listing_cache.get(listing["id"]))
+
+    image = client.get(listing["image_url"])
+    assert image.status_code == 200
+    assert image.headers["content-type"] == "image/jpeg"
+    assert image.content == b"\xff\xd8\xff\xe0fake-jpeg"
@@ -0,0 +1,128 @@
+from datetime import datetime, timedelta
+
+from app.core.profiler import query_budget
+from app.models import PriceEvent, PriceKind, PriceRollup
+from app.services.market import ALL, fill_medians, roll_up_prices
+from conftest import BUYERS
+
+
+def _drain(db) -> None:
+    while roll_up_prices(db):
+        pass
+
+
+def test_bids_roll_up_after_commit_without_volume(client, login, create_listing, db):
+    listing = create_listing(quantity=500)
+    for buyer, amount in zip(BUYERS, (41, 45, 52)):
+        response = client.post(f"/inventory/{listing['id']}/bid", json={"amount": amount}, headers=login(buyer))
+        assert response.status_code == 200, response.text
+
+    events = db.query(PriceEvent).filter(PriceEvent.inventory_id == listing["id"]).all()
+    assert [(e.quantity, e.rolled_up_at) for e in events] == [(0, None)] * 3
+
+    _drain(db)
+    rollups = (
+        db.query(PriceRollup)
+        .filter(PriceRollup.crop_name == listing["crop_name"], PriceRollup.kind == PriceKind.BID)
+        .all()
+    )
+    # hour/day x (hub, *) x (band, *)
+    assert len(rollups) == 8
+    assert {(r.event_count, r.volume, r.min_price, r.max_price, r.price_sum) for r in rollups} == {
+        (3, 0, 41, 52, 138)
+    }
+    assert rollups[0].vwap == 46
+
+    prices = client.get(
+        "/market/prices",
+        params={"crop_name": listing["crop_name"], "kind": "BID", "granularity": "hour", "hub": ALL},
+    ).json()
+    # The hour is still open, so its median isn't known yet.
+    assert [(p["event_count"], p["volume"], p["median_price"], p["vwap"]) for p in prices] == [(3, 0, None, 46.0)]
+
+
+def test_roll_up_is_additive_across_batches(client, login, create_listing, db):
+    listing = create_listing()
+    for buyer, amount in zip(BUYERS[:2], (60, 70)):
+        client.post(f"/inventory/{listing['id']}/bid", json={"amount": amount}, headers=login(buyer))
+        _drain(db)
+
+    rollup = (
+        db.query(PriceRollup)
+        .filter(
+            PriceRollup.crop_name == listing["crop_name"],
+            PriceRollup.granularity == "day",
+            PriceRollup.hub == ALL,
+            PriceRollup.quality_band == ALL,
+        )
+        .one()
+    )
+    assert (rollup.event_count, rollup.min_price, rollup.max_price, rollup.price_sum) == (2, 60, 70, 130)
+
+
+def test_prices_accept_timezone_aware_bounds(client, login, create_listing, db):
+    listing = create_listing()
+    client.post(f"/inventory/{listing['id']}/bid", json={"amount": 61}, headers=login(BUYERS[0]))
+    _drain(db)
+    now = datetime.utcnow()
+    params = {"crop_name": listing["crop_name"], "kind": "BID", "granularity": "hour"}
+
+    # Z suffix and an explicit offset both describe the same UTC range.
+    since = (now - timedelta(hours=2)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    until = (now + timedelta(hours=3, minutes=1)).strftime("%Y-%m-%dT%H:%M:%S+03:00")
+    for bounds in ({"since": since}, {"since": since, "until": until}, {"until": until}):
+        response = client.get("/market/prices", params={**params, **bounds})
+        assert response.status_code == 200, response.text
+        assert [p["max_price"] for p in response.json()] == [61]
+
+    # Mixed naive and aware bounds are fine too.
+    naive_until = (now + timedelta(minutes=1)).isoformat()
+    response = client.get("/market/prices", params={**params, "since": since, "until": naive_until})
+    assert response.status_code == 200, response.text
+
+
+def test_closed_buckets_serve_a_stored_median(client, create_listing, db):
+    listing = create_listing()
+    day = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=2)
+    for minute, price in enumerate((40, 90, 50, 44)):
+        db.add(
+            PriceEvent(
+                inventory_id=listing["id"],
+                kind=PriceKind.SALE,
+                crop_name=listing["crop_name"],
+                hub="Molo",
+                quality_band="B",
+                price=price,
+                quantity=10,
+                occurred_at=day + timedelta(hours=6, minutes=minute),
+            )
+        )
+    db.commit()
+    _drain(db)
+    while fill_medians(db):
+        pass
+
+    params = {"crop_name": listing["crop_name"], "granularity": "day", "since": day.isoformat()}
+    # Served from the rollup row alone.
+    with query_budget(1):
+        prices = client.get("/market/prices", params=params).json()
+    assert [(p["median_price"], p["vwap"]) for p in prices] == [(47.0, 56.0)]
+
+    # A late event clears the stored median until the worker computes it again.
+    db.add(
+        PriceEvent(
+            inventory_id=listing["id"],
+            kind=PriceKind.SALE,
+            crop_name=listing["crop_name"],
+            hub="Molo",
+            quality_band="B",
+            price=100,
+            quantity=10,
+            occurred_at=day + timedelta(hours=7),
+        )
+    )
+    db.commit()
+    _drain(db)
+    assert client.get("/market/prices", params=params).json()[0]["median_price"] is None
+    fill_medians(db)
+    assert client.get("/market/prices", params=params).json()[0]["median_price"] == 50.0
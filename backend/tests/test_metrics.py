@@ -0,0 +1,78 @@
+import re
+
+import pytest
+
+from app.core.metrics import REGISTRY, Counter, Histogram, model_timer, render_metrics
+
+
+@pytest.fixture
+def registered():
+    # Metrics register themselves; drop the test ones so they never reach /metrics.
+    created = len(REGISTRY)
+    yield
+    del REGISTRY[created:]
+
+
+def _sample(text: str, name: str, **labels: str) -> float:
+    # Value of the one series whose labels include all of `labels`, 0 if it hasn't been seen.
+    for line in text.splitlines():
+        match = re.fullmatch(rf"{name}\{{(.*)\}} (\S+)", line)
+        if match and all(f'{key}="{value}"' in match.group(1).split(",") for key, value in labels.items()):
+            return float(match.group(2))
+    return 0.0
+
+
+def test_histogram_renders_cumulative_buckets(registered):
+    histogram = Histogram("test_wait_seconds", "Time spent waiting.", ["queue"], (0.01, 0.1, 1.0))
+    for value in (0.005, 0.05, 0.05, 5.0):
+        histogram.observe(value, 'say "hi"')
+
+    assert histogram.render() == [
+        "# HELP test_wait_seconds Time spent waiting.",
+        "# TYPE test_wait_seconds histogram",
+        'test_wait_seconds_bucket{queue="say \\"hi\\"",le="0.01"} 1',
+        'test_wait_seconds_bucket{queue="say \\"hi\\"",le="0.1"} 3',
+        'test_wait_seconds_bucket{queue="say \\"hi\\"",le="1.0"} 3',
+        'test_wait_seconds_bucket{queue="say \\"hi\\"",le="+Inf"} 4',
+        'test_wait_seconds_sum{queue="say \\"hi\\""} 5.105',
+        'test_wait_seconds_count{queue="say \\"hi\\""} 4',
+    ]
+
+
+def test_registered_metrics_are_exposed(registered):
+    counter = Counter("test_jobs_total", "Jobs run.", ["outcome"])
+    counter.inc("ok")
+    counter.inc("ok", amount=2)
+    with pytest.raises(RuntimeError):
+        with model_timer("test_operation"):
+            raise RuntimeError
+
+    text = render_metrics()
+    assert "# TYPE test_jobs_total counter\ntest_jobs_total{outcome=\"ok\"} 3.0\n" in text
+    assert _sample(text, "model_call_duration_seconds_count", operation="test_operation", outcome="error") == 1
+
+
+def test_route_latency_is_recorded_per_template(client, create_listing):
+    listing = create_listing()
+    before = client.get("/metrics").text
+    labels = {"method": "GET", "route": "/inventory/{inventory_id}"}
+
+    assert client.get(f"/inventory/{listing['id']}").status_code == 200
+    assert client.get("/inventory/no-such-lot").status_code == 404
+    assert client.get(f"/no-such-path/{listing['id']}").status_code == 404
+
+    response = client.get("/metrics")
+    assert response.headers["content-type"] == "text/plain; version=0.0.4; charset=utf-8"
+    text = response.text
+    # Ids never become label values, so the series count stays bounded.
+    assert listing["id"] not in text
+    assert "no-such-lot" not in text
+    latency = "http_request_duration_seconds_count"
+    assert _sample(text, latency, status="200", **labels) - _sample(before, latency, status="200", **labels) == 1
+    assert _sample(text, latency, status="404", **labels) - _sample(before, latency, status="404", **labels) == 1
+    unmatched = {"method": "GET", "route": "unmatched", "status": "404"}
+    assert _sample(text, latency, **unmatched) - _sample(before, latency, **unmatched) == 1
+    # The lookup went to the database, and its statements were counted against the route.
+    queries = "http_request_db_queries_sum"
+    assert _sample(text, queries, **labels) > _sample(before, queries, **labels)
+    assert _sample(text, "http_request_db_seconds_count", **labels) >= 2
@@ -0,0 +1,150 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from app.db import Base
+from app.migrations import LATEST_VERSION, current_version, migrate
+
+# The schema create_all built before migrations existed.
+BASELINE_DDL = (
+    """CREATE TABLE users (
+        id VARCHAR NOT NULL, name VARCHAR(120) NOT NULL, email VARCHAR(255) NOT NULL, role VARCHAR(6) NOT NULL,
+        location VARCHAR(120) NOT NULL, rating FLOAT, hashed_password VARCHAR(255) NOT NULL,
+        created_at DATETIME NOT NULL, PRIMARY KEY (id)
+    )""",
+    "CREATE UNIQUE INDEX ix_users_email ON users (email)",
+    """CREATE TABLE inventory (
+        id VARCHAR NOT NULL, farmer_id VARCHAR NOT NULL, farmer_name VARCHAR(120) NOT NULL,
+        crop_name VARCHAR(120) NOT NULL, quantity INTEGER NOT NULL, quality_score INTEGER NOT NULL,
+        base_price INTEGER NOT NULL, current_bid INTEGER NOT NULL, highest_bidder_id VARCHAR,
+        location_name VARCHAR(120) NOT NULL, location_lat FLOAT NOT NULL, location_lng FLOAT NOT NULL,
+        image_url TEXT, timestamp DATETIME NOT NULL, status VARCHAR(11) NOT NULL, listing_type VARCHAR(7) NOT NULL,
+        PRIMARY KEY (id), FOREIGN KEY(farmer_id) REFERENCES users (id)
+    )""",
+    """CREATE TABLE escrow (
+        id VARCHAR NOT NULL, inventory_id VARCHAR NOT NULL, buyer_id VARCHAR NOT NULL, amount INTEGER NOT NULL,
+        platform_fee INTEGER NOT NULL, requested_quantity INTEGER, status VARCHAR(8) NOT NULL,
+        created_at DATETIME NOT NULL, updated_at DATETIME NOT NULL, PRIMARY KEY (id), UNIQUE (inventory_id),
+        FOREIGN KEY(inventory_id) REFERENCES inventory (id), FOREIGN KEY(buyer_id) REFERENCES users (id)
+    )""",
+    """CREATE TABLE messages (
+        id VARCHAR NOT NULL, inventory_id VARCHAR NOT NULL, sender_id VARCHAR NOT NULL, text VARCHAR(2000) NOT NULL,
+        timestamp DATETIME NOT NULL, PRIMARY KEY (id), FOREIGN KEY(inventory_id) REFERENCES inventory (id),
+        FOREIGN KEY(sender_id) REFERENCES users (id)
+    )""",
+)
+
+
+def _schema(engine) -> dict:
+    inspector = inspect(engine)
+    return {
+        table: (
+            {column["name"]: column["nullable"] for column in inspector.get_columns(table)},
+            {
+                (index["name"], tuple(index["column_names"]), bool(index["unique"]))
+                for index in inspector.get_indexes(table)
+            },
+            {tuple(constraint["column_names"]) for constraint in inspector.get_unique_constraints(table)},
+        )
+        for table in inspector.get_table_names()
+        if table != "schema_version"
+    }
+
+
+@pytest.fixture
+def engine_at(tmp_path):
+    def _engine(name: str):
+        return create_engine(f"sqlite:///{tmp_path / name}.db")
+
+    return _engine
+
+
+@pytest.fixture
+def model_schema(engine_at):
+    engine = engine_at("models")
+    Base.metadata.create_all(engine)
+    return _schema(engine)
+
+
+def _baseline(engine) -> None:
+    now = datetime(2026, 1, 5, 9, 0)
+    with engine.begin() as connection:
+        for ddl in BASELINE_DDL:
+            connection.execute(text(ddl))
+        connection.execute(
+            text(
+                "INSERT INTO users (id, name, email, role, location, hashed_password, created_at) VALUES "
+                "('farmer', 'Mzee', 'mzee@example.com', 'FARMER', 'Molo', 'x', :now), "
+                "('buyer', 'Aisha', 'aisha@example.com', 'BUYER', 'Nakuru', 'x', :now)"
+            ),
+            {"now": now},
+        )
+        connection.execute(
+            text(
+                "INSERT INTO inventory (id, farmer_id, farmer_name, crop_name, quantity, quality_score, base_price, "
+                "current_bid, highest_bidder_id, location_name, location_lat, location_lng, timestamp, status, "
+                "listing_type) VALUES ('lot', 'farmer', 'Mzee', 'Maize', 100, 80, 40, 45, 'buyer', 'Molo', -0.25, "
+                "35.73, :now, 'SOLD', 'BIDDING')"
+            ),
+            {"now": now},
+        )
+        connection.execute(
+            text(
+                "INSERT INTO escrow (id, inventory_id, buyer_id, amount, platform_fee, status, created_at, updated_at) "
+                "VALUES ('deal', 'lot', 'buyer', 4500, 90, 'RELEASED', :now, :now)"
+            ),
+            {"now": now},
+        )
+        connection.execute(
+            text(
+                "INSERT INTO messages (id, inventory_id, sender_id, text, timestamp) VALUES "
+                "('m1', 'lot', 'buyer', 'Still available?', :now), ('m2', 'lot', 'farmer', 'Yes', :now)"
+            ),
+            {"now": now},
+        )
+
+
+def test_fresh_database_matches_models(engine_at, model_schema):
+    engine = engine_at("fresh")
+    assert migrate(engine) == list(range(1, LATEST_VERSION + 1))
+    assert _schema(engine) == model_schema
+
+
+def test_baseline_database_upgrades_in_place(engine_at, model_schema):
+    engine = engine_at("baseline")
+    _baseline(engine)
+
+    migrate(engine)
+
+    assert _schema(engine) == model_schema
+    with engine.begin() as connection:
+        assert current_version(connection) == LATEST_VERSION
+        # Lots sold before sold_at existed age from their last escrow update.
+        lot = connection.execute(text("SELECT inventory.sold_at = escrow.updated_at FROM inventory JOIN escrow")).one()
+        assert lot == (1,)
+        escrow = connection.execute(text("SELECT amount, platform_fee, stock_reserved, status FROM escrow")).all()
+        assert escrow == [(4500, 90, 0, "RELEASED")]
+        assert connection.execute(text("SELECT inventory_id, message_count FROM conversations")).all() == [("lot", 2)]
+        assert connection.execute(text("SELECT inventory_id, op FROM inventory_changes")).all() == [("lot", "UPSERT")]
+        assert connection.execute(text("SELECT dashboard_version FROM users")).scalars().all() == [0, 0]
+        # The rebuilt escrow table dropped the one-escrow-per-lot constraint.
+        connection.execute(
+            text(
+                "INSERT INTO escrow (id, inventory_id, buyer_id, amount, platform_fee, status, created_at, updated_at) "
+                "VALUES ('fill', 'lot', 'buyer', 400, 8, 'PENDING', '2026-01-06', '2026-01-06')"
+            )
+        )
+
+
+def test_rerunning_migrate_is_a_no_op(engine_at):
+    engine = engine_at("rerun")
+    _baseline(engine)
+    migrate(engine)
+    schema = _schema(engine)
+
+    assert migrate(engine) == []
+    assert _schema(engine) == schema
+    with engine.begin() as connection:
+        assert connection.execute(text("SELECT COUNT(*) FROM schema_version")).scalar() == LATEST_VERSION
+        assert connection.execute(text("SELECT COUNT(*) FROM inventory_changes")).scalar() == 1
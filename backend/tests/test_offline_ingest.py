@@ -0,0 +1,84 @@
+import asyncio
+import json
+import uuid
+from datetime import datetime, timedelta
+
+from app.models import IngestedMessage, Inventory, InventoryStatus
+from app.schemas import OfflineBatchMessage, OfflineParseResult
+from app.services.offline_ingest import ingest_batch, message_key
+from conftest import BUYERS, FARMER
+
+
+def _ingest(farmer: dict, messages: list[OfflineBatchMessage], quantity: float = 10) -> list[dict]:
+    # The gateway text is already known, so parsing stands in for the model call.
+    def parse(message: OfflineBatchMessage) -> OfflineParseResult:
+        return OfflineParseResult(cropName=message.text, quantity=quantity, locationName="Molo")
+
+    async def collect() -> list[str]:
+        return [line async for line in ingest_batch(farmer["id"], farmer["name"], "sms", messages, parse)]
+
+    return [json.loads(line) for line in asyncio.run(collect())]
+
+
+def _farmer(client, login) -> dict:
+    return client.get("/auth/me", headers=login(FARMER)).json()
+
+
+def test_resent_report_is_a_duplicate_only_within_the_window(client, login, db):
+    farmer = _farmer(client, login)
+    message = OfflineBatchMessage(text=f"Crop {uuid.uuid4().hex[:8]}", sender="+254700000001")
+
+    assert _ingest(farmer, [message])[0]["status"] == "created"
+    assert _ingest(farmer, [message], quantity=12)[0]["status"] == "duplicate"
+
+    db.query(IngestedMessage).filter(IngestedMessage.key == message_key("sms", message)).update(
+        {"expires_at": datetime.utcnow() - timedelta(seconds=1)}
+    )
+    db.commit()
+    outcome = _ingest(farmer, [message], quantity=12)[0]
+    assert outcome["status"] == "updated"
+    # The latest report replaces the lot's quantity.
+    assert db.get(Inventory, outcome["inventory_id"]).quantity == 12
+
+
+def test_gateway_message_ids_never_expire(client, login, db):
+    farmer = _farmer(client, login)
+    message = OfflineBatchMessage(
+        message_id=f"ATXid_{uuid.uuid4().hex}", text=f"Crop {uuid.uuid4().hex[:8]}", sender="+254700000001"
+    )
+
+    assert _ingest(farmer, [message])[0]["status"] == "created"
+    assert db.get(IngestedMessage, message_key("sms", message)).expires_at is None
+    assert _ingest(farmer, [message])[0]["status"] == "duplicate"
+
+
+def test_report_leaves_reserved_fills_out_of_the_lot(client, login, db):
+    farmer = _farmer(client, login)
+    crop = f"Crop {uuid.uuid4().hex[:8]}"
+    buyer = login(BUYERS[0])
+
+    def report(quantity: float) -> tuple[int, InventoryStatus]:
+        message = OfflineBatchMessage(message_id=f"ATXid_{uuid.uuid4().hex}", text=crop, sender="+254700000001")
+        lot = db.get(Inventory, _ingest(farmer, [message], quantity=quantity)[0]["inventory_id"])
+        db.refresh(lot)
+        return lot.quantity, lot.status
+
+    def reserve(quantity: int) -> dict:
+        response = client.post(f"/escrow/{lot_id}/start", json={"quantity": quantity}, headers=buyer)
+        assert response.status_code == 201, response.text
+        return response.json()
+
+    report(10)
+    lot_id = db.query(Inventory.id).filter(Inventory.crop_name == crop.title()).scalar()
+    fill = reserve(4)
+    # Ten in store, four of them already promised to the buyer.
+    assert report(10) == (6, InventoryStatus.AVAILABLE)
+
+    # Once the fill is paid out its goods have left the store.
+    release = client.post(f"/escrow/{lot_id}/release?escrow_id={fill['id']}", headers=buyer)
+    assert release.status_code == 200, release.text
+    assert report(10) == (10, InventoryStatus.AVAILABLE)
+
+    reserve(4)
+    assert report(3) == (0, InventoryStatus.NEGOTIATING)
+    assert db.query(Inventory).filter(Inventory.crop_name == crop.title()).count() == 1
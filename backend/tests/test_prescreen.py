@@ -0,0 +1,73 @@
+import base64
+import io
+import time
+
+import pytest
+from PIL import Image, ImageFilter
+
+from app.services import prescreen
+from app.services.prescreen import ImageRejected, prescreen_image
+
+
+def _photo(size: tuple[int, int] = (800, 600)) -> Image.Image:
+    # Textured enough to pass the sharpness check, with some colour and mid-range exposure.
+    channels = [Image.effect_noise(size, sigma).filter(ImageFilter.GaussianBlur(1)) for sigma in (40, 50, 60)]
+    return Image.merge("RGB", channels)
+
+
+def _data_url(image: Image.Image, fmt: str = "JPEG", **options) -> str:
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **options)
+    return f"data:image/{fmt.lower()};base64,{base64.b64encode(buffer.getvalue()).decode()}"
+
+
+def _reason(image_data_url: str) -> str:
+    with pytest.raises(ImageRejected) as exc:
+        prescreen_image(image_data_url)
+    return exc.value.reason
+
+
+def test_sharp_well_lit_photo_is_accepted():
+    report = prescreen_image(_data_url(_photo()))
+    assert (report.width, report.height) == (800, 600)
+    assert report.sharpness >= prescreen.PRESCREEN_MIN_SHARPNESS
+    assert prescreen.PRESCREEN_MIN_BRIGHTNESS <= report.brightness <= prescreen.PRESCREEN_MAX_BRIGHTNESS
+
+
+def test_each_failed_check_names_its_reason():
+    assert _reason(_data_url(_photo((160, 120)))) == "too_small"
+    assert _reason(_data_url(_photo().filter(ImageFilter.GaussianBlur(8)))) == "blurry"
+    assert _reason(_data_url(_photo().point(lambda value: value // 8))) == "too_dark"
+    assert _reason(_data_url(_photo().point(lambda value: 240 + value // 16))) == "overexposed"
+    assert _reason("data:image/jpeg;base64," + base64.b64encode(b"not an image").decode()) == "undecodable"
+
+
+def test_rejection_reaches_the_client_before_the_model(client):
+    response = client.post("/analysis", json={"image_base64": _data_url(_photo().filter(ImageFilter.GaussianBlur(8)))})
+    assert response.status_code == 422, response.text
+    assert response.json()["detail"]["reason"] == "blurry"
+
+
+def test_bad_input_passes_through_unscreened(monkeypatch):
+    # Malformed payloads keep the error the model call would give them.
+    with pytest.raises(ValueError) as exc:
+        prescreen_image("https://example.com/photo.jpg")
+    assert not isinstance(exc.value, ImageRejected)
+
+    monkeypatch.setattr(prescreen, "PRESCREEN_ENABLED", False)
+    assert prescreen_image(_data_url(_photo((160, 120)))) is None
+
+
+@pytest.mark.parametrize("fmt", ["JPEG", "PNG"])
+def test_large_uploads_are_screened_on_a_thumbnail(fmt):
+    # A phone camera's 12MP, upscaled from a smaller photo to keep the test quick.
+    image = _photo((1000, 750)).resize((4000, 3000), Image.Resampling.BICUBIC)
+    image_data_url = _data_url(image, fmt, compress_level=1)
+    prescreen_image(image_data_url)
+
+    started = time.perf_counter()
+    report = prescreen_image(image_data_url)
+    elapsed = time.perf_counter() - started
+    assert (report.width, report.height) == (4000, 3000)
+    # Decoding dominates: a 12MP JPEG decodes at 1/4 scale, a PNG has to be inflated in full.
+    assert elapsed < (0.25 if fmt == "JPEG" else 1.5)
@@ -0,0 +1,43 @@
+import pytest
+
+from app.core.profiler import query_budget
+from conftest import BUYERS
+
+# Every statement on the engine counts: the token's user lookup, the write itself, the change
+# log entry and the dashboard bump after commit. Raise a budget only with a reason.
+
+
+@pytest.fixture
+def buyer(login):
+    return login(BUYERS[0])
+
+
+def test_get_inventory(client, create_listing):
+    listing = create_listing()
+    with query_budget(1, "cold listing"):
+        assert client.get(f"/inventory/{listing['id']}").status_code == 200
+    with query_budget(0, "cached listing"):
+        assert client.get(f"/inventory/{listing['id']}").status_code == 200
+
+
+def test_place_bid(client, create_listing, buyer):
+    listing = create_listing()
+    with query_budget(6, "place_bid"):
+        response = client.post(f"/inventory/{listing['id']}/bid", json={"amount": 50}, headers=buyer)
+    assert response.status_code == 200, response.text
+
+
+def test_create_message(client, create_listing, buyer):
+    listing = create_listing()
+    with query_budget(7, "create_message"):
+        response = client.post(f"/chat/{listing['id']}/messages", json={"text": "Bei?"}, headers=buyer)
+    assert response.status_code == 201, response.text
+
+
+def test_release_escrow(client, create_listing, login, buyer):
+    listing = create_listing()
+    assert client.post(f"/escrow/{listing['id']}/start", json={}, headers=buyer).status_code == 201
+    farmer = login()
+    with query_budget(7, "release_escrow"):
+        response = client.post(f"/escrow/{listing['id']}/release", headers=farmer)
+    assert response.status_code == 200, response.text
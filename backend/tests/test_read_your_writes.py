@@ -0,0 +1,47 @@
+import time
+
+from app.core import deps
+from app.db import READ_YOUR_WRITES_SECONDS, read_after_pending
+
+
+def test_reads_carry_no_stamp(client, create_listing):
+    listing = create_listing()
+    response = client.get(f"/inventory/{listing['id']}")
+    assert response.status_code == 200
+    assert "x-read-after" not in response.headers
+
+
+def test_writes_return_commit_stamp(client, login):
+    response = client.post(
+        "/inventory",
+        headers=login(),
+        json={
+            "crop_name": "Stamp maize",
+            "quantity": 10,
+            "quality_score": 80,
+            "base_price": 40,
+            "current_bid": 40,
+            "location": {"name": "Molo", "lat": -0.25, "lng": 35.73},
+            "listing_type": "FIXED",
+        },
+    )
+    assert response.status_code == 201
+    stamp = float(response.headers["x-read-after"])
+    assert abs(stamp - time.time()) < 5
+
+
+def test_stamp_window():
+    now = time.time()
+    assert read_after_pending(now)
+    assert not read_after_pending(now - READ_YOUR_WRITES_SECONDS - 1)
+    assert not read_after_pending(now + 3600)
+    assert not read_after_pending(None)
+
+
+def test_recent_stamp_pins_reads_to_primary(monkeypatch):
+    monkeypatch.setattr(deps, "replica_usable", lambda: True)
+    for stamp, use_replica in ((None, True), (time.time(), False)):
+        sessions = deps.get_read_db(read_after=stamp)
+        db = next(sessions)
+        assert db.info["use_replica"] is use_replica
+        sessions.close()
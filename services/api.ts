@@ -1,5 +1,6 @@
 import {
   AnalysisResult,
+  Conversation,
   CropInventory,
   CropInventoryCreate,
   Escrow,
@@ -10,6 +11,29 @@ import {
 
 const API_BASE = (process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000').replace(/\/+$/, '');
 const TOKEN_KEY = 'shamba_token';
+const READ_AFTER_HEADER = 'X-Read-After';
+
+// Commit time of this tab's last write; echoed so the API keeps our reads on the primary.
+let readAfter: string | null = null;
+
+const apiFetch = async (url: string, init: RequestInit = {}): Promise<Response> => {
+  const headers = new Headers(init.headers);
+  if (readAfter) {
+    headers.set(READ_AFTER_HEADER, readAfter);
+  }
+  const res = await fetch(url, { ...init, headers });
+  const stamp = res.headers.get(READ_AFTER_HEADER);
+  if (stamp) {
+    readAfter = stamp;
+  }
+  return res;
+};
+
+// Uploaded photos come back as a path on the API rather than an inline data URL.
+const resolveImage = (url?: string | null): string | undefined => {
+  if (!url) return undefined;
+  return url.startsWith('/') ? `${API_BASE}${url}` : url;
+};
 
 const mapInventory = (item: any): CropInventory => ({
   id: item.id,
@@ -22,10 +46,12 @@ const mapInventory = (item: any): CropInventory => ({
   currentBid: item.current_bid ?? item.currentBid,
   highestBidderId: item.highest_bidder_id ?? item.highestBidderId ?? undefined,
   location: item.location,
-  imageUrl: item.image_url ?? item.imageUrl ?? undefined,
+  imageUrl: resolveImage(item.image_url ?? item.imageUrl),
   timestamp: item.timestamp,
   status: item.status,
-  listingType: item.listing_type ?? item.listingType ?? 'BIDDING'
+  listingType: item.listing_type ?? item.listingType ?? 'BIDDING',
+  endsAt: item.ends_at ?? item.endsAt ?? undefined,
+  settledAt: item.settled_at ?? item.settledAt ?? undefined
 });
 
 const mapMessage = (item: any): Message => ({
@@ -36,6 +62,16 @@ const mapMessage = (item: any): Message => ({
   timestamp: item.timestamp
 });
 
+const mapConversation = (item: any): Conversation => ({
+  inventoryId: item.inventory_id,
+  cropName: item.crop_name,
+  lastMessageText: item.last_message_text,
+  lastSenderName: item.last_sender_name ?? undefined,
+  lastMessageAt: item.last_message_at,
+  messageCount: item.message_count,
+  unreadCount: item.unread_count
+});
+
 const mapEscrow = (item: any): Escrow => ({
   id: item.id,
   inventoryId: item.inventory_id ?? item.inventoryId,
@@ -56,7 +92,7 @@ export type LoginResponse = {
 };
 
 export const login = async (email: string, password: string): Promise<LoginResponse> => {
-  const res = await fetch(`${API_BASE}/auth/login`, {
+  const res = await apiFetch(`${API_BASE}/auth/login`, {
     method: 'POST',
     headers: { 'Content-Type': 'application/json' },
     body: JSON.stringify({ email: email.toLowerCase(), password })
@@ -87,7 +123,7 @@ export const getStoredToken = (): string | null => {
 };
 
 export const fetchMe = async (token: string): Promise<User> => {
-  const res = await fetch(`${API_BASE}/auth/me`, {
+  const res = await apiFetch(`${API_BASE}/auth/me`, {
     headers: { Authorization: `Bearer ${token}` },
     cache: 'no-store'
   });
@@ -98,7 +134,7 @@ export const fetchMe = async (token: string): Promise<User> => {
 };
 
 export const fetchInventory = async (): Promise<CropInventory[]> => {
-  const res = await fetch(`${API_BASE}/inventory`, { cache: 'no-store' });
+  const res = await apiFetch(`${API_BASE}/inventory`, { cache: 'no-store' });
   if (!res.ok) {
     throw new Error('Failed to fetch inventory');
   }
@@ -110,7 +146,7 @@ export const createInventory = async (
   token: string,
   payload: CropInventoryCreate
 ): Promise<CropInventory> => {
-  const res = await fetch(`${API_BASE}/inventory`, {
+  const res = await apiFetch(`${API_BASE}/inventory`, {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json',
@@ -124,7 +160,8 @@ export const createInventory = async (
       current_bid: payload.currentBid,
       location: payload.location,
       image_url: payload.imageUrl,
-      listing_type: payload.listingType
+      listing_type: payload.listingType,
+      ends_at: payload.endsAt
     })
   });
 
@@ -137,7 +174,7 @@ export const createInventory = async (
 };
 
 export const placeBid = async (inventoryId: string, token: string, amount: number): Promise<CropInventory> => {
-  const res = await fetch(`${API_BASE}/inventory/${inventoryId}/bid`, {
+  const res = await apiFetch(`${API_BASE}/inventory/${inventoryId}/bid`, {
     method: 'POST',
     headers: {
       Authorization: `Bearer ${token}`,
@@ -155,12 +192,13 @@ export const placeBid = async (inventoryId: string, token: string, amount: numbe
 export const updateInventory = async (
   inventoryId: string,
   token: string,
-  payload: { currentBid?: number; listingType?: 'BIDDING' | 'FIXED' }
+  payload: { currentBid?: number; listingType?: 'BIDDING' | 'FIXED'; endsAt?: string }
 ): Promise<CropInventory> => {
   const body: Record<string, unknown> = {};
   if (payload.currentBid !== undefined) body.current_bid = payload.currentBid;
   if (payload.listingType !== undefined) body.listing_type = payload.listingType;
-  const res = await fetch(`${API_BASE}/inventory/${inventoryId}`, {
+  if (payload.endsAt !== undefined) body.ends_at = payload.endsAt;
+  const res = await apiFetch(`${API_BASE}/inventory/${inventoryId}`, {
     method: 'PATCH',
     headers: {
       Authorization: `Bearer ${token}`,
@@ -176,14 +214,23 @@ export const updateInventory = async (
 };
 
 export const analyzeProduceQuality = async (imageBase64: string): Promise<AnalysisResult> => {
-  const res = await fetch(`${API_BASE}/analysis`, {
+  const res = await apiFetch(`${API_BASE}/analysis`, {
     method: 'POST',
     headers: { 'Content-Type': 'application/json' },
     body: JSON.stringify({ image_base64: imageBase64 })
   });
 
   if (!res.ok) {
-    throw new Error('Analysis failed');
+    let detail = 'Analysis failed';
+    try {
+      const data = await res.json();
+      // 422 carries a retake hint from the image pre-screen.
+      if (typeof data?.detail === 'string') detail = data.detail;
+      else if (data?.detail?.message) detail = data.detail.message;
+    } catch {
+      // ignore
+    }
+    throw new Error(detail);
   }
 
   return res.json();
@@ -193,7 +240,7 @@ export const parseOfflineMessage = async (payload: {
   text?: string;
   audioBase64?: string;
 }): Promise<OfflineParseResult> => {
-  const res = await fetch(`${API_BASE}/analysis/offline`, {
+  const res = await apiFetch(`${API_BASE}/analysis/offline`, {
     method: 'POST',
     headers: { 'Content-Type': 'application/json' },
     body: JSON.stringify({
@@ -209,8 +256,14 @@ export const parseOfflineMessage = async (payload: {
   return res.json();
 };
 
-export const fetchMessages = async (inventoryId: string, token: string): Promise<Message[]> => {
-  const res = await fetch(`${API_BASE}/chat/${inventoryId}/messages`, {
+export const fetchMessages = async (
+  inventoryId: string,
+  token: string,
+  before?: string
+): Promise<Message[]> => {
+  // Returns the newest page; pass the oldest loaded message id as `before` to load earlier ones.
+  const query = before ? `?before=${encodeURIComponent(before)}` : '';
+  const res = await apiFetch(`${API_BASE}/chat/${inventoryId}/messages${query}`, {
     headers: { Authorization: `Bearer ${token}` },
     cache: 'no-store'
   });
@@ -221,12 +274,34 @@ export const fetchMessages = async (inventoryId: string, token: string): Promise
   return (data as any[]).map(mapMessage);
 };
 
+export const fetchInbox = async (token: string): Promise<Conversation[]> => {
+  const res = await apiFetch(`${API_BASE}/chat/inbox`, {
+    headers: { Authorization: `Bearer ${token}` },
+    cache: 'no-store'
+  });
+  if (!res.ok) {
+    throw new Error('Failed to fetch inbox');
+  }
+  const data = await res.json();
+  return (data as any[]).map(mapConversation);
+};
+
+export const markConversationRead = async (inventoryId: string, token: string): Promise<void> => {
+  const res = await apiFetch(`${API_BASE}/chat/${inventoryId}/read`, {
+    method: 'POST',
+    headers: { Authorization: `Bearer ${token}` }
+  });
+  if (!res.ok) {
+    throw new Error('Failed to mark conversation read');
+  }
+};
+
 export const sendMessage = async (
   inventoryId: string,
   token: string,
   text: string
 ): Promise<Message> => {
-  const res = await fetch(`${API_BASE}/chat/${inventoryId}/messages`, {
+  const res = await apiFetch(`${API_BASE}/chat/${inventoryId}/messages`, {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json',
@@ -247,7 +322,7 @@ export const startEscrow = async (
   amount?: number,
   quantity?: number
 ): Promise<Escrow> => {
-  const res = await fetch(`${API_BASE}/escrow/${inventoryId}/start`, {
+  const res = await apiFetch(`${API_BASE}/escrow/${inventoryId}/start`, {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json',
@@ -269,8 +344,42 @@ export const startEscrow = async (
   return mapEscrow(data);
 };
 
-export const verifyEscrow = async (inventoryId: string, token: string): Promise<Escrow> => {
-  const res = await fetch(`${API_BASE}/escrow/${inventoryId}/verify`, {
+export const fetchFills = async (inventoryId: string, token: string): Promise<Escrow[]> => {
+  // Every partial fill on a FIXED lot; buyers only get their own.
+  const res = await apiFetch(`${API_BASE}/escrow/${inventoryId}/fills`, {
+    headers: { Authorization: `Bearer ${token}` },
+    cache: 'no-store'
+  });
+  if (!res.ok) {
+    throw new Error('Failed to fetch fills');
+  }
+  const data = await res.json();
+  return (data as any[]).map(mapEscrow);
+};
+
+export const cancelFill = async (inventoryId: string, token: string, escrowId?: string): Promise<Escrow> => {
+  const query = escrowId ? `?escrow_id=${encodeURIComponent(escrowId)}` : '';
+  const res = await apiFetch(`${API_BASE}/escrow/${inventoryId}/cancel${query}`, {
+    method: 'POST',
+    headers: { Authorization: `Bearer ${token}` }
+  });
+  if (!res.ok) {
+    let detail = 'Failed to cancel fill';
+    try {
+      const data = await res.json();
+      if (data?.detail) detail = data.detail;
+    } catch {
+      // ignore
+    }
+    throw new Error(detail);
+  }
+  const data = await res.json();
+  return mapEscrow(data);
+};
+
+export const verifyEscrow = async (inventoryId: string, token: string, escrowId?: string): Promise<Escrow> => {
+  const query = escrowId ? `?escrow_id=${encodeURIComponent(escrowId)}` : '';
+  const res = await apiFetch(`${API_BASE}/escrow/${inventoryId}/verify${query}`, {
     method: 'POST',
     headers: { Authorization: `Bearer ${token}` }
   });
@@ -288,8 +397,9 @@ export const verifyEscrow = async (inventoryId: string, token: string): Promise<
   return mapEscrow(data);
 };
 
-export const releaseEscrow = async (inventoryId: string, token: string): Promise<Escrow> => {
-  const res = await fetch(`${API_BASE}/escrow/${inventoryId}/release`, {
+export const releaseEscrow = async (inventoryId: string, token: string, escrowId?: string): Promise<Escrow> => {
+  const query = escrowId ? `?escrow_id=${encodeURIComponent(escrowId)}` : '';
+  const res = await apiFetch(`${API_BASE}/escrow/${inventoryId}/release${query}`, {
     method: 'POST',
     headers: { Authorization: `Bearer ${token}` }
   });